@@ -1,87 +1,55 @@
-from langchain.agents import Tool, AgentExecutor, LLMSingleActionAgent, AgentOutputParser
+from langchain.agents import Tool, AgentExecutor, LLMSingleActionAgent, AgentOutputParser, BaseMultiActionAgent
+from langchain.agents.agent import MultiActionAgentOutputParser
 from langchain.prompts import StringPromptTemplate
 from langchain.chains import LLMChain
 from langchain.schema import AgentAction, AgentFinish
-from langchain.memory import ConversationBufferMemory
 from langchain.llms.base import BaseLLM
+import os
 import re
-from typing import List, Union, Any, Dict
+from concurrent.futures import Future
+from typing import List, Union, Any, Dict, Optional
 import json
 
+from functools import partial
+
 from llm_handler import init_llm
-from data_processor import (
-    get_top_active_qpc_blocks, 
-    analyze_cost_impact, 
-    get_daily_costs,
-    get_qpu_summary,
-    get_block_efficiency,
-    get_daily_workloads
-)
-from visualization import generate_trend_graph, generate_workloads_graph, generate_efficiency_graph
-from optimisation_strategies import optimize_block_mix, simulate_batch_scheduling, negotiate_costs
+from tool_results import TOOLS
+from analytics_snapshot import analytics
+from executors import executor_pool, ExecutorSaturated
+from conversation_memory import ConversationMemory
+
+# "parallel" lets one agent step request several tools, which then run concurrently;
+# "single" asks for one tool per LLM call
+AGENT_MODE = os.getenv("AGENT_MODE", "parallel")
+
+# Answers the agent gives when it produced none of its own; they are never cached
+UNPARSED_ANSWER = "I wasn't able to determine what to do next. Could you please clarify your question?"
+STOPPED_ANSWER = "Agent stopped due to iteration limit or time limit."
+
+def is_fallback_answer(answer: str) -> bool:
+    """
+    Whether an agent answer is a placeholder for a failed run rather than a real answer
+    """
+    return not answer.strip() or answer.strip() in (UNPARSED_ANSWER, STOPPED_ANSWER)
 
 # Define the tools our agent can use
 def get_tools():
+    # Each tool returns a structured result (see tool_results.py); the agent sees
+    # its token-budgeted rendering, parsed from the free-text action input.
+    # Calls with default parameters are answered from the analytics snapshot.
     tools = [
         Tool(
-            name="QPU_Block_Activity",
-            func=get_top_active_qpc_blocks,
-            description="Useful for finding the most active QPU blocks by number of workloads executed"
-        ),
-        Tool(
-            name="Cost_Analysis",
-            func=analyze_cost_impact,
-            description="Useful for analyzing cost impact of using only Atom blocks"
-        ),
-        Tool(
-            name="Cost_Trend_Graph",
-            func=generate_trend_graph,
-            description="Useful for generating a graph showing the trend of daily costs"
-        ),
-        Tool(
-            name="Optimize_Block_Mix",
-            func=optimize_block_mix,
-            description="Estimates cost savings by increasing the ratio of Atom blocks to a target value"
-        ),
-        Tool(
-            name="Batch_Scheduling",
-            func=simulate_batch_scheduling,
-            description="Simulates cost savings by batching daily workloads into multi-day windows"
-        ),
-        Tool(
-            name="Negotiate_Costs",
-            func=negotiate_costs,
-            description="Estimates cost savings by negotiating a reduction in fixed cost components"
-        ),
-        # New tools
-        Tool(
-            name="QPU_Summary",
-            func=get_qpu_summary,
-            description="Returns summary statistics about QPU blocks and workloads (total blocks, avg workloads per block, etc.)"
-        ),
-        Tool(
-            name="Block_Efficiency",
-            func=get_block_efficiency,
-            description="Returns efficiency metrics for different block types including cost per workload"
-        ),
-        Tool(
-            name="Daily_Workloads",
-            func=get_daily_workloads,
-            description="Returns daily workload data for visualization purposes"
-        ),
-        Tool(
-            name="Workloads_Graph",
-            func=generate_workloads_graph,
-            description="Generates a graph showing daily workloads over time"
-        ),
-        Tool(
-            name="Efficiency_Graph",
-            func=generate_efficiency_graph,
-            description="Generates a graph showing block efficiency metrics over time"
+            name=spec.name,
+            func=partial(analytics.render_tool, spec.name),
+            description=spec.description
         )
+        for spec in TOOLS.values()
     ]
     return tools
 
+# Marks where a prompt prefix ends when formatting the template
+_PREFIX_END = "\x00"
+
 # Define a custom prompt template
 class QpcPromptTemplate(StringPromptTemplate):
     template: str
@@ -94,11 +62,37 @@ class QpcPromptTemplate(StringPromptTemplate):
         for action, observation in intermediate_steps:
             thoughts += f"Action: {action.tool}\nAction Input: {action.tool_input}\nObservation: {observation}\n"
 
-        tools_str = "\n".join([f"{tool.name}: {tool.description}" for tool in self.tools])
-        kwargs["tools"] = tools_str
+        kwargs["tools"] = self._tools_str()
         kwargs["thoughts"] = thoughts
+        kwargs.setdefault("agent_scratchpad", "")
         return self.template.format(**kwargs)
 
+    def prefixes(self, chat_history: str) -> List[str]:
+        """
+        Leading text shared by the formatted prompts: the preamble with the tool
+        list (same for every request), then that plus the chat history (same for
+        every step of one request)
+        """
+        def prefix(**values) -> str:
+            values = {"tools": self._tools_str(), "input": "", "agent_scratchpad": "", **values}
+            return self.template.format(**values).split(_PREFIX_END)[0]
+        return [prefix(chat_history=_PREFIX_END, thoughts=""), prefix(chat_history=chat_history, thoughts=_PREFIX_END)]
+
+    def _tools_str(self) -> str:
+        return "\n".join([f"{tool.name}: {tool.description}" for tool in self.tools])
+
+def cache_prompt_prefixes(agent_executor: AgentExecutor, llm: BaseLLM, chat_history: str):
+    """
+    Prefill the agent prompt's shared prefixes once, so each agent step only
+    prefills its scratchpad and question (models without an inference
+    scheduler, or with an encoder, skip this)
+    """
+    scheduler = getattr(llm, "scheduler", None)
+    if scheduler is None:
+        return
+    for prefix in agent_executor.agent.llm_chain.prompt.prefixes(chat_history):
+        scheduler.add_prefix(prefix)
+
 # Define output parser for the agent
 class QpcOutputParser(AgentOutputParser):
     def parse(self, llm_output: str) -> Union[AgentAction, AgentFinish]:
@@ -120,17 +114,93 @@ class QpcOutputParser(AgentOutputParser):
         else:
             # If no action is found, return a default response
             return AgentFinish(
-                return_values={"output": "I wasn't able to determine what to do next. Could you please clarify your question?"},
+                return_values={"output": UNPARSED_ANSWER},
                 log=llm_output,
             )
 
+# One "Action: ... Action Input: ..." block; the input runs until the next block or thought
+_ACTION_BLOCK = re.compile(r"Action: (.*?)[\n]*Action Input:[\s]*(.*?)(?=\n\s*(?:Action|Thought):|\Z)", re.DOTALL)
+
+# Output parser for steps that may request several tools
+class QpcMultiActionOutputParser(MultiActionAgentOutputParser):
+    def parse(self, llm_output: str) -> Union[List[AgentAction], AgentFinish]:
+        if "Final Answer:" in llm_output:
+            return AgentFinish(
+                return_values={"output": llm_output.split("Final Answer:")[-1].strip()},
+                log=llm_output,
+            )
+        
+        actions = []
+        for match in _ACTION_BLOCK.finditer(llm_output):
+            action = AgentAction(tool=match.group(1).strip(), tool_input=match.group(2).strip(), log=match.group(0))
+            # The same call twice in one step would only repeat its observation
+            if all((a.tool, a.tool_input) != (action.tool, action.tool_input) for a in actions):
+                actions.append(action)
+        
+        if not actions:
+            return AgentFinish(
+                return_values={"output": UNPARSED_ANSWER},
+                log=llm_output,
+            )
+        return actions
+
+class LLMMultiActionAgent(BaseMultiActionAgent):
+    """
+    Counterpart of LLMSingleActionAgent whose steps may return several actions
+    """
+    llm_chain: LLMChain
+    output_parser: MultiActionAgentOutputParser
+    stop: List[str]
+
+    @property
+    def input_keys(self) -> List[str]:
+        return list(set(self.llm_chain.input_keys) - {"intermediate_steps"})
+
+    def plan(self, intermediate_steps, callbacks=None, **kwargs) -> Union[List[AgentAction], AgentFinish]:
+        output = self.llm_chain.run(intermediate_steps=intermediate_steps, stop=self.stop, callbacks=callbacks, **kwargs)
+        return self.output_parser.parse(output)
+
+    async def aplan(self, intermediate_steps, callbacks=None, **kwargs) -> Union[List[AgentAction], AgentFinish]:
+        output = await self.llm_chain.arun(intermediate_steps=intermediate_steps, stop=self.stop, callbacks=callbacks, **kwargs)
+        return self.output_parser.parse(output)
+
+    def tool_run_logging_kwargs(self) -> Dict:
+        return {"llm_prefix": "", "observation_prefix": self.stop[0] if self.stop else ""}
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that starts all the actions of a step at once on the tool
+    pool, then returns their observations together in the order requested
+    """
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        started = []
+        for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager):
+            if isinstance(item, Future):
+                started.append(item)
+            else:
+                yield item
+        for future in started:
+            yield future.result(timeout=executor_pool.timeout)
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> Future:
+        # The base step calls this once per action; submitting here lets the actions overlap
+        perform = partial(super()._perform_agent_action, name_to_tool_map, color_mapping, agent_action, run_manager)
+        try:
+            return executor_pool.tools.submit(perform)
+        except ExecutorSaturated:
+            future = Future()
+            try:
+                future.set_result(perform())
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
 # Create the LLM and agent
-def create_qpc_agent(llm=None):
+def create_qpc_agent(llm=None, mode: str = AGENT_MODE):
     if llm is None:
         llm = init_llm()
     
     tools = get_tools()
-    memory = ConversationBufferMemory(memory_key="chat_history")
     
     template = """You are a QPU Analysis agent that can answer questions about QPU blocks and costs.
 
@@ -143,7 +213,7 @@ Thought: Consider what tools might help you answer this question
 Action: The tool to use (must be one of the tool names listed above)
 Action Input: Input for the tool
 Observation: Result from using the tool
-... (repeat Action/Action Input/Observation as needed)
+... (repeat Action/Action Input/Observation as needed){parallel_note}
 Thought: Now I have the information to answer the question
 Final Answer: The final answer to the original question
 
@@ -156,27 +226,39 @@ Question: {input}
 {agent_scratchpad}
 """
 
+    parallel = mode == "parallel"
+    parallel_note = (
+        "\nWhen several tools are needed and they do not depend on each other, give all their "
+        "Action/Action Input pairs before the Observation; their results come back together."
+    ) if parallel else ""
+    
     prompt = QpcPromptTemplate(
-        template=template,
+        template=template.replace("{parallel_note}", parallel_note),
         tools=tools,
-        input_variables=["input", "chat_history", "agent_scratchpad"]
+        input_variables=["input", "chat_history", "intermediate_steps"]
     )
     
-    output_parser = QpcOutputParser()
-    
     llm_chain = LLMChain(llm=llm, prompt=prompt)
     
-    agent = LLMSingleActionAgent(
-        llm_chain=llm_chain,
-        output_parser=output_parser,
-        stop=["Observation:"],
-        allowed_tools=[tool.name for tool in tools],
-    )
+    if parallel:
+        agent = LLMMultiActionAgent(
+            llm_chain=llm_chain,
+            output_parser=QpcMultiActionOutputParser(),
+            stop=["Observation:"],
+        )
+        executor_class = ParallelAgentExecutor
+    else:
+        agent = LLMSingleActionAgent(
+            llm_chain=llm_chain,
+            output_parser=QpcOutputParser(),
+            stop=["Observation:"],
+            allowed_tools=[tool.name for tool in tools],
+        )
+        executor_class = AgentExecutor
     
-    agent_executor = AgentExecutor.from_agent_and_tools(
+    agent_executor = executor_class.from_agent_and_tools(
         agent=agent,
         tools=tools,
-        memory=memory,
         verbose=True,
         handle_parsing_errors=True,
     )
@@ -184,20 +266,29 @@ Question: {input}
     return agent_executor
 
 # Function to execute agent with a query
-async def process_query_with_agent(query: str, history: List[Dict[str, str]]):
-    agent_executor = create_qpc_agent()
+async def process_query_with_agent(
+    query: str,
+    history: List[Dict[str, str]],
+    callbacks: Optional[List[Any]] = None,
+    memory: Optional[ConversationMemory] = None,
+):
+    llm = init_llm()
+    agent_executor = create_qpc_agent(llm)
+    
+    # Chat history is bounded: recent turns plus a summary of older ones
+    if memory is None:
+        memory = await executor_pool.run_in_thread(ConversationMemory.from_history, history)
+    chat_history = memory.render()
     
-    # Format history for agent
-    chat_history = ""
-    for entry in history:
-        if 'user' in entry and entry['user']:
-            chat_history += f"Human: {entry['user']}\n"
-        if 'assistant' in entry and entry['assistant']:
-            chat_history += f"AI: {entry['assistant']}\n"
+    # The preamble's key/value states are computed once per model; the history's once per request
+    await executor_pool.run_in_thread(cache_prompt_prefixes, agent_executor, llm, chat_history)
     
-    result = await agent_executor.arun(
+    # The agent loop (LLM steps and tools) runs on a worker thread
+    result = await executor_pool.run_in_thread(
+        agent_executor.run,
         input=query,
-        chat_history=chat_history
+        chat_history=chat_history,
+        callbacks=callbacks
     )
     
     return result
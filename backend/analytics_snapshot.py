@@ -0,0 +1,138 @@
+"""
+Pre-computed analytics, rebuilt at startup and whenever the dataset changes
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from data_processor import get_qpu_summary, get_block_efficiency_frame, get_daily_workloads_frame
+from dataset_store import dataset_store, DEFAULT_DATASET
+from fast_json import frame_to_json
+from metrics import metrics
+from tool_results import TOOLS, ToolResult, run_tool, tool_kwargs
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for dataset changes made outside the API (0 disables the watcher)
+ANALYTICS_REFRESH_INTERVAL = float(os.getenv("ANALYTICS_REFRESH_INTERVAL", "30"))
+
+@dataclass(frozen=True)
+class AnalyticsSnapshot:
+    """
+    Analytics for one dataset version. Never modified after it is built;
+    a new snapshot replaces it as a whole.
+    """
+    version: str
+    built_at: float
+    build_seconds: float
+    summary: Dict[str, Any]
+    # Default-parameter result of every cacheable agent tool
+    tools: Dict[str, ToolResult] = field(default_factory=dict)
+    # Encoded JSON bodies of the full-range frame endpoints, keyed by (name, format)
+    frames: Dict[Any, bytes] = field(default_factory=dict)
+
+def build_snapshot(dataset: str = DEFAULT_DATASET) -> AnalyticsSnapshot:
+    """
+    Compute the summary, per-day frames and default tool results for the current dataset version
+    """
+    started = time.perf_counter()
+    version = dataset_store.version(dataset)
+
+    tools = {name: spec.build(**tool_kwargs(spec, None)) for name, spec in TOOLS.items() if spec.cacheable}
+
+    frames = {}
+    for name, build_frame in (("efficiency", get_block_efficiency_frame), ("daily_workloads", get_daily_workloads_frame)):
+        frame = build_frame()
+        for orient in ("records", "columns"):
+            frames[(name, orient)] = frame_to_json(frame, orient=orient)
+
+    return AnalyticsSnapshot(
+        version=version,
+        built_at=time.time(),
+        build_seconds=time.perf_counter() - started,
+        summary=get_qpu_summary(),
+        tools=tools,
+        frames=frames,
+    )
+
+class AnalyticsMaterializer:
+    """
+    Holds the current snapshot and rebuilds it when the dataset version moves.
+
+    Readers get the snapshot reference without locking; a rebuild happens on
+    one thread at a time and swaps the reference when complete, so readers
+    always see either the old or the new snapshot in full.
+    """
+    def __init__(self, dataset: str = DEFAULT_DATASET, interval: float = ANALYTICS_REFRESH_INTERVAL):
+        self.dataset = dataset
+        self.interval = interval
+        self._snapshot: Optional[AnalyticsSnapshot] = None
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def current(self) -> AnalyticsSnapshot:
+        """
+        Return the snapshot for the current dataset version, rebuilding it first if the data changed
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == dataset_store.version(self.dataset):
+            return snapshot
+        return self.refresh()
+
+    def refresh(self, force: bool = False) -> AnalyticsSnapshot:
+        """
+        Rebuild the snapshot if the dataset changed (or always with force=True)
+        """
+        with self._build_lock:
+            snapshot = self._snapshot
+            # Another thread may have rebuilt it while we waited for the lock
+            if not force and snapshot is not None and snapshot.version == dataset_store.version(self.dataset):
+                return snapshot
+            snapshot = build_snapshot(self.dataset)
+            self._snapshot = snapshot
+            logger.info(f"Analytics snapshot for {snapshot.version} built in {snapshot.build_seconds:.2f}s")
+            return snapshot
+
+    def tool_result(self, name: str, tool_input: Optional[str] = None) -> ToolResult:
+        """
+        Tool result from the snapshot when called with default parameters, otherwise computed.
+        Calls are timed per tool in qpu_tool_seconds.
+        """
+        with metrics.span("tool", histogram=metrics.tool_seconds, tool=name):
+            spec = TOOLS.get(name)
+            if spec is not None and spec.cacheable and tool_kwargs(spec, tool_input) == tool_kwargs(spec, None):
+                return self.current().tools[name]
+            return run_tool(name, tool_input)
+
+    def render_tool(self, name: str, tool_input: Optional[str] = None) -> str:
+        return self.tool_result(name, tool_input).render()
+
+    def start(self):
+        """
+        Build the first snapshot and start watching for dataset changes
+        """
+        self.refresh()
+        if self.interval > 0 and self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="analytics-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.current()
+            except Exception as e:
+                logger.error(f"Error refreshing analytics snapshot: {e}")
+
+# Create a singleton instance for easy import
+analytics = AnalyticsMaterializer()
@@ -1,26 +1,53 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
 import json
+import asyncio
+import concurrent.futures
 import base64
 import os
-import tempfile
+import time
+import logging
 import uvicorn
 
 from llm_handler import process_query_with_llm
-from agent import process_query_with_agent
+from agent import process_query_with_agent, is_fallback_answer
 from data_processor import (
     get_top_active_qpc_blocks, 
     analyze_cost_impact, 
     get_daily_costs, 
     get_qpu_summary,
-    get_block_efficiency,
-    get_daily_workloads
+    get_block_efficiency_frame,
+    get_daily_workloads_frame
 )
-from visualization import generate_trend_graph, generate_workloads_graph, generate_efficiency_graph
+from fast_json import frame_to_json
+from time_index import select
+from data_handler import append_daily_rows
+from optimisation_strategies import batch_savings_curve
+from scenarios import run_cost_scenarios
+from tool_results import TOOLS
+from analytics_snapshot import analytics
+from intent_router import intent_router, ROUTER_ENABLED, ROUTER_RESPONSE_TOKENS
+from dataset_store import DEFAULT_DATASET
+from render_cache import render_cache
+from render_jobs import render_jobs
+from chart_specs import get_chart_spec, chart_etag, CHARTS, CHART_MAX_POINTS, CHART_POINTS_LIMIT
+from response_cache import response_cache, RESPONSE_CACHE_HISTORY_TURNS
+from conversation_memory import ConversationMemory
+from session_store import session_store
+from model_registry import model_registry
+from chat_stream import stream_chat_events, format_sse
+from executors import executor_pool, ExecutorSaturated
+from metrics import metrics
+from llm_config import WARM_MODELS
+
+logger = logging.getLogger(__name__)
+
+# Debug mode adds a per-stage timing block to chat responses
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
 app = FastAPI(title="QPU Analysis Chatbot API")
 
@@ -31,127 +58,606 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
-# Create a temp directory for storing generated graphs if it doesn't exist
-GRAPH_DIR = os.path.join(tempfile.gettempdir(), "qpu_graphs")
-os.makedirs(GRAPH_DIR, exist_ok=True)
-
 # Mount static files directory if it exists
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 if os.path.exists(STATIC_DIR):
     app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """
+    Record the latency of each request, labelled by route template rather than raw path
+    """
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.http_seconds.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    return response
+
+def _cache_metrics():
+    """
+    Hit/miss counters the caches already keep, reported at each /metrics scrape
+    """
+    responses = response_cache.stats()
+    hits = [
+        ({"cache": "responses"}, responses["hits"] + responses["semantic_hits"]),
+        ({"cache": "graphs"}, render_cache.hits),
+    ]
+    misses = [
+        ({"cache": "responses"}, responses["misses"]),
+        ({"cache": "graphs"}, render_cache.misses),
+    ]
+    for model, stats in model_registry.inference_stats().items():
+        if stats["prefix_cache"] is not None:
+            hits.append(({"cache": "prefix", "model": model}, stats["prefix_cache"]["hits"]))
+            misses.append(({"cache": "prefix", "model": model}, stats["prefix_cache"]["misses"]))
+    return [
+        ("qpu_cache_hits_total", "counter", "Cache hits", hits),
+        ("qpu_cache_misses_total", "counter", "Cache misses", misses),
+        ("qpu_sessions_active", "gauge", "Chat sessions held in memory", [({}, session_store.stats()["active"])]),
+        ("qpu_render_jobs_in_flight", "gauge", "Graph renders in progress", [({}, render_jobs.stats()["in_flight"])]),
+    ]
+
+metrics.register_collector(_cache_metrics)
+
+@app.on_event("startup")
+def warm_models():
+    """
+    Load and warm the configured models once so chat requests share them
+    """
+    model_registry.warm_up(WARM_MODELS)
+
+@app.on_event("startup")
+def materialize_analytics():
+    """
+    Pre-compute the summary, frames and default tool results, and watch for data changes
+    """
+    analytics.start()
+
 class ChatRequest(BaseModel):
     message: str
     history: List[Dict[str, str]] = []
     use_agent: bool = True  # Flag to use the agent-based approach
+    session_id: Optional[str] = None  # Server-side conversation; history is then not needed
+    client_charts: bool = False  # The client draws graphs from /api/charts, so no PNG is rendered
+    graph_jobs: bool = False  # The client polls /api/jobs for uncached graphs instead of waiting for them
 
 class ChatResponse(BaseModel):
     response: str
     graph: Optional[str] = None
+    # Set instead of `graph` while the graph is still rendering, for requests with
+    # `graph_jobs`; see /api/jobs/{job_id}
+    graph_job: Optional[str] = None
+    # Chart type to fetch from /api/charts/{chart}, for clients that draw graphs themselves
+    chart: Optional[str] = None
+    session_id: Optional[str] = None
+    # Per-stage timings of this request, in debug mode
+    timings: Optional[Dict[str, Any]] = None
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+def _error_response(e: Exception) -> HTTPException:
+    """
+    Map an exception to the HTTP error returned to the client
+    """
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, ExecutorSaturated):
+        return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    if isinstance(e, (asyncio.TimeoutError, concurrent.futures.TimeoutError)):
+        return HTTPException(status_code=504, detail="Request timed out")
+    return HTTPException(status_code=500, detail=str(e))
+
+async def _attach_graph(graph_type: Optional[str], graph_jobs: bool = False):
+    """
+    Return (base64 graph, None) once the graph is rendered. Clients that opt in
+    with `graph_jobs` get (None, job id) for an uncached graph instead, so the
+    text answer does not wait for rendering.
+    """
+    if graph_type is None:
+        return None, None
     try:
-        # Process the query using LLM and our tools
-        message = request.message.lower()
-        response = ""
-        graph_b64 = None
+        job = render_jobs.submit(graph_type)
+        if job.status != "done":
+            if graph_jobs:
+                return None, job.id
+            await job.wait()
+    except Exception as e:
+        # The answer is still useful without its graph (pool saturated, render failed or timed out)
+        logger.warning(f"Graph not attached: {e}")
+        return None, None
+    with metrics.span("graph_encode"):
+        return base64.b64encode(job.graph.data).decode('utf-8'), None
+
+GRAPH_CAPTIONS = {
+    "costs": "Here's the trend of daily costs over time:",
+    "workloads": "Here are the daily workloads over time:",
+    "efficiency": "Here are the block efficiency metrics over time:",
+}
+
+async def _answer_with_tool(route):
+    """
+    Answer a routed query straight from its tool, without LLM inference.
+    Returns the text and the graph type to attach, if any.
+    """
+    if route.graph_type is not None:
+        return GRAPH_CAPTIONS[route.graph_type], route.graph_type
+    result = await executor_pool.run_in_thread(analytics.tool_result, route.tool, route.tool_input)
+    return result.render(ROUTER_RESPONSE_TOKENS), None
+
+async def _conversation(request: ChatRequest):
+    """
+    Return (session id, memory) for a request.
+    
+    Requests with a session id use the server-side memory; an unknown or expired
+    id starts a new session. Requests that send their own history get a
+    throwaway memory built from it, and new conversations get a new session.
+    """
+    if request.session_id:
+        memory = await executor_pool.run_in_thread(session_store.get, request.session_id)
+        if memory is not None:
+            return request.session_id, memory
+    elif request.history:
+        return None, await executor_pool.run_in_thread(ConversationMemory.from_history, request.history)
+    
+    session_id = await executor_pool.run_in_thread(session_store.create, request.history)
+    return session_id, session_store.get(session_id)
+
+async def _answer_chat(request: ChatRequest, callbacks: Optional[List[Any]] = None):
+    """
+    Produce the chat response for a request (with a graph or a graph job),
+    and record the turn in the session memory
+    """
+    with metrics.trace() as trace:
+        session_id, memory = await _conversation(request)
+        response, graph_type = await _answer_query(request, memory, callbacks)
+        if session_id is not None:
+            await executor_pool.run_in_thread(session_store.append, session_id, request.message, response)
+        if request.client_charts:
+            result = ChatResponse(response=response, chart=graph_type, session_id=session_id)
+        else:
+            graph_b64, graph_job = await _attach_graph(graph_type, request.graph_jobs)
+            result = ChatResponse(response=response, graph=graph_b64, graph_job=graph_job, session_id=session_id)
+    if DEBUG:
+        result.timings = trace.to_dict()
+    return result
+
+async def _answer_query(request: ChatRequest, memory: ConversationMemory, callbacks: Optional[List[Any]] = None):
+    # Process the query using LLM and our tools
+    message = request.message.lower()
+    response = ""
+    graph_type = None
+    
+    # Clear single-tool questions skip the agent
+    route = intent_router.route(request.message) if request.use_agent and ROUTER_ENABLED else None
+    if route is not None:
+        return await _answer_with_tool(route)
+    
+    # Use the agent-based approach by default
+    if request.use_agent:
+        # Repeated questions are answered from the response cache
+        recent = memory.recent_history(RESPONSE_CACHE_HISTORY_TURNS)
+        cached = await executor_pool.run_in_thread(response_cache.get, request.message, recent)
+        if cached is not None:
+            response = cached
+        else:
+            response = await process_query_with_agent(request.message, [], callbacks=callbacks, memory=memory)
+            # A failed run is retried next time rather than served from the cache
+            if not is_fallback_answer(response):
+                await executor_pool.run_in_thread(response_cache.put, request.message, recent, response)
         
-        # Use the agent-based approach by default
-        if request.use_agent:
-            response = await process_query_with_agent(request.message, request.history)
+        # Check if we need to attach a graph
+        if "graph" in message or "visualization" in message or "trend" in message:
+            if "cost" in message or "daily cost" in message:
+                graph_type = "costs"
+            elif "workload" in message:
+                graph_type = "workloads"
+            elif "efficiency" in message or "ratio" in message:
+                graph_type = "efficiency"
+    else:
+        # Direct routing approach (legacy)
+        if "top 10 most active QPU blocks" in message:
+            top_blocks = await executor_pool.run_in_thread(get_top_active_qpc_blocks)
+            response = f"The top 10 most active QPU blocks by number of workloads executed are:\n\n{top_blocks}"
+            
+        elif "cost" in message and "atom blocks" in message:
+            cost_impact = await executor_pool.run_in_thread(analyze_cost_impact)
+            response = f"If you only use Atom blocks: {cost_impact}"
+            
+        elif "graph" in message and "trend of daily costs" in message:
+            graph_type = "costs"
+            response = "Here's the trend of daily costs over time:"
             
-            # Check if we need to attach a graph
-            if "graph" in message or "visualization" in message or "trend" in message:
-                if "cost" in message or "daily cost" in message:
-                    graph_path = generate_trend_graph()
-                    with open(graph_path, "rb") as img_file:
-                        graph_b64 = base64.b64encode(img_file.read()).decode('utf-8')
-                elif "workload" in message:
-                    graph_path = generate_workloads_graph()
-                    with open(graph_path, "rb") as img_file:
-                        graph_b64 = base64.b64encode(img_file.read()).decode('utf-8')
-                elif "efficiency" in message or "ratio" in message:
-                    graph_path = generate_efficiency_graph()
-                    with open(graph_path, "rb") as img_file:
-                        graph_b64 = base64.b64encode(img_file.read()).decode('utf-8')
         else:
-            # Direct routing approach (legacy)
-            if "top 10 most active QPU blocks" in message:
-                top_blocks = get_top_active_qpc_blocks()
-                response = f"The top 10 most active QPU blocks by number of workloads executed are:\n\n{top_blocks}"
-                
-            elif "cost" in message and "atom blocks" in message:
-                cost_impact = analyze_cost_impact()
-                response = f"If you only use Atom blocks: {cost_impact}"
-                
-            elif "graph" in message and "trend of daily costs" in message:
-                graph_path = generate_trend_graph()
-                with open(graph_path, "rb") as img_file:
-                    graph_b64 = base64.b64encode(img_file.read()).decode('utf-8')
-                response = "Here's the trend of daily costs over time:"
-                
-            else:
-                # Default to LLM for other queries
-                response = await process_query_with_llm(request.message, request.history)
-        
-        return ChatResponse(response=response, graph=graph_b64)
+            # Default to LLM for other queries
+            response = await process_query_with_llm(request.message, [], callbacks=callbacks, memory=memory)
+    
+    return response, graph_type
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest):
+    try:
+        return await _answer_chat(request)
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _error_response(e)
+
+@app.get("/api/sessions/{session_id}", response_model=Dict[str, Any])
+async def get_session(session_id: str):
+    """
+    The summary and recent turns the server keeps for a session
+    """
+    memory = await executor_pool.run_in_thread(session_store.get, session_id)
+    if memory is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    summary, turns, total_turns = memory.state()
+    return {
+        "session_id": session_id,
+        "summary": summary,
+        "turns": [{"user": t.user, "assistant": t.assistant} for t in turns],
+        "total_turns": total_turns,
+    }
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    await executor_pool.run_in_thread(session_store.delete, session_id)
+    return {"deleted": session_id}
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Stream agent thoughts, tool observations and answer tokens as Server-Sent Events.
+    The last event is "done" with the same payload as /api/chat.
+    """
+    events = stream_chat_events(lambda callbacks: _answer_chat(request, callbacks), lambda result: result.model_dump())
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _frame_response(snapshot_key: str, build_frame, format: str, range_query: Optional[Dict[str, Any]] = None) -> Response:
+    """
+    Build a DataFrame off the event loop and encode it straight to JSON,
+    skipping per-row dicts and response-model validation.
+    
+    With a range query, rows come from the date index and the cursor for the
+    next page (if any) is returned in the X-Next-Cursor header. Without one, the
+    body pre-encoded under `snapshot_key` in the analytics snapshot is returned.
+    """
+    if format not in ("records", "columns"):
+        raise HTTPException(status_code=400, detail="Invalid format, expected 'records' or 'columns'")
+    
+    def encode():
+        if not range_query:
+            # Full-range bodies are pre-encoded in the analytics snapshot
+            return analytics.current().frames[(snapshot_key, format)], None
+        rows, next_cursor = select(**range_query)
+        return frame_to_json(build_frame(rows), orient=format), next_cursor
+    
+    try:
+        content, next_cursor = await executor_pool.run_in_thread(encode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=content, media_type="application/json", headers=headers)
+
+def _range_query(start, end, limit, cursor, resolution) -> Optional[Dict[str, Any]]:
+    if start is None and end is None and limit is None and cursor is None and resolution == "day":
+        return None
+    return {"start": start, "end": end, "limit": limit, "cursor": cursor, "resolution": resolution}
 
 # New endpoints for summary data
 @app.get("/api/summary", response_model=Dict[str, Any])
-async def get_summary():
+async def get_summary(start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Get summary data about QPU blocks and workloads, optionally for a date range
+    (YYYY-MM-DD, or relative starts such as -7d)
+    """
+    try:
+        if start is None and end is None:
+            snapshot = await executor_pool.run_in_thread(analytics.current)
+            return snapshot.summary
+        
+        def summarize():
+            rows, _ = select(start=start, end=end)
+            return get_qpu_summary(rows)
+        
+        return await executor_pool.run_in_thread(summarize)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise _error_response(e)
+
+@app.get("/api/daily_workloads")
+async def get_workloads(
+    format: str = "records",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    resolution: str = "day",
+):
     """
-    Get summary data about QPU blocks and workloads
+    Get daily workload data. Use format=columns for one array per field, and
+    start/end/limit/cursor/resolution (day, week, month) to page through ranges.
     """
     try:
-        return get_qpu_summary()
+        return await _frame_response(
+            "daily_workloads", get_daily_workloads_frame, format, _range_query(start, end, limit, cursor, resolution)
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _error_response(e)
 
-@app.get("/api/daily_workloads", response_model=List[Dict[str, Any]])
-async def get_workloads():
+@app.get("/api/efficiency")
+async def get_efficiency(
+    format: str = "records",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    resolution: str = "day",
+):
     """
-    Get daily workload data
+    Get block efficiency metrics. Use format=columns for one array per field, and
+    start/end/limit/cursor/resolution (day, week, month) to page through ranges.
     """
     try:
-        return get_daily_workloads()
+        return await _frame_response(
+            "efficiency", get_block_efficiency_frame, format, _range_query(start, end, limit, cursor, resolution)
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _error_response(e)
+
+def _graph_params(graph_type: str, dpi: int) -> Dict[str, Any]:
+    if graph_type not in ("costs", "workloads", "efficiency"):
+        raise HTTPException(status_code=400, detail="Invalid graph type")
+    return {"dpi": max(50, min(dpi, 300))}
 
-@app.get("/api/efficiency", response_model=List[Dict[str, Any]])
-async def get_efficiency():
+@app.get("/api/charts/{chart_type}")
+async def get_chart(
+    chart_type: str,
+    request: Request,
+    points: int = CHART_MAX_POINTS,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    resolution: str = "day",
+):
     """
-    Get block efficiency metrics
+    Series data and axis metadata for drawing a graph in the browser, downsampled
+    to about `points` points (the width of the chart in pixels is a good value)
     """
+    if chart_type not in CHARTS:
+        raise HTTPException(status_code=400, detail="Invalid chart type")
     try:
-        return get_block_efficiency()
+        points = max(3, min(points, CHART_POINTS_LIMIT))
+        range_query = {"start": start, "end": end, "resolution": resolution}
+        headers = {"ETag": chart_etag(chart_type, points, **range_query), "Cache-Control": "no-cache"}
+        
+        if_none_match = request.headers.get("if-none-match", "")
+        if headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        
+        spec = await executor_pool.run_in_thread(get_chart_spec, chart_type, points, **range_query)
+        return JSONResponse(content=spec, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _error_response(e)
 
 @app.get("/api/graphs/{graph_type}")
-async def get_graph(graph_type: str):
+async def get_graph(graph_type: str, request: Request, dpi: int = 300):
     """
-    Get a specific graph
+    Get a specific graph. Responses carry an ETag, so clients revalidating with
+    If-None-Match get a 304 while the underlying data is unchanged.
     """
     try:
-        graph_path = ""
-        if graph_type == "costs":
-            graph_path = generate_trend_graph()
-        elif graph_type == "workloads":
-            graph_path = generate_workloads_graph()
-        elif graph_type == "efficiency":
-            graph_path = generate_efficiency_graph()
-        else:
-            raise HTTPException(status_code=400, detail="Invalid graph type")
+        params = _graph_params(graph_type, dpi)
+        
+        # Concurrent requests for the same graph share one render
+        rendered = await render_jobs.submit(graph_type, **params).wait()
+        headers = {"ETag": rendered.etag, "Cache-Control": "no-cache"}
         
-        return FileResponse(graph_path)
+        if_none_match = request.headers.get("if-none-match", "")
+        if rendered.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        
+        return Response(content=rendered.data, media_type="image/png", headers=headers)
+    except Exception as e:
+        raise _error_response(e)
+
+@app.post("/api/graphs/{graph_type}/jobs", status_code=202)
+async def submit_graph_job(graph_type: str, dpi: int = 300):
+    """
+    Queue a graph render and return its job id at once. Poll /api/jobs/{job_id}
+    or subscribe to /api/jobs/{job_id}/events, then fetch the graph URL.
+    """
+    try:
+        params = _graph_params(graph_type, dpi)
+        job = render_jobs.submit(graph_type, **params)
+        return {**job.to_dict(), "url": f"/api/graphs/{graph_type}?dpi={params['dpi']}"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _error_response(e)
+
+def _job_or_404(job_id: str):
+    job = render_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_graph_job(job_id: str, wait: float = 0):
+    """
+    Status of a render job. With wait > 0, long-polls up to that many seconds for it to finish.
+    """
+    job = _job_or_404(job_id)
+    if wait > 0 and job.status in ("pending", "running"):
+        try:
+            await job.wait(timeout=min(wait, 30))
+        except Exception:
+            pass
+    return {**job.to_dict(), "url": f"/api/graphs/{job.graph_type}?dpi={job.params['dpi']}"}
+
+@app.get("/api/jobs/{job_id}/events")
+async def graph_job_events(job_id: str):
+    """
+    Server-Sent Events for a render job: its current status, then "done" or "error"
+    """
+    job = _job_or_404(job_id)
+    
+    async def events():
+        url = f"/api/graphs/{job.graph_type}?dpi={job.params['dpi']}"
+        yield format_sse("status", job.to_dict())
+        try:
+            await job.wait()
+            yield format_sse("done", {**job.to_dict(), "url": url})
+        except Exception as e:
+            yield format_sse("error", {**job.to_dict(), "detail": job.error or str(e) or "Render timed out"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/strategies/batch_windows")
+async def get_batch_windows(max_window: int = 30, format: str = "records"):
+    """
+    Savings curve for batch scheduling windows 1..max_window, plus the best window
+    """
+    try:
+        if max_window < 1:
+            raise HTTPException(status_code=400, detail="max_window must be at least 1")
+        if format not in ("records", "columns"):
+            raise HTTPException(status_code=400, detail="Invalid format, expected 'records' or 'columns'")
+        
+        def build():
+            curve = batch_savings_curve(max_window=max_window)
+            best = curve.loc[curve["cost_saving"].idxmax()]
+            return curve, {"batch_window": int(best["batch_window"]), "cost_saving": float(best["cost_saving"]),
+                           "percentage": float(best["percentage"])}
+        
+        curve, best = await executor_pool.run_in_thread(build)
+        return {"best": best, "curve": curve.to_dict(orient="list" if format == "columns" else "records")}
+    except Exception as e:
+        raise _error_response(e)
+
+@app.get("/api/strategies/scenarios")
+async def get_cost_scenarios(
+    draws: int = 5000,
+    atom_ratio_min: float = 0.5,
+    atom_ratio_max: float = 0.9,
+    reduction_min: float = 5,
+    reduction_max: float = 15,
+    window_min: int = 1,
+    window_max: int = 14,
+    workload_noise: float = 0.1,
+    seed: Optional[int] = None,
+    parallel: bool = False,
+):
+    """
+    Monte Carlo savings distributions (mean, std, P10/P50/P90) for each cost-saving strategy
+    """
+    try:
+        if not 1 <= draws <= 200000:
+            raise HTTPException(status_code=400, detail="draws must be between 1 and 200000")
+        return await executor_pool.run_in_thread(
+            run_cost_scenarios,
+            n_draws=draws,
+            atom_ratio=(atom_ratio_min, atom_ratio_max),
+            reduction_percent=(reduction_min, reduction_max),
+            batch_window=(window_min, window_max),
+            workload_noise=workload_noise,
+            seed=seed,
+            parallel=parallel,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise _error_response(e)
+
+@app.get("/api/tools")
+async def list_tools():
+    """
+    Tools available to the agent and the parameter each one accepts
+    """
+    return [
+        {"name": spec.name, "description": spec.description,
+         "parameter": {"name": spec.param[0], "default": spec.param[1]} if spec.param else None}
+        for spec in TOOLS.values()
+    ]
+
+@app.get("/api/tools/{name}")
+async def call_tool(name: str, input: Optional[str] = None):
+    """
+    Run an agent tool and return its structured result (the same one the agent sees rendered)
+    """
+    try:
+        if name not in TOOLS:
+            raise HTTPException(status_code=404, detail=f"Tool {name} not found")
+        result = await executor_pool.run_in_thread(analytics.tool_result, name, input)
+        return result.to_dict()
+    except Exception as e:
+        raise _error_response(e)
+
+class DailyRow(BaseModel):
+    date: str
+    new_blocks_atom: int
+    new_blocks_photon: int
+    new_blocks_spin: int
+    daily_workloads: int
+    workloads_new_blocks: int
+    acquisition_cost: float
+    lease_fee_cost: float
+    workload_trigger_cost: float
+    workload_execution_cost: float
+
+class IngestRequest(BaseModel):
+    rows: List[DailyRow]
+    dataset: str = DEFAULT_DATASET
+
+@app.post("/api/ingest", response_model=Dict[str, Any])
+async def ingest_rows(request: IngestRequest):
+    """
+    Append new days to a dataset; cumulative columns and running totals are updated incrementally
+    """
+    try:
+        rows = [row.model_dump() for row in request.rows]
+        result = await executor_pool.run_in_thread(append_daily_rows, rows, request.dataset)
+        # Rebuild the analytics snapshot now rather than on the next read
+        await executor_pool.run_in_thread(analytics.refresh)
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise _error_response(e)
+
+@app.get("/api/cache/stats", response_model=Dict[str, Any])
+async def get_cache_stats():
+    """
+    Hit/miss counters for the chat response cache and the graph render cache
+    """
+    return {
+        "responses": response_cache.stats(),
+        "graphs": {"hits": render_cache.hits, "misses": render_cache.misses},
+        "sessions": session_store.stats(),
+        "render_jobs": render_jobs.stats(),
+        "inference": model_registry.inference_stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Stage latencies, tool latencies, token and cache counters in the Prometheus text format
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -164,5 +670,10 @@ async def root():
     else:
         return JSONResponse(content={"message": "Welcome to QPU Analysis Chatbot API. Frontend not found."})
 
+@app.on_event("shutdown")
+def shutdown_executors():
+    analytics.stop()
+    executor_pool.shutdown()
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,141 @@
+"""
+Compact chart data for drawing the graphs in the browser instead of rendering PNGs
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_processor import get_block_efficiency_frame
+from dataset_store import dataset_store, DEFAULT_DATASET
+from time_index import select
+
+# Default number of points per chart, about one per horizontal pixel of the chat panel
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+# Upper bound on the points a client may ask for
+CHART_POINTS_LIMIT = int(os.getenv("CHART_POINTS_LIMIT", "5000"))
+
+# Chart layout and series, matching the matplotlib graphs in visualization.py
+CHARTS: Dict[str, Dict[str, Any]] = {
+    "costs": {
+        "title": "Trend of Daily Costs",
+        "kind": "line",
+        "axes": [{"id": "y", "label": "Daily Cost ($)", "format": "currency"}],
+        "series": [{"name": "Total daily cost", "column": "total_daily_cost", "axis": "y", "color": "#3366cc"}],
+    },
+    "workloads": {
+        "title": "Daily Workloads Over Time",
+        "kind": "bar",
+        "axes": [{"id": "y", "label": "Number of Workloads", "format": "integer"}],
+        "series": [{"name": "Workloads", "column": "daily_workloads", "axis": "y", "color": "#5cb85c"}],
+    },
+    "efficiency": {
+        "title": "Block Efficiency Metrics Over Time",
+        "kind": "line",
+        "axes": [
+            {"id": "y", "label": "Atom Block Ratio", "format": "ratio", "min": 0, "max": 1},
+            {"id": "y2", "label": "Cost per Workload ($)", "format": "currency2"},
+        ],
+        "series": [
+            {"name": "Atom Block Ratio", "column": "atom_block_ratio", "axis": "y", "color": "#3366cc"},
+            {"name": "Cost per Workload", "column": "cost_per_workload", "axis": "y2", "color": "#ff7f0e"},
+        ],
+    },
+}
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of `threshold` points
+    that preserve the visual shape of the series, including its peaks.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the points between the fixed first and last ones
+    edges = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # Pick the point forming the largest triangle with the previous pick and that average
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+def _series_frame(chart_type: str, rows: pd.DataFrame) -> pd.DataFrame:
+    if chart_type == "efficiency":
+        frame = get_block_efficiency_frame(rows)
+        return frame.assign(date=rows["date"].to_numpy())
+    return rows
+
+def build_chart_spec(
+    chart_type: str,
+    points: int = CHART_MAX_POINTS,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    resolution: str = "day",
+) -> Dict[str, Any]:
+    """
+    Series data for a chart, downsampled to at most about `points` points per series.
+
+    All series share one x array: the union of the points LTTB keeps for each series.
+    """
+    if chart_type not in CHARTS:
+        raise ValueError(f"Invalid chart type {chart_type}")
+    chart = CHARTS[chart_type]
+    rows, _ = select(start=start, end=end, resolution=resolution)
+    frame = _series_frame(chart_type, rows)
+
+    dates = frame["date"].to_numpy(dtype="datetime64[ns]")
+    x = dates.astype(np.int64) / 86_400e9
+    columns = [frame[s["column"]].to_numpy(dtype=float) for s in chart["series"]]
+
+    keep = np.unique(np.concatenate([lttb(x, y, points) for y in columns])) if len(x) else np.arange(0)
+    return {
+        "type": chart_type,
+        "title": chart["title"],
+        "kind": chart["kind"],
+        "axes": chart["axes"],
+        "x": pd.DatetimeIndex(dates[keep]).strftime("%Y-%m-%d").tolist(),
+        "series": [
+            {**{key: value for key, value in s.items() if key != "column"}, "y": np.round(y[keep], 4).tolist()}
+            for s, y in zip(chart["series"], columns)
+        ],
+        "points": int(len(keep)),
+        "total_points": int(len(x)),
+        "resolution": resolution,
+    }
+
+def get_chart_spec(chart_type: str, points: int = CHART_MAX_POINTS, **range_query) -> Dict[str, Any]:
+    """
+    build_chart_spec, memoized per dataset version for full-range charts
+    """
+    if any(value is not None for key, value in range_query.items() if key != "resolution"):
+        return build_chart_spec(chart_type, points, **range_query)
+    resolution = range_query.get("resolution", "day")
+    return dataset_store.derive(
+        DEFAULT_DATASET,
+        f"chart:{chart_type}:{points}:{resolution}",
+        lambda _: build_chart_spec(chart_type, points, resolution=resolution),
+    )
+
+def chart_etag(chart_type: str, points: int = CHART_MAX_POINTS, **range_query) -> str:
+    """
+    Validator for a chart spec; changes with the dataset version
+    """
+    payload = json.dumps(
+        [chart_type, dataset_store.version(DEFAULT_DATASET), points, range_query], sort_keys=True, default=str
+    )
+    return f'"{hashlib.sha256(payload.encode()).hexdigest()[:32]}"'
@@ -0,0 +1,103 @@
+"""
+Server-Sent Events streaming of agent progress for the chat endpoint
+"""
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import AgentAction, AgentFinish
+
+logger = logging.getLogger(__name__)
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Encode one Server-Sent Event
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class SSECallbackHandler(BaseCallbackHandler):
+    """
+    Forwards LLM tokens, agent actions and tool observations to an asyncio queue.
+
+    LangChain may call these hooks from worker threads, so events are handed to
+    the event loop with call_soon_threadsafe. Tokens generated before the
+    "Final Answer:" marker are reported as thoughts, the rest as answer tokens.
+    """
+    # Asks the LLM to generate through its token streamer for this request
+    streams_tokens = True
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self.loop = loop
+        self.queue = queue
+        # Set when the client disconnects, so batched generation can drop the request
+        self.cancelled = False
+        self._buffer = ""
+        self._answer_sent = 0
+
+    def _emit(self, event: str, data: Any):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any):
+        self._buffer = ""
+        self._answer_sent = 0
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        self._buffer += token
+        marker = self._buffer.find(FINAL_ANSWER_MARKER)
+        if marker < 0:
+            self._emit("thought", token)
+            return
+        answer = self._buffer[marker + len(FINAL_ANSWER_MARKER):].lstrip()
+        if len(answer) > self._answer_sent:
+            self._emit("token", answer[self._answer_sent:])
+            self._answer_sent = len(answer)
+
+    def on_agent_action(self, action: AgentAction, **kwargs: Any):
+        self._emit("action", {"tool": action.tool, "tool_input": str(action.tool_input)})
+
+    def on_tool_end(self, output: Any, **kwargs: Any):
+        self._emit("observation", str(output))
+
+    def on_agent_finish(self, finish: AgentFinish, **kwargs: Any):
+        self._emit("final", finish.return_values.get("output", ""))
+
+async def stream_chat_events(
+    run: Callable[[List[BaseCallbackHandler]], Awaitable[Any]],
+    finalize: Callable[[Any], Dict[str, Any]],
+) -> AsyncIterator[str]:
+    """
+    Run `run(callbacks)` in the background and yield its progress as SSE strings.
+
+    The stream ends with a "done" event built by `finalize(result)`, or an
+    "error" event if the run failed.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    handler = SSECallbackHandler(loop, queue)
+
+    task = asyncio.ensure_future(run([handler]))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            event, data = item
+            yield format_sse(event, data)
+
+        try:
+            result = task.result()
+            yield format_sse("done", finalize(result))
+        except Exception as e:
+            logger.error(f"Error while streaming chat response: {e}")
+            yield format_sse("error", {"detail": str(e)})
+    finally:
+        # The client went away before the run finished
+        if not task.done():
+            handler.cancelled = True
+            task.cancel()
@@ -0,0 +1,175 @@
+"""
+Columnar on-disk format for QPU datasets: one .npy file per column, loaded through memory mapping
+
+Usage:
+    python columnar_store.py data/qpu_dataset_hybrid.csv data/qpu_dataset_hybrid.cols
+    python columnar_store.py data/qpc_data.json data/qpc_data.cols
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "_meta.json"
+COLUMNAR_SUFFIX = ".cols"
+
+def is_columnar(path: Optional[str]) -> bool:
+    """
+    True if `path` is a column directory written by this module
+    """
+    return bool(path) and os.path.isfile(os.path.join(path, META_FILE))
+
+def meta_path(path: str) -> str:
+    return os.path.join(path, META_FILE)
+
+def _column_array(series: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series.to_numpy(dtype="datetime64[ns]")
+    if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy()
+    # Strings are stored fixed-width so they can be memory mapped too
+    return series.astype(str).to_numpy(dtype=str)
+
+def _write_columns_into(df: pd.DataFrame, path: str, attrs: Optional[Dict[str, Any]] = None):
+    os.makedirs(path, exist_ok=True)
+    digest = hashlib.sha1()
+    columns = []
+    for index, column in enumerate(df.columns):
+        array = _column_array(df[column])
+        file_name = f"{index:03d}.npy"
+        np.save(os.path.join(path, file_name), array, allow_pickle=False)
+        digest.update(str(column).encode())
+        digest.update(array.tobytes())
+        columns.append({"name": str(column), "file": file_name, "dtype": str(array.dtype)})
+
+    meta = {"rows": len(df), "columns": columns, "digest": digest.hexdigest(), "attrs": attrs or {}}
+    with open(meta_path(path), "w") as f:
+        json.dump(meta, f)
+
+def _staging_dir(path: str) -> str:
+    staging = f"{os.path.normpath(path)}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    return staging
+
+def _replace_dir(staging: str, path: str):
+    """
+    Move a fully written directory into place. The files it replaces are
+    unlinked rather than overwritten, so arrays still mapped from them stay valid.
+    """
+    path = os.path.normpath(path)
+    old = None
+    if os.path.exists(path):
+        old = f"{path}.old-{os.getpid()}"
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(path, old)
+    os.replace(staging, path)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+def write_columns(df: pd.DataFrame, path: str, attrs: Optional[Dict[str, Any]] = None):
+    """
+    Write a DataFrame as a column directory.
+
+    The directory is written next to the target and then swapped in, so
+    readers never see it partially written, and `df` may itself be memory
+    mapped from the directory being replaced.
+    """
+    staging = _staging_dir(path)
+    _write_columns_into(df, staging, attrs)
+    _replace_dir(staging, path)
+
+def read_meta(path: str) -> Dict[str, Any]:
+    with open(meta_path(path)) as f:
+        return json.load(f)
+
+def read_columns(path: str, columns: Optional[List[str]] = None, mmap: bool = True) -> pd.DataFrame:
+    """
+    Load a column directory as a DataFrame.
+
+    With mmap=True, numeric and date columns are backed by read-only memory maps,
+    so only the pages that are actually touched are read from disk.
+    """
+    meta = read_meta(path)
+    wanted = set(columns) if columns is not None else None
+    data = {}
+    for column in meta["columns"]:
+        if wanted is not None and column["name"] not in wanted:
+            continue
+        data[column["name"]] = np.load(
+            os.path.join(path, column["file"]),
+            mmap_mode="r" if mmap else None,
+            allow_pickle=False,
+        )
+    return pd.DataFrame(data, copy=False)
+
+def convert_csv(csv_path: str, out_path: str, date_column: str = "date", date_format: Optional[str] = None):
+    """
+    Convert a daily dataset CSV into a column directory, with dates parsed once
+    """
+    df = pd.read_csv(csv_path)
+    if date_column in df.columns:
+        df[date_column] = pd.to_datetime(df[date_column], format=date_format)
+        df = df.sort_values(date_column, kind="stable").reset_index(drop=True)
+    write_columns(df, out_path)
+    logger.info(f"Converted {csv_path} to {out_path} ({len(df)} rows)")
+
+def convert_json(json_path: str, out_path: str):
+    """
+    Convert a QPUDataHandler JSON file: each list of records becomes a column
+    directory under `out_path`, and scalar values are kept as attributes
+    """
+    with open(json_path) as f:
+        data = json.load(f)
+    write_tables(data, out_path)
+    logger.info(f"Converted {json_path} to {out_path}")
+
+def write_tables(data: Dict[str, Any], out_path: str):
+    """
+    Write a dict of record lists (the QPUDataHandler layout) as one column directory per table
+    """
+    tables = [key for key, value in data.items() if isinstance(value, (list, pd.DataFrame))]
+    attrs = {key: value for key, value in data.items() if key not in tables}
+    # Tables are often memory mapped from `out_path` itself, so the whole
+    # tree is written beside it and swapped in once complete
+    staging = _staging_dir(out_path)
+    for table in tables:
+        df = pd.DataFrame(data[table])
+        if "date" in df.columns:
+            df["date"] = pd.to_datetime(df["date"])
+        _write_columns_into(df, os.path.join(staging, table))
+    # The top-level metadata lists the tables
+    _write_columns_into(pd.DataFrame(), staging, attrs={**attrs, "tables": tables})
+    _replace_dir(staging, out_path)
+
+def read_tables(path: str, mmap: bool = True) -> Dict[str, Any]:
+    """
+    Inverse of write_tables: memory-mapped DataFrames per table plus the scalar attributes
+    """
+    attrs = dict(read_meta(path)["attrs"])
+    tables = attrs.pop("tables", [])
+    return {**attrs, **{table: read_columns(os.path.join(path, table), mmap=mmap) for table in tables}}
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert QPU datasets to the columnar format")
+    parser.add_argument("source", help="CSV dataset or QPUDataHandler JSON file")
+    parser.add_argument("target", nargs="?", help=f"Output directory (defaults to the source name with {COLUMNAR_SUFFIX})")
+    parser.add_argument("--date-format", default=None, help="strftime format of the CSV date column")
+    args = parser.parse_args()
+
+    target = args.target or os.path.splitext(args.source)[0] + COLUMNAR_SUFFIX
+    if args.source.endswith(".json"):
+        convert_json(args.source, target)
+    else:
+        convert_csv(args.source, target, date_format=args.date_format)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
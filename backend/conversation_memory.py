@@ -0,0 +1,200 @@
+"""
+Token-budgeted conversation memory: recent turns verbatim plus a rolling summary of older ones
+"""
+import logging
+import os
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Memory settings
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "512"))
+MEMORY_WINDOW_TURNS = int(os.getenv("MEMORY_WINDOW_TURNS", "6"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "128"))
+# "extractive" keeps the gist of each dropped turn; "llm" asks the model to rewrite the summary
+MEMORY_SUMMARY_MODE = os.getenv("MEMORY_SUMMARY_MODE", "extractive")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with the tokenizer of the loaded default model, or estimate
+    (about four characters per token) when no model is loaded yet
+    """
+    tokenizer = model_registry.tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return -(-len(text) // 4)
+
+def _first_sentence(text: str, max_words: int = 25) -> str:
+    sentence = _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+    words = sentence.split()
+    return " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+
+@dataclass
+class Turn:
+    user: str
+    assistant: str
+    tokens: int
+
+    @property
+    def text(self) -> str:
+        return f"Human: {self.user}\nAI: {self.assistant}\n"
+
+def extractive_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+    """
+    Append the first sentence of each dropped question and answer, then keep the newest part that fits
+    """
+    sentences = [s for s in _SENTENCE_END.split(summary) if s] if summary else []
+    # Older turns could not fit anyway (each one adds two sentences)
+    for turn in turns[-max(1, max_tokens // 16):]:
+        sentences.append(f"The user asked: {_first_sentence(turn.user)}")
+        sentences.append(f"The answer was: {_first_sentence(turn.assistant)}")
+    while len(sentences) > 1 and count_tokens(" ".join(sentences)) > max_tokens:
+        sentences.pop(0)
+    return " ".join(sentences)
+
+def llm_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+    """
+    Ask the default model to fold the dropped turns into the running summary
+    """
+    prompt = (
+        "Summarize this conversation about QPU blocks and costs in a few sentences, "
+        "keeping any numbers the user may refer back to.\n\n"
+        f"Summary so far: {summary or 'none'}\n\n"
+        + "".join(turn.text for turn in turns)
+        + "\nSummary:"
+    )
+    try:
+        text = model_registry.get().invoke(prompt).strip()
+    except Exception as e:
+        logger.error(f"Error summarizing conversation, keeping an extractive summary: {e}")
+        return extractive_summary(summary, turns, max_tokens)
+    return extractive_summary(text, [], max_tokens)
+
+SUMMARIZERS: Dict[str, Callable[[str, List[Turn], int], str]] = {
+    "extractive": extractive_summary,
+    "llm": llm_summary,
+}
+
+class ConversationMemory:
+    """
+    History for one conversation that fits a token budget.
+
+    The most recent turns are kept verbatim, up to `window_turns` and the
+    budget. Turns pushed out are folded into a rolling summary of at most
+    `summary_tokens`. Each turn is tokenized once, when it is added, and the
+    rendered prompt text is cached until the next turn.
+    """
+    def __init__(
+        self,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+        window_turns: int = MEMORY_WINDOW_TURNS,
+        summary_tokens: int = MEMORY_SUMMARY_TOKENS,
+        summarizer: Optional[Callable[[str, List[Turn], int], str]] = None,
+    ):
+        self.token_budget = token_budget
+        self.window_turns = max(1, window_turns)
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or SUMMARIZERS.get(MEMORY_SUMMARY_MODE, extractive_summary)
+        self.turns: Deque[Turn] = deque()
+        # Turns ever added; the oldest turn still in the window is number total_turns - len(turns)
+        self.total_turns = 0
+        self.summary = ""
+        self._summary_tokens = 0
+        self._window_tokens = 0
+        self._rendered: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_history(cls, history: List[Dict[str, str]], **kwargs) -> "ConversationMemory":
+        """
+        Build a memory from a client-supplied history list
+        """
+        memory = cls(**kwargs)
+        turns = [(entry.get("user", ""), entry.get("assistant", "")) for entry in history]
+        with memory._lock:
+            for user, assistant in turns:
+                memory._append(user, assistant)
+            memory._compact()
+        return memory
+
+    @classmethod
+    def restore(cls, summary: str, turns: List[Turn], total_turns: int, **kwargs) -> "ConversationMemory":
+        """
+        Rebuild a memory from persisted state, without re-tokenizing or re-summarizing
+        """
+        memory = cls(**kwargs)
+        memory.turns.extend(turns)
+        memory.total_turns = total_turns
+        memory.summary = summary
+        memory._summary_tokens = count_tokens(summary) if summary else 0
+        memory._window_tokens = sum(turn.tokens for turn in turns)
+        return memory
+
+    def add_turn(self, user: str, assistant: str) -> Turn:
+        """
+        Add a turn, folding older ones into the summary if needed; returns the new turn
+        """
+        with self._lock:
+            turn = self._append(user, assistant)
+            self._compact()
+            return turn
+
+    def render(self) -> str:
+        """
+        Chat history text for the prompt
+        """
+        with self._lock:
+            if self._rendered is None:
+                parts = [f"Summary of the earlier conversation: {self.summary}\n"] if self.summary else []
+                parts += [turn.text for turn in self.turns]
+                self._rendered = "".join(parts)
+            return self._rendered
+
+    def recent_history(self, turns: int = 2) -> List[Dict[str, str]]:
+        """
+        The last turns in the client history format
+        """
+        with self._lock:
+            recent = list(self.turns)[-turns:] if turns > 0 else []
+        return [{"user": t.user, "assistant": t.assistant} for t in recent]
+
+    def state(self) -> Tuple[str, List[Turn], int]:
+        """
+        Consistent (summary, window turns, total turns) for persisting
+        """
+        with self._lock:
+            return self.summary, list(self.turns), self.total_turns
+
+    @property
+    def tokens(self) -> int:
+        return self._summary_tokens + self._window_tokens
+
+    def _append(self, user: str, assistant: str) -> Turn:
+        turn = Turn(user, assistant, count_tokens(f"Human: {user}\nAI: {assistant}\n"))
+        self.turns.append(turn)
+        self.total_turns += 1
+        self._window_tokens += turn.tokens
+        self._rendered = None
+        return turn
+
+    def _compact(self):
+        # Room is always reserved for the summary, so folding turns into it never overshoots
+        window_budget = self.token_budget - self.summary_tokens
+        evicted = []
+        # Always keep the latest turn, even if it alone exceeds the budget
+        while len(self.turns) > 1 and (len(self.turns) > self.window_turns or self._window_tokens > window_budget):
+            turn = self.turns.popleft()
+            self._window_tokens -= turn.tokens
+            evicted.append(turn)
+        if evicted:
+            self.summary = self.summarizer(self.summary, evicted, self.summary_tokens)
+            self._summary_tokens = count_tokens(self.summary)
+            self._rendered = None
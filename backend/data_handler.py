@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import json
 import os
@@ -5,6 +6,9 @@ from typing import Dict, List, Any, Optional
 import datetime
 import logging
 
+from dataset_store import dataset_store, DEFAULT_DATASET
+from columnar_store import COLUMNAR_SUFFIX, is_columnar, read_tables, write_tables
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,10 +19,18 @@ logger = logging.getLogger(__name__)
 class QPUDataHandler:
     """
     Handles loading, saving, and processing of QPU related data
+    
+    data_path may be a JSON file or a column directory (*.cols, see columnar_store.py).
+    Column directories are memory mapped, so tables are returned as DataFrames
+    without parsing and pages are only read when used.
     """
     def __init__(self, data_path: Optional[str] = None):
         self.data_path = data_path
         self._data = None
+    
+    @property
+    def is_columnar(self) -> bool:
+        return bool(self.data_path) and (self.data_path.endswith(COLUMNAR_SUFFIX) or is_columnar(self.data_path))
         
     def load_data(self, force_reload: bool = False) -> Dict[str, Any]:
         """
@@ -27,7 +39,14 @@ class QPUDataHandler:
         if self._data is not None and not force_reload:
             return self._data
         
-        if self.data_path and os.path.exists(self.data_path):
+        if self.data_path and is_columnar(self.data_path):
+            try:
+                self._data = read_tables(self.data_path)
+                logger.info(f"Data mapped from {self.data_path}")
+            except Exception as e:
+                logger.error(f"Error loading data from {self.data_path}: {e}")
+                self._data = self._generate_mock_data()
+        elif self.data_path and os.path.exists(self.data_path):
             try:
                 with open(self.data_path, 'r') as f:
                     self._data = json.load(f)
@@ -53,6 +72,11 @@ class QPUDataHandler:
             return False
         
         try:
+            if self.is_columnar:
+                write_tables(self._data, self.data_path)
+                logger.info(f"Data saved to {self.data_path}")
+                return True
+            
             os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
             with open(self.data_path, 'w') as f:
                 json.dump(self._data, f, indent=2)
@@ -134,25 +158,28 @@ class QPUDataHandler:
         """
         Return QPU blocks data as a pandas DataFrame
         """
-        data = self.load_data()
-        return pd.DataFrame(data["QPU_blocks"])
+        return self._table_df("QPU_blocks")
     
     def get_daily_costs_df(self) -> pd.DataFrame:
         """
         Return daily costs data as a pandas DataFrame
         """
-        data = self.load_data()
-        df = pd.DataFrame(data["daily_costs"])
-        df["date"] = pd.to_datetime(df["date"])
-        return df
+        return self._table_df("daily_costs")
     
     def get_workload_history_df(self) -> pd.DataFrame:
         """
         Return workload history data as a pandas DataFrame
         """
+        return self._table_df("workload_history")
+    
+    def _table_df(self, table: str) -> pd.DataFrame:
         data = self.load_data()
-        df = pd.DataFrame(data["workload_history"])
-        df["date"] = pd.to_datetime(df["date"])
+        if isinstance(data[table], pd.DataFrame):
+            # Memory-mapped table: dates are already typed; copy the column list, not the data
+            return data[table].copy(deep=False)
+        df = pd.DataFrame(data[table])
+        if "date" in df.columns:
+            df["date"] = pd.to_datetime(df["date"])
         return df
     
     def get_top_blocks(self, n: int = 10, metric: str = "workloads_executed") -> pd.DataFrame:
@@ -174,5 +201,96 @@ class QPUDataHandler:
             "uptime_percentage": ["mean", "min", "max"]
         })
 
+# Fields a new daily row must provide; everything else is derived
+INGEST_REQUIRED_FIELDS = [
+    "date",
+    "new_blocks_atom",
+    "new_blocks_photon",
+    "new_blocks_spin",
+    "daily_workloads",
+    "workloads_new_blocks",
+    "acquisition_cost",
+    "lease_fee_cost",
+    "workload_trigger_cost",
+    "workload_execution_cost",
+]
+
+# Running totals carried forward from the previous day: column -> daily column it accumulates
+CUMULATIVE_COLUMNS = {
+    "cumulative_blocks": "new_blocks_total",
+    "cumulative_workloads": "daily_workloads",
+    "cumulative_workloads_new": "workloads_new_blocks",
+    "cumulative_workloads_old": "workloads_older_blocks",
+}
+
+def append_daily_rows(rows: List[Dict[str, Any]], dataset: str = DEFAULT_DATASET) -> Dict[str, Any]:
+    """
+    Append new days to a dataset in O(new rows).
+    
+    Derived columns (block totals, cumulative counters, percentages, total cost and
+    cost per workload) are computed from the last stored day, so the existing
+    history is neither re-parsed nor re-aggregated.
+    """
+    if not rows:
+        raise ValueError("No rows to ingest")
+    
+    new = pd.DataFrame(rows)
+    missing = [field for field in INGEST_REQUIRED_FIELDS if field not in new.columns]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    
+    new["date"] = pd.to_datetime(new["date"])
+    new = new.sort_values("date", kind="stable").reset_index(drop=True)
+    if new["date"].duplicated().any():
+        raise ValueError("Duplicate dates in ingested rows")
+    
+    # Ingests are serialized per dataset: the date check and the running
+    # counters below must see the rows appended by the previous ingest
+    with dataset_store.write_lock(dataset):
+        frame = dataset_store.get(dataset)
+        last = dataset_store.last_row(dataset)
+        if last is not None and new["date"].iloc[0] <= last["date"]:
+            raise ValueError(f"Ingested dates must be after the last stored date {last['date']:%Y-%m-%d}")
+        new["date"] = new["date"].astype(frame["date"].dtype)
+    
+        # Daily columns that may be omitted
+        if "new_blocks_total" not in new.columns:
+            new["new_blocks_total"] = new["new_blocks_atom"] + new["new_blocks_photon"] + new["new_blocks_spin"]
+        if "workloads_older_blocks" not in new.columns:
+            new["workloads_older_blocks"] = new["daily_workloads"] - new["workloads_new_blocks"]
+        if "total_daily_cost" not in new.columns:
+            new["total_daily_cost"] = (new["acquisition_cost"] + new["lease_fee_cost"] +
+                                       new["workload_trigger_cost"] + new["workload_execution_cost"])
+    
+        workloads = new["daily_workloads"].to_numpy(dtype=float)
+        if "cost_per_workload" not in new.columns:
+            new["cost_per_workload"] = np.divide(new["total_daily_cost"].to_numpy(dtype=float), workloads,
+                                                 out=np.zeros_like(workloads), where=workloads > 0)
+    
+        # Percentages follow the dataset's existing scale (fractions or 0-100)
+        scale = 100.0 if len(frame) and frame["perc_new_workloads"].max() > 1.5 else 1.0
+        perc_new = np.divide(new["workloads_new_blocks"].to_numpy(dtype=float), workloads,
+                             out=np.zeros_like(workloads), where=workloads > 0)
+        new["perc_new_workloads"] = perc_new * scale
+        new["perc_old_workloads"] = (1 - perc_new) * scale
+    
+        # Counters continue from the last stored day
+        new["day_index"] = (int(last["day_index"]) if last is not None else 0) + np.arange(1, len(new) + 1)
+        for cumulative, daily in CUMULATIVE_COLUMNS.items():
+            previous = last[cumulative] if last is not None else 0
+            new[cumulative] = previous + new[daily].cumsum()
+    
+        # Keep the stored dtypes so appended rows serialize like the originals
+        for column in frame.columns:
+            if column != "date" and column in new.columns:
+                new[column] = new[column].astype(frame[column].dtype)
+    
+        version = dataset_store.append(dataset, new)
+    return {
+        "rows_added": len(new),
+        "last_date": new["date"].iloc[-1].strftime("%Y-%m-%d"),
+        "dataset_version": version,
+    }
+
 # Create a singleton instance for easy import
 QPU_data_handler = QPUDataHandler()
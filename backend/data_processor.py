@@ -1,10 +1,18 @@
+import numpy as np
 import pandas as pd
 import json
 import os
 from typing import Dict, List, Any
 
+from dataset_store import dataset_store, DEFAULT_DATASET, ColumnTotals
+from time_index import select
+
 # Sample data - in a real scenario, this would come from a database or API
-def get_sample_data():
+def get_sample_data(dataset: str = DEFAULT_DATASET):
+    """
+    Return the parsed dataset from the shared store (dates already parsed).
+    The frame is shared between callers and must not be modified in place.
+    """
     # This is mockup data - replace with actual data loading in production
     # sample_data = {
     #     "qpc_blocks": [
@@ -32,35 +40,60 @@ def get_sample_data():
     #     ]
     # }
     #sample_data = pd.read_csv('data/simulated_qpu_data_enhanced.csv')
-    sample_data = pd.read_csv('data/qpu_dataset_hybrid.csv')
+    sample_data = dataset_store.get(dataset)
     
     return sample_data
 
-def get_top_active_qpc_blocks():
+def get_top_active_days_frame(n=10):
+    """
+    Return the `n` days with the most workloads, busiest first
+    """
     df = get_sample_data()
-    top_days = df.sort_values(by="daily_workloads", ascending=False).head(10)
+    top_days = df.sort_values(by="daily_workloads", ascending=False).head(n)
+    return pd.DataFrame({
+        "date": top_days['date'].dt.strftime('%Y-%m-%d'),
+        "workloads": top_days['daily_workloads'].astype(int),
+    }, index=top_days.index)
+
+def get_top_active_qpc_blocks():
+    top_days = get_top_active_days_frame()
     
     result = ""
     for i, row in top_days.iterrows():
-        result += f"{i+1}. Date: {row['date']}, Workloads: {row['daily_workloads']}\n"
+        result += f"{i+1}. Date: {row['date']}, Workloads: {row['workloads']}\n"
     
     return result
 
-def analyze_cost_impact():
-    df = get_sample_data()
+def get_cost_impact():
+    """
+    Estimate the cost of running all workloads on Atom blocks.
+    Returns the current and estimated totals, the difference and its percentage.
+    """
+    # Running totals are kept up to date by ingestion, so no pass over the history
+    totals = dataset_store.totals(DEFAULT_DATASET)
 
-    total_cost = df["total_daily_cost"].sum()
-    total_workloads = df["daily_workloads"].sum()
+    total_cost = totals.sums["total_daily_cost"]
+    total_workloads = totals.sums["daily_workloads"]
 
     # Hypothetical: assume all workloads were done on Atom blocks
     # Use a ratio of Atom blocks to total blocks to estimate cost impact
-    atom_ratio = df["new_blocks_atom"].sum() / df["new_blocks_total"].sum()
+    atom_ratio = totals.sums["new_blocks_atom"] / totals.sums["new_blocks_total"]
     
-    estimated_atom_cost_per_workload = df["cost_per_workload"].mean() * atom_ratio
+    estimated_atom_cost_per_workload = (totals.sums["cost_per_workload"] / totals.rows) * atom_ratio
     estimated_total_cost = estimated_atom_cost_per_workload * total_workloads
 
     cost_difference = total_cost - estimated_total_cost
-    percentage = (cost_difference / total_cost) * 100
+    return {
+        "current_total_cost": float(total_cost),
+        "estimated_atom_only_cost": float(estimated_total_cost),
+        "cost_difference": float(cost_difference),
+        "percentage": float(cost_difference / total_cost * 100),
+    }
+
+def analyze_cost_impact():
+    impact = get_cost_impact()
+    cost_difference = impact["cost_difference"]
+    percentage = impact["percentage"]
 
     if cost_difference > 0:
         return f"Using only Atom blocks would save approximately ${cost_difference:,.2f}, which is {percentage:.1f}% of your current costs."
@@ -68,26 +101,31 @@ def analyze_cost_impact():
         return f"Using only Atom blocks would increase costs by approximately ${-cost_difference:,.2f}, which is {-percentage:.1f}% more than your current costs."
 
 
-def get_daily_costs():
-    df = get_sample_data()
+def get_daily_costs(start=None, end=None, resolution="day"):
+    if start is None and end is None and resolution == "day":
+        df = get_sample_data()
+    else:
+        df, _ = select(start=start, end=end, resolution=resolution)
     return df[["date", "total_daily_cost"]]
 
 # New summary functions
-def get_qpu_summary():
+def get_qpu_summary(df=None):
     """
     Returns summary statistics about QPU blocks and workloads
+    (over the whole dataset, or over `df` if a date-range selection is given)
     """
-    df = get_sample_data()
+    # Whole-dataset totals are maintained incrementally by the dataset store
+    totals = dataset_store.totals(DEFAULT_DATASET) if df is None else ColumnTotals.of(df)
     
-    total_blocks = df['new_blocks_total'].sum()
-    atom_blocks = df['new_blocks_atom'].sum()
-    photon_blocks = df['new_blocks_photon'].sum() if 'new_blocks_photon' in df.columns else 0
-    spin_blocks = df['new_blocks_spin'].sum() if 'new_blocks_spin' in df.columns else 0
+    total_blocks = totals.sums['new_blocks_total']
+    atom_blocks = totals.sums['new_blocks_atom']
+    photon_blocks = totals.sums.get('new_blocks_photon', 0)
+    spin_blocks = totals.sums.get('new_blocks_spin', 0)
     
-    total_workloads = df['daily_workloads'].sum()
+    total_workloads = totals.sums['daily_workloads']
     avg_workloads_per_block = total_workloads / total_blocks if total_blocks > 0 else 0
     
-    days_count = len(df)
+    days_count = totals.rows
     avg_daily_workloads = total_workloads / days_count if days_count > 0 else 0
     
     summary = {
@@ -103,40 +141,48 @@ def get_qpu_summary():
     
     return summary
 
-def get_block_efficiency():
+def get_block_efficiency_frame(df=None):
     """
-    Calculate efficiency metrics for different block types
+    Calculate efficiency metrics for different block types as whole columns
     """
-    df = get_sample_data()
+    if df is None:
+        df = get_sample_data()
     
-    # Group by date to get daily figures
-    daily_stats = []
+    blocks = df['new_blocks_total'].to_numpy(dtype=float)
+    workloads = df['daily_workloads'].to_numpy(dtype=float)
+    costs = df['total_daily_cost'].to_numpy(dtype=float)
     
-    for _, row in df.iterrows():
-        atom_ratio = row['new_blocks_atom'] / row['new_blocks_total'] if row['new_blocks_total'] > 0 else 0
-        cost_per_workload = row['total_daily_cost'] / row['daily_workloads'] if row['daily_workloads'] > 0 else 0
-        
-        daily_stats.append({
-            "date": row['date'],
-            "atom_block_ratio": round(atom_ratio, 2),
-            "cost_per_workload": round(cost_per_workload, 2),
-            "daily_workloads": int(row['daily_workloads']),
-            "total_cost": float(row['total_daily_cost'])
-        })
+    # Ratios are 0 on days without blocks or workloads
+    atom_ratio = np.divide(df['new_blocks_atom'].to_numpy(dtype=float), blocks, out=np.zeros_like(blocks), where=blocks > 0)
+    cost_per_workload = np.divide(costs, workloads, out=np.zeros_like(costs), where=workloads > 0)
     
-    return daily_stats
+    return pd.DataFrame({
+        "date": df['date'].dt.strftime('%Y-%m-%d'),
+        "atom_block_ratio": atom_ratio.round(2),
+        "cost_per_workload": cost_per_workload.round(2),
+        "daily_workloads": df['daily_workloads'].astype(int),
+        "total_cost": costs,
+    })
+
+def get_block_efficiency():
+    """
+    Calculate efficiency metrics for different block types
+    """
+    return get_block_efficiency_frame().to_dict("records")
+
+def get_daily_workloads_frame(df=None):
+    """
+    Return daily workload data as columns
+    """
+    if df is None:
+        df = get_sample_data()
+    return pd.DataFrame({
+        "date": df['date'].dt.strftime('%Y-%m-%d'),
+        "workloads": df['daily_workloads'].astype(int),
+    })
 
 def get_daily_workloads():
     """
     Return daily workload data suitable for visualization
     """
-    df = get_sample_data()
-    result = []
-    
-    for _, row in df.iterrows():
-        result.append({
-            "date": row['date'],
-            "workloads": int(row['daily_workloads'])
-        })
-    
-    return result
+    return get_daily_workloads_frame().to_dict("records")
@@ -0,0 +1,265 @@
+"""
+Shared in-memory store for the QPU datasets under data/
+"""
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+from columnar_store import COLUMNAR_SUFFIX, is_columnar, meta_path, read_columns, read_meta
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+@dataclass
+class DatasetSpec:
+    """Where a named dataset lives and how to parse it"""
+    path: str
+    date_column: str = "date"
+    date_format: Optional[str] = None
+
+@dataclass
+class ColumnTotals:
+    """Row count and per-column sums of a dataset, maintained incrementally on append"""
+    rows: int
+    sums: Dict[str, Any]
+
+    @classmethod
+    def of(cls, df: pd.DataFrame) -> "ColumnTotals":
+        numeric = df.select_dtypes("number")
+        return cls(len(df), {column: numeric[column].sum().item() for column in numeric.columns})
+
+    def add(self, df: pd.DataFrame):
+        new = ColumnTotals.of(df)
+        self.rows += new.rows
+        for column, value in new.sums.items():
+            self.sums[column] = self.sums.get(column, 0) + value
+
+@dataclass
+class _CachedDataset:
+    frame: pd.DataFrame
+    mtime: float
+    size: int
+    hasher: Any
+    version: int
+    source: str
+    derived: Dict[str, Any] = field(default_factory=dict)
+    totals: Optional[ColumnTotals] = None
+
+    @property
+    def digest(self) -> str:
+        return self.hasher.hexdigest()
+
+# Datasets available to the application
+DATASETS = {
+    "hybrid": DatasetSpec(os.path.join(DATA_DIR, "qpu_dataset_hybrid.csv"), date_format="%Y-%m-%d"),
+    "costs": DatasetSpec(os.path.join(DATA_DIR, "simulation_with_costs.csv"), date_format="%m/%d/%Y"),
+}
+
+# Dataset used by the analytics when no name is given
+DEFAULT_DATASET = "hybrid"
+
+def _file_hasher(path: str):
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha
+
+def _columnar_path(spec: DatasetSpec) -> str:
+    return os.path.splitext(spec.path)[0] + COLUMNAR_SUFFIX
+
+class DatasetStore:
+    """
+    Parses each dataset once and keeps the typed frame in memory.
+
+    A cheap stat() on every access detects file changes. When the mtime or size
+    moved, the file is hashed and only re-parsed if its content actually changed.
+
+    If a column directory converted from the CSV (see columnar_store.py) exists
+    and is at least as recent, it is memory mapped instead of parsing the CSV.
+    """
+    def __init__(self, specs: Optional[Dict[str, DatasetSpec]] = None):
+        self._specs = dict(specs if specs is not None else DATASETS)
+        self._cache: Dict[str, _CachedDataset] = {}
+        self._lock = threading.RLock()
+        self._write_locks: Dict[str, threading.RLock] = {}
+
+    def register(self, name: str, spec: DatasetSpec):
+        """
+        Register (or replace) a named dataset
+        """
+        with self._lock:
+            self._specs[name] = spec
+            self._cache.pop(name, None)
+
+    def unregister(self, name: str):
+        """
+        Forget a named dataset and its cached frame
+        """
+        with self._lock:
+            self._specs.pop(name, None)
+            self._cache.pop(name, None)
+            self._write_locks.pop(name, None)
+
+    def get(self, name: str = DEFAULT_DATASET) -> pd.DataFrame:
+        """
+        Return the parsed frame for a dataset, reloading it if the file changed.
+        The frame is shared; callers must not modify it in place.
+        """
+        return self._get_entry(name).frame
+
+    def version(self, name: str = DEFAULT_DATASET) -> str:
+        """
+        Return an identifier that changes whenever the dataset content changes
+        """
+        entry = self._get_entry(name)
+        return f"{name}:{entry.digest[:12]}:{entry.version}"
+
+    def derive(self, name: str, key: str, build: Callable[[pd.DataFrame], Any]) -> Any:
+        """
+        Return `build(frame)` for a dataset, computed once per dataset version.
+        Use this for indexes and aggregates that should be dropped when the file changes.
+        """
+        entry = self._get_entry(name)
+        with self._lock:
+            if key in entry.derived:
+                return entry.derived[key]
+        value = build(entry.frame)
+        with self._lock:
+            return entry.derived.setdefault(key, value)
+
+    def totals(self, name: str = DEFAULT_DATASET) -> ColumnTotals:
+        """
+        Return row count and column sums, computed once and then kept up to date by append()
+        """
+        entry = self._get_entry(name)
+        with self._lock:
+            if entry.totals is None:
+                entry.totals = ColumnTotals.of(entry.frame)
+            return entry.totals
+
+    def write_lock(self, name: str) -> threading.RLock:
+        """
+        Lock serializing writes to a dataset. Hold it from reading the last row
+        through append() when the appended rows are derived from that row.
+        """
+        with self._lock:
+            return self._write_locks.setdefault(name, threading.RLock())
+
+    def append(self, name: str, rows: pd.DataFrame) -> str:
+        """
+        Append already-derived rows to a dataset file and its in-memory frame.
+
+        Only the new rows are formatted, written, hashed and added to the running
+        totals; the rest of the file is not re-read. Returns the new version.
+        """
+        spec = self._specs[name]
+        with self.write_lock(name):
+            entry = self._get_entry(name)
+            return self._append(name, spec, entry, rows[list(entry.frame.columns)])
+
+    def _append(self, name: str, spec: DatasetSpec, entry: _CachedDataset, rows: pd.DataFrame) -> str:
+        with self._lock:
+            to_write = rows.copy()
+            if spec.date_column in to_write.columns:
+                to_write[spec.date_column] = to_write[spec.date_column].dt.strftime(spec.date_format or "%Y-%m-%d")
+            payload = to_write.to_csv(header=False, index=False, lineterminator="\n").encode()
+
+            with open(spec.path, "rb+") as f:
+                # Make sure the appended rows start on a new line
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        payload = b"\n" + payload
+                f.write(payload)
+
+            stat = os.stat(spec.path)
+            if entry.source == spec.path:
+                entry.hasher.update(payload)
+            else:
+                # Appends always go to the CSV, which now supersedes the column directory
+                entry.hasher = _file_hasher(spec.path)
+                entry.source = spec.path
+            entry.mtime = stat.st_mtime
+            entry.size = stat.st_size
+            entry.frame = pd.concat([entry.frame, rows], ignore_index=True)
+            entry.version += 1
+            if entry.totals is not None:
+                entry.totals.add(rows)
+            # Indexes and rollups are rebuilt lazily for the new version
+            entry.derived.clear()
+            logger.info(f"Appended {len(rows)} rows to dataset {name}")
+            return f"{name}:{entry.digest[:12]}:{entry.version}"
+
+    def last_row(self, name: str = DEFAULT_DATASET) -> Optional[pd.Series]:
+        frame = self.get(name)
+        return frame.iloc[-1] if len(frame) else None
+
+    def invalidate(self, name: Optional[str] = None):
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+
+    def _get_entry(self, name: str) -> _CachedDataset:
+        if name not in self._specs:
+            raise ValueError(f"Dataset {name} not found in registered datasets")
+        spec = self._specs[name]
+
+        with self._lock:
+            source, stat_path = self._source(spec)
+            stat = os.stat(stat_path)
+            entry = self._cache.get(name)
+            if (entry is not None and entry.source == source
+                    and entry.mtime == stat.st_mtime and entry.size == stat.st_size):
+                return entry
+
+            if source == spec.path:
+                hasher = _file_hasher(spec.path)
+            else:
+                # Column directories record a content digest when they are written
+                hasher = hashlib.sha1(read_meta(source)["digest"].encode())
+            if entry is not None and entry.source == source and entry.digest == hasher.hexdigest():
+                entry.mtime = stat.st_mtime
+                entry.size = stat.st_size
+                return entry
+
+            with metrics.span("dataset_load", dataset=name, format="csv" if source == spec.path else "columnar"):
+                frame = self._parse(spec) if source == spec.path else read_columns(source)
+            version = entry.version + 1 if entry is not None else 1
+            entry = _CachedDataset(frame, stat.st_mtime, stat.st_size, hasher, version, source)
+            self._cache[name] = entry
+            logger.info(f"Dataset {name} loaded from {source} ({len(frame)} rows)")
+            return entry
+
+    @staticmethod
+    def _source(spec: DatasetSpec):
+        """
+        Return (source path, path to stat) for a dataset, preferring an up-to-date column directory
+        """
+        columnar = _columnar_path(spec)
+        if is_columnar(columnar):
+            columnar_mtime = os.stat(meta_path(columnar)).st_mtime
+            if not os.path.exists(spec.path) or columnar_mtime >= os.stat(spec.path).st_mtime:
+                return columnar, meta_path(columnar)
+        return spec.path, spec.path
+
+    @staticmethod
+    def _parse(spec: DatasetSpec) -> pd.DataFrame:
+        df = pd.read_csv(spec.path)
+        if spec.date_column in df.columns:
+            df[spec.date_column] = pd.to_datetime(df[spec.date_column], format=spec.date_format)
+            df = df.sort_values(spec.date_column, kind="stable").reset_index(drop=True)
+        return df
+
+# Create a singleton instance for easy import
+dataset_store = DatasetStore()
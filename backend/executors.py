@@ -0,0 +1,148 @@
+"""
+Bounded thread and process pools for running blocking work off the event loop
+"""
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Executor settings
+THREAD_WORKERS = int(os.getenv("EXECUTOR_THREAD_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+TOOL_WORKERS = int(os.getenv("EXECUTOR_TOOL_WORKERS", "4"))
+PROCESS_WORKERS = int(os.getenv("EXECUTOR_PROCESS_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+MAX_PENDING = int(os.getenv("EXECUTOR_MAX_PENDING", "64"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool already has its maximum number of pending tasks"""
+
+class _BoundedPool:
+    """
+    Wraps an executor with a cap on queued + running tasks.
+
+    A slot is released when the task really finishes, not when the caller
+    stops waiting, so timed-out work still counts against the limit. Thread
+    pools can run tasks in a copy of the caller's context, so request
+    tracing follows the work onto worker threads.
+    """
+    def __init__(self, name: str, factory: Callable[[], Any], max_pending: int, copy_context: bool = False):
+        self.name = name
+        self.max_pending = max_pending
+        self.copy_context = copy_context
+        self._factory = factory
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory()
+            return self._executor
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        executor = self.executor
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ExecutorSaturated(f"The {self.name} pool is saturated, please retry shortly")
+            self._pending += 1
+        if self.copy_context:
+            func, args = contextvars.copy_context().run, (func, *args)
+        try:
+            future = executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+class ExecutorPool:
+    """
+    Thread pool for I/O and light work (including LLM inference, since the model
+    is shared in-process and torch releases the GIL), and a process pool for
+    CPU-bound work that is not thread-safe, such as matplotlib rendering.
+    Agent tools called from a worker thread get their own small pool, so an
+    agent waiting on its tools never holds the slots those tools need.
+    """
+    def __init__(
+        self,
+        thread_workers: int = THREAD_WORKERS,
+        process_workers: int = PROCESS_WORKERS,
+        tool_workers: int = TOOL_WORKERS,
+        max_pending: int = MAX_PENDING,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        self.timeout = timeout
+        self.threads = _BoundedPool(
+            "thread",
+            lambda: ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="qpu-worker"),
+            max_pending,
+            copy_context=True,
+        )
+        self.tools = _BoundedPool(
+            "tool",
+            lambda: ThreadPoolExecutor(max_workers=tool_workers, thread_name_prefix="qpu-tool"),
+            max_pending,
+            copy_context=True,
+        )
+        # Spawned workers avoid inheriting torch/matplotlib state from the server process
+        self.processes = _BoundedPool(
+            "process",
+            lambda: ProcessPoolExecutor(max_workers=process_workers, mp_context=multiprocessing.get_context("spawn")),
+            max_pending,
+        )
+
+    async def run_in_thread(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run `func` on the thread pool and await its result
+        """
+        return await self._await(self.threads.submit(func, *args, **kwargs), timeout)
+
+    async def run_in_process(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run a picklable, module-level `func` on the process pool and await its result
+        """
+        return await self._await(self.processes.submit(func, *args, **kwargs), timeout)
+
+    def call_in_process(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Blocking variant of run_in_process for code already running on a worker thread
+        """
+        future = self.processes.submit(func, *args, **kwargs)
+        return future.result(timeout=timeout or self.timeout)
+
+    async def _await(self, future: Future, timeout: Optional[float]) -> Any:
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
+
+    def shutdown(self):
+        self.threads.shutdown()
+        self.tools.shutdown()
+        self.processes.shutdown()
+
+# Create a singleton instance for easy import
+executor_pool = ExecutorPool()
@@ -0,0 +1,43 @@
+"""
+Fast JSON encoding of DataFrames for the data endpoints
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+# Decimal places kept for floats; pandas' default of 10 prints representation
+# noise such as 4681154.5899999999
+JSON_DOUBLE_PRECISION = int(os.getenv("JSON_DOUBLE_PRECISION", "6"))
+
+def _column_values(column: pd.Series):
+    if pd.api.types.is_float_dtype(column.dtype):
+        return np.round(column.to_numpy(), JSON_DOUBLE_PRECISION)
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy()
+    return column.tolist()
+
+def frame_to_json(df: pd.DataFrame, orient: str = "records") -> bytes:
+    """
+    Serialize a DataFrame without building per-row Python dicts.
+
+    orient="records" produces a list of row objects (pandas' C encoder).
+    orient="columns" produces one array per column, e.g. {"date": [...], "workloads": [...]}.
+    """
+    if orient == "records":
+        return df.to_json(orient="records", date_format="iso", double_precision=JSON_DOUBLE_PRECISION).encode()
+    if orient != "columns":
+        raise ValueError(f"Unsupported orient {orient}")
+
+    payload = {column: _column_values(df[column]) for column in df.columns}
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps({
+        column: values.tolist() if isinstance(values, np.ndarray) else values for column, values in payload.items()
+    }).encode()
@@ -0,0 +1,506 @@
+"""
+Dynamic batching of concurrent generation requests for a loaded model
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import torch
+from transformers import DynamicCache, StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+from executors import REQUEST_TIMEOUT
+from llm_config import (
+    INFERENCE_BATCH_MAX_PADDING,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_BATCH_WAIT_MS,
+    PREFIX_CACHE_MAX_BYTES,
+    ModelConfig,
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class InferenceRequest:
+    """One prompt waiting for, or taking part in, a batched generation"""
+    prompt: str
+    input_ids: List[int]
+    stop: List[str] = field(default_factory=list)
+    # Called with each new piece of text, from the scheduler thread
+    on_token: Optional[Callable[[str], None]] = None
+    # Polled while generating; returning True cancels the request
+    is_cancelled: Optional[Callable[[], bool]] = None
+    # Cached prefix the prompt starts with; input_ids then begin with its tokens
+    prefix: Optional[str] = None
+    prefix_len: int = 0
+    enqueued: float = field(default_factory=time.monotonic)
+    future: Future = field(default_factory=Future, repr=False)
+    text: str = ""
+    token_ids: List[int] = field(default_factory=list)
+    finished: bool = False
+    _cancel_requested: bool = False
+
+    @property
+    def cancelled(self) -> bool:
+        if self._cancel_requested:
+            return True
+        try:
+            return self.is_cancelled is not None and self.is_cancelled()
+        except Exception:
+            return False
+
+def padding_fraction(requests: List[InferenceRequest]) -> float:
+    """
+    Share of a batch's input tokens that would be padding
+    """
+    lengths = [len(r.input_ids) for r in requests]
+    return 1 - sum(lengths) / (len(lengths) * max(lengths)) if lengths and max(lengths) else 0.0
+
+class PrefixCache:
+    """
+    Key/value states of prompt prefixes shared by many prompts, such as the
+    agent preamble with its tool list or a conversation's history.
+
+    A prompt starting with a cached prefix is tokenized as the prefix's
+    tokens plus its own remainder, and generation only prefills the
+    remainder. A prefix that extends a cached one (the history after the
+    preamble) is built the same way, from the shorter prefix's states.
+    Entries are kept in least-recently-used order within `max_bytes` of
+    key/value tensors. Only decoder-only models can reuse a prefix this
+    way: an encoder attends to the whole input, so its states for a prefix
+    depend on what follows.
+    """
+    def __init__(self, model, tokenizer, max_bytes: int = PREFIX_CACHE_MAX_BYTES):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_bytes = max_bytes
+        # prefix -> (token ids, per-layer key/value tensors, size in bytes)
+        self._entries: "OrderedDict[str, Tuple[List[int], Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.tokens_reused = 0
+        self.tokens_prefilled = 0
+
+    def add(self, prefix: str):
+        """
+        Prefill a prefix once and keep its key/value states (no-op if already cached)
+        """
+        with self._lock:
+            if prefix in self._entries:
+                self._entries.move_to_end(prefix)
+                return
+            build_lock = self._build_locks.setdefault(prefix, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                if prefix in self._entries:
+                    return
+            # Start from the longest cached prefix this one extends, if any
+            base_ids, base = self._longest_prefix(prefix)
+            past = self.past_key_values(base, 1) if base is not None else None
+            if past is None:
+                rest = ids = self.tokenizer.encode(prefix)
+            else:
+                rest = self.tokenizer.encode(prefix[len(base):], add_special_tokens=False)
+                ids = base_ids + rest
+            with torch.inference_mode():
+                past = self.model(
+                    input_ids=torch.tensor([rest], device=self.model.device), past_key_values=past, use_cache=True
+                ).past_key_values
+            # Keep the immutable per-layer tensors; each batch gets its own copy to extend
+            if hasattr(past, "to_legacy_cache"):
+                past = past.to_legacy_cache()
+            size = sum(t.numel() * t.element_size() for layer in past for t in layer)
+            with self._lock:
+                self._build_locks.pop(prefix, None)
+                self.tokens_prefilled += len(rest)
+                if size > self.max_bytes:
+                    logger.warning(f"Prefix of {len(ids)} tokens ({size} bytes) exceeds the prefix cache size, not cached")
+                    return
+                self._entries[prefix] = (ids, past, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, _, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+
+    def tokenize(self, prompt: str) -> Tuple[List[int], Optional[str], int]:
+        """
+        Token ids for a prompt, using the longest cached prefix it starts with.
+        Returns (ids, prefix or None, prefix length in tokens).
+        """
+        prefix_ids, prefix = self._longest_prefix(prompt)
+        with self._lock:
+            if prefix is not None:
+                self.hits += 1
+                self.tokens_reused += len(prefix_ids)
+            else:
+                self.misses += 1
+        if prefix is None:
+            return self.tokenizer.encode(prompt), None, 0
+        rest = self.tokenizer.encode(prompt[len(prefix):], add_special_tokens=False)
+        return prefix_ids + rest, prefix, len(prefix_ids)
+
+    def _longest_prefix(self, text: str) -> Tuple[List[int], Optional[str]]:
+        # (ids, prefix) of the longest cached prefix `text` strictly extends
+        with self._lock:
+            matches = [p for p in self._entries if text.startswith(p) and len(text) > len(p)]
+            if not matches:
+                return [], None
+            prefix = max(matches, key=len)
+            self._entries.move_to_end(prefix)
+            return self._entries[prefix][0], prefix
+
+    def past_key_values(self, prefix: str, batch_size: int):
+        """
+        A fresh copy of a prefix's key/value states for a batch, or None if it was evicted
+        """
+        with self._lock:
+            entry = self._entries.get(prefix)
+        if entry is None:
+            return None
+        past = tuple(
+            tuple(t.expand(batch_size, *t.shape[1:]).contiguous() for t in layer)
+            for layer in entry[1]
+        )
+        if getattr(self.model, "_supports_cache_class", False):
+            return DynamicCache.from_legacy_cache(past)
+        return past
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "tokens_reused": self.tokens_reused,
+            "tokens_prefilled": self.tokens_prefilled,
+        }
+
+class _BatchStreamer(BaseStreamer):
+    """
+    Receives each generation step's tokens for the whole batch and routes them
+    to their requests: incremental text, stop sequences, EOS and cancellation
+    are handled per row, so one request finishing does not end the others.
+    """
+    def __init__(self, requests: List[InferenceRequest], tokenizer, eos_token_id: Optional[int]):
+        self.requests = requests
+        self.tokenizer = tokenizer
+        self.eos_token_id = eos_token_id
+        self._prompt_skipped = False
+
+    def put(self, value):
+        # generate() first passes the prompt (or decoder start) ids
+        if not self._prompt_skipped:
+            self._prompt_skipped = True
+            return
+        tokens = value.reshape(len(self.requests), -1)[:, -1].tolist()
+        for request, token in zip(self.requests, tokens):
+            if request.finished:
+                continue
+            if request.cancelled:
+                self._finish(request)
+            elif token == self.eos_token_id:
+                self._finish(request)
+            else:
+                request.token_ids.append(token)
+                self._update_text(request)
+
+    def end(self):
+        for request in self.requests:
+            if not request.finished:
+                self._update_text(request, final=True)
+                if not request.finished:
+                    self._finish(request)
+
+    def fail(self, error: Exception):
+        for request in self.requests:
+            if not request.finished:
+                request.finished = True
+                request.future.set_exception(error)
+
+    def check_cancelled(self):
+        for request in self.requests:
+            if not request.finished and request.cancelled:
+                self._finish(request)
+
+    def _update_text(self, request: InferenceRequest, final: bool = False):
+        text = self.tokenizer.decode(request.token_ids, skip_special_tokens=True)
+        # Wait for the rest of a multi-byte character
+        if text.endswith("\ufffd") and not final:
+            return
+        stops = [i for i in (text.find(s, max(0, len(request.text) - len(s))) for s in request.stop) if i >= 0]
+        if stops:
+            text = text[:min(stops)]
+        new_text = text[len(request.text):]
+        request.text = text
+        if new_text and request.on_token is not None:
+            try:
+                request.on_token(new_text)
+            except Exception as e:
+                logger.warning(f"Token callback failed, cancelling the request: {e}")
+                request._cancel_requested = True
+        if stops:
+            self._finish(request)
+
+    def _finish(self, request: InferenceRequest):
+        request.finished = True
+        if request.cancelled:
+            request.future.cancel()
+        else:
+            request.future.set_result(request.text)
+
+class _RowsDone(StoppingCriteria):
+    """Stops each row once its request has finished or been cancelled"""
+    def __init__(self, streamer: _BatchStreamer):
+        self.streamer = streamer
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        self.streamer.check_cancelled()
+        return torch.tensor([r.finished for r in self.streamer.requests], dtype=torch.bool, device=input_ids.device)
+
+class InferenceScheduler:
+    """
+    Collects prompts from concurrent callers into batches for one model.
+
+    A background thread takes the oldest waiting prompt and adds others of
+    similar length, as long as padding stays under `max_padding`, up to
+    `max_batch_size`. It waits at most `max_wait` seconds for a batch to
+    fill. Prompts arriving while a batch runs form the next one. Each
+    request can be cancelled on its own, whether queued or generating.
+    """
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        config: ModelConfig,
+        max_batch_size: int = INFERENCE_BATCH_SIZE,
+        max_wait: float = INFERENCE_BATCH_WAIT_MS / 1000,
+        max_padding: float = INFERENCE_BATCH_MAX_PADDING,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.max_padding = max_padding
+        self.timeout = timeout
+        self.model_id = config.model_id
+
+        # Decoder-only models continue the prompt, so pad on the left
+        if not model.config.is_encoder_decoder:
+            tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        self.generate_kwargs = {
+            "max_new_tokens": config.max_new_tokens,
+            "temperature": config.temperature,
+            "top_p": config.top_p,
+            "repetition_penalty": config.repetition_penalty,
+            "pad_token_id": tokenizer.pad_token_id,
+        }
+
+        self.prefix_cache: Optional[PrefixCache] = None
+        if PREFIX_CACHE_MAX_BYTES > 0 and isinstance(model, torch.nn.Module) and not model.config.is_encoder_decoder:
+            self.prefix_cache = PrefixCache(model, tokenizer)
+
+        self._pending: List[InferenceRequest] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.batches = 0
+        self.batched = 0
+        self.requests = 0
+        self.cancelled = 0
+        self.max_batch_seen = 0
+
+    def submit(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None,
+    ) -> InferenceRequest:
+        """
+        Queue a prompt; its future resolves with the generated text
+        """
+        # Tokenize on the caller's thread so the scheduler only pads and generates
+        if self.prefix_cache is not None:
+            input_ids, prefix, prefix_len = self.prefix_cache.tokenize(prompt)
+        else:
+            input_ids, prefix, prefix_len = self.tokenizer.encode(prompt), None, 0
+        request = InferenceRequest(
+            prompt, input_ids, list(stop or []), on_token, is_cancelled, prefix=prefix, prefix_len=prefix_len
+        )
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Inference scheduler is stopped")
+            self._pending.append(request)
+            self.requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return request
+
+    def result(self, request: InferenceRequest, timeout: Optional[float] = None) -> str:
+        """
+        Wait for a request's text, cancelling it if the wait times out
+        """
+        try:
+            return request.future.result(timeout=timeout or self.timeout)
+        except TimeoutError:
+            self.cancel(request)
+            raise
+
+    def generate(self, prompts: List[str], stop: Optional[List[str]] = None, **kwargs) -> List[str]:
+        """
+        Submit prompts and wait for all of them; on failure the rest are cancelled
+        """
+        with metrics.span("llm_generate", model=self.model_id) as span:
+            requests = [self.submit(prompt, stop, **kwargs) for prompt in prompts]
+            try:
+                texts = [self.result(request) for request in requests]
+                span.attributes["tokens"] = sum(len(request.token_ids) for request in requests)
+                return texts
+            except BaseException:
+                for request in requests:
+                    self.cancel(request)
+                raise
+
+    def add_prefix(self, prefix: str):
+        """
+        Cache the key/value states of a prefix that upcoming prompts will share
+        """
+        if self.prefix_cache is not None:
+            self.prefix_cache.add(prefix)
+
+    def cancel(self, request: InferenceRequest):
+        """
+        Cancel a request; a queued one is dropped, a running one stops at the next step
+        """
+        request._cancel_requested = True
+        with self._cond:
+            self._cond.notify()
+
+    def stop(self):
+        """
+        Stop the scheduler thread; queued requests fail, a running batch completes
+        """
+        with self._cond:
+            self._stopped = True
+            pending, self._pending = self._pending, []
+            self._cond.notify_all()
+        for request in pending:
+            request.future.set_exception(RuntimeError("Inference scheduler is stopped"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queued = len(self._pending)
+        return {
+            "queued": queued,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched / self.batches, 2) if self.batches else 0,
+            "max_batch_size": self.max_batch_seen,
+            "cancelled": self.cancelled,
+            "prefix_cache": self.prefix_cache.stats() if self.prefix_cache is not None else None,
+        }
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._generate_batch(batch)
+
+    def _next_batch(self) -> Optional[List[InferenceRequest]]:
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return None
+                self._drop_cancelled()
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                remaining = self._pending[0].enqueued + self.max_wait - time.monotonic()
+                if len(self._pending) >= self.max_batch_size or remaining <= 0:
+                    batch = self._select_batch()
+                    self._pending = [r for r in self._pending if r not in batch]
+                    return batch
+                self._cond.wait(remaining)
+
+    def _drop_cancelled(self):
+        cancelled = [r for r in self._pending if r.cancelled]
+        if cancelled:
+            self._pending = [r for r in self._pending if not r.cancelled]
+            self.cancelled += len(cancelled)
+            for request in cancelled:
+                request.future.cancel()
+
+    def _select_batch(self) -> List[InferenceRequest]:
+        # The oldest request always runs, so no prompt waits behind a stream of others.
+        # A batch shares one cached prefix (or none).
+        anchor = self._pending[0]
+        batch = [anchor]
+        candidates = sorted(
+            (r for r in self._pending[1:] if r.prefix == anchor.prefix),
+            key=lambda r: abs(len(r.input_ids) - len(anchor.input_ids)),
+        )
+        for request in candidates:
+            if len(batch) >= self.max_batch_size:
+                break
+            if padding_fraction(batch + [request]) <= self.max_padding:
+                batch.append(request)
+        return batch
+
+    def _generate_batch(self, batch: List[InferenceRequest]):
+        self.batches += 1
+        self.batched += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        streamer = _BatchStreamer(batch, self.tokenizer, self.tokenizer.eos_token_id)
+        try:
+            inputs = self._batch_inputs(batch)
+            with torch.inference_mode():
+                self.model.generate(
+                    **inputs,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_RowsDone(streamer)]),
+                    **self.generate_kwargs,
+                )
+            streamer.end()
+        except Exception as e:
+            logger.error(f"Error generating batch of {len(batch)}: {e}")
+            streamer.fail(e)
+        self.cancelled += sum(1 for r in batch if r.future.cancelled())
+        metrics.llm_tokens.inc(sum(len(r.token_ids) for r in batch), model=self.model_id)
+
+    def _batch_inputs(self, batch: List[InferenceRequest]) -> Dict[str, Any]:
+        prefix = batch[0].prefix
+        past = self.prefix_cache.past_key_values(prefix, len(batch)) if prefix is not None else None
+        if past is None:
+            inputs = self.tokenizer.pad({"input_ids": [r.input_ids for r in batch]}, return_tensors="pt")
+            return {name: tensor.to(self.model.device) for name, tensor in inputs.items()}
+
+        # Rows are the shared prefix, padding, then each prompt's own tokens; the
+        # padding is masked out, so positions continue from the prefix as if unpadded
+        prefix_len = batch[0].prefix_len
+        width = max(len(r.input_ids) for r in batch) - prefix_len
+        input_ids, attention_mask = [], []
+        for r in batch:
+            rest = r.input_ids[prefix_len:]
+            padding = width - len(rest)
+            input_ids.append(r.input_ids[:prefix_len] + [self.tokenizer.pad_token_id] * padding + rest)
+            attention_mask.append([1] * prefix_len + [0] * padding + [1] * len(rest))
+        return {
+            "input_ids": torch.tensor(input_ids, device=self.model.device),
+            "attention_mask": torch.tensor(attention_mask, device=self.model.device),
+            "past_key_values": past,
+        }
@@ -0,0 +1,237 @@
+"""
+Deterministic fast path that answers clear single-tool questions without running the LLM agent
+"""
+import logging
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Router settings
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity, and lead over the runner-up, for the classifier to route
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.45"))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.15"))
+# Token budget of a tool result shown directly as the chat answer
+ROUTER_RESPONSE_TOKENS = int(os.getenv("ROUTER_RESPONSE_TOKENS", "400"))
+
+# Graph tools and the graph type each one renders
+GRAPH_TOOLS = {"Cost_Trend_Graph": "costs", "Workloads_Graph": "workloads", "Efficiency_Graph": "efficiency"}
+
+@dataclass
+class Route:
+    """A query resolved to one tool, with the parameter text extracted from it"""
+    tool: str
+    tool_input: Optional[str]
+    source: str
+    confidence: float = 1.0
+
+    @property
+    def graph_type(self) -> Optional[str]:
+        return GRAPH_TOOLS.get(self.tool)
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_GRAPH = r"\b(graph|chart|plot|visuali[sz]|trend)"
+
+# (tool, pattern that must match, optional pattern whose first group is the parameter)
+RULES: List[Tuple[str, re.Pattern, Optional[re.Pattern]]] = [
+    ("QPU_Block_Activity",
+     re.compile(r"\b(top|most active|busiest|highest)\b.*\b(blocks?|days?|activity|workloads?)\b"),
+     re.compile(r"\btop\s+" + _NUMBER)),
+    ("QPU_Summary",
+     re.compile(r"^(?=.*\b(qpus?|blocks?|costs?|data|dataset|workloads?|usage)\b).*"
+                r"\b(summary|summari[sz]e|overview|statistics|stats)\b"), None),
+    ("Cost_Analysis",
+     re.compile(r"\b(only|all|just)\b.*\batom\b.*\b(cost|save|saving|savings|impact)\b|\bcost impact\b"), None),
+    ("Cost_Trend_Graph", re.compile(_GRAPH + r".*\bcosts?\b|\bcosts?\b.*" + _GRAPH), None),
+    ("Workloads_Graph", re.compile(_GRAPH + r".*\bworkloads?\b|\bworkloads?\b.*" + _GRAPH), None),
+    ("Efficiency_Graph", re.compile(_GRAPH + r".*\b(efficiency|ratio)\b|\b(efficiency|ratio)\b.*" + _GRAPH), None),
+    ("Optimize_Block_Mix",
+     re.compile(r"\b(increase|raise|target|more|higher)\b.*\batom\b.*\b(ratio|mix|share|proportion)\b"),
+     re.compile(_NUMBER + r"\s*%|\b(0?\.\d+)\b")),
+    ("Best_Batch_Window",
+     re.compile(r"\b(best|optimal|ideal)\b.*\bbatch"),
+     re.compile(r"\b(?:up to|max(?:imum)?|within)\s+" + _NUMBER)),
+    ("Batch_Scheduling",
+     re.compile(r"\bbatch(ing|ed)?\b.*\b(workloads?|jobs?|schedul\w*|windows?|days?|costs?|savings?)\b"
+                r"|\b(workloads?|jobs?|schedul\w*)\b.*\bbatch(ing|ed)?\b"),
+     re.compile(_NUMBER + r"[\s-]*days?\b|\bevery\s+" + _NUMBER)),
+    ("Negotiate_Costs",
+     re.compile(r"\bnegotiat"),
+     re.compile(_NUMBER + r"\s*(?:%|percent)")),
+    ("Cost_Scenarios",
+     re.compile(r"\b(monte carlo|scenarios?|p10|p50|p90|percentiles?)\b"),
+     re.compile(_NUMBER + r"\s*(?:draws|scenarios|simulations|runs)")),
+]
+
+# When a more specific tool matches, the general one it overlaps with is dropped
+_SUPERSEDES = {"Best_Batch_Window": "Batch_Scheduling"}
+
+# Words that mean a question is not the tool's even though its rule matched:
+# activity ranks days by workload count only, the summary describes the data
+# (not the conversation), and the atom-only analysis is not a partial shift
+_DECLINES = {
+    "QPU_Block_Activity": re.compile(r"\b(costs?|spend\w*|pric\w*|expensive|cheap\w*|efficien\w*|drivers?)\b"),
+    "QPU_Summary": re.compile(r"\b(conversation|chat|discussion|messages?|so far|we talked|you said)\b"),
+    "Cost_Analysis": re.compile(r"\b(more|fewer|less|increase|decrease|percent)\b|%"),
+}
+
+# The classifier cannot extract parameters, so questions with numbers are left to the agent
+_HAS_NUMBER = re.compile(r"\d")
+
+# Questions that need reasoning or combine several results go to the agent
+_NEEDS_AGENT = re.compile(r"\b(why|explain|should|recommend|compare|versus|vs|difference between|what if .* and)\b")
+
+# Date, range and negation qualifiers: the tools answer over the whole dataset
+# and cannot express "not", so such questions also go to the agent
+_MONTHS = (r"january|february|march|april|june|july|august|september|october|november|december"
+           r"|jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec")
+_QUALIFIED = re.compile(
+    r"\b(" + _MONTHS + r")\b"
+    r"|\b(in|during|for|of|since|until|before|after)\s+may\b|\bmay\s+\d"
+    r"|\b\d{4}-\d{1,2}(-\d{1,2})?\b|\b\d{1,2}/\d{1,2}(/\d{2,4})?\b"
+    r"|\b(19|20)\d{2}\b(?!\s*(%|percent|draws|scenarios|simulations|runs|days?\b))"
+    r"|\b(last|past|previous|recent|this|next)\s+(\d+\s+)?(days?|weeks?|months?|quarters?|years?)\b"
+    r"|\b(yesterday|today|recently|ytd|year to date|since|between|until)\b|\bfrom\s+\S+\s+to\b"
+    r"|\b(not|no|never|without|except|excluding|dont)\b|n't\b"
+)
+
+# Example phrasings the classifier is fitted on
+EXAMPLES: Dict[str, List[str]] = {
+    "QPU_Block_Activity": [
+        "which days had the most workloads", "most active qpu blocks", "busiest days",
+        "when were the most workloads executed", "highest activity days",
+    ],
+    "QPU_Summary": [
+        "how many blocks have we leased", "total number of workloads", "average workloads per block",
+        "give me an overview of the qpu usage", "how many atom photon and spin blocks",
+    ],
+    "Cost_Analysis": [
+        "what if we used atom blocks only", "cost of switching everything to atom",
+        "would atom blocks be cheaper", "how much would we save with atom blocks",
+    ],
+    "Cost_Trend_Graph": [
+        "show me the daily costs over time", "how have costs changed", "plot of spending per day",
+    ],
+    "Workloads_Graph": [
+        "show daily workloads over time", "how have workloads changed", "plot workloads per day",
+    ],
+    "Efficiency_Graph": [
+        "show block efficiency over time", "how has cost per workload changed", "atom block ratio over time",
+    ],
+    "Negotiate_Costs": [
+        "what if the lease fees were lower", "reduce fixed costs", "discount on acquisition and lease fees",
+    ],
+    "Batch_Scheduling": [
+        "group workloads into multi day windows", "run workloads every few days together",
+    ],
+    "Cost_Scenarios": [
+        "range of possible savings", "savings distribution", "uncertainty in the savings estimates",
+    ],
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def _features(text: str) -> Counter:
+    words = _TOKEN.findall(text.lower())
+    return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+class IntentClassifier:
+    """
+    Nearest-centroid classifier over TF-IDF weighted unigrams and bigrams.
+    Small enough to fit at import time and score a query in microseconds.
+    """
+    def __init__(self, examples: Dict[str, List[str]]):
+        docs = [(label, _features(text)) for label, texts in examples.items() for text in texts]
+        vocabulary = sorted({term for _, features in docs for term in features})
+        self._index = {term: i for i, term in enumerate(vocabulary)}
+        doc_freq = np.zeros(len(vocabulary))
+        for _, features in docs:
+            doc_freq[[self._index[t] for t in features]] += 1
+        self._idf = np.log((1 + len(docs)) / (1 + doc_freq)) + 1
+
+        self.labels = list(examples)
+        centroids = np.zeros((len(self.labels), len(vocabulary)))
+        for label, features in docs:
+            centroids[self.labels.index(label)] += self._vector(features)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self._centroids = centroids / np.where(norms > 0, norms, 1)
+
+    def _vector(self, features: Counter) -> np.ndarray:
+        vector = np.zeros(len(self._index))
+        for term, count in features.items():
+            i = self._index.get(term)
+            if i is not None:
+                vector[i] = count * self._idf[i]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def predict(self, text: str) -> Tuple[Optional[str], float, float]:
+        """
+        Return (label, score, margin over the runner-up); label is None if nothing overlaps
+        """
+        scores = self._centroids @ self._vector(_features(text))
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        if best <= 0:
+            return None, 0.0, 0.0
+        runner_up = float(scores[order[1]]) if len(order) > 1 else 0.0
+        return self.labels[order[0]], best, best - runner_up
+
+class IntentRouter:
+    """
+    Resolve a chat message to a single tool call, or None when the agent should answer.
+
+    Questions with dates, ranges or negations go to the agent. Otherwise
+    rules are tried first; exactly one tool must match. Messages no rule matches
+    are scored by the classifier, which routes only when it is confident.
+    """
+    def __init__(self, rules=RULES, classifier: Optional[IntentClassifier] = None,
+                 min_confidence: float = ROUTER_MIN_CONFIDENCE, min_margin: float = ROUTER_MIN_MARGIN):
+        self.rules = rules
+        self.classifier = classifier or IntentClassifier(EXAMPLES)
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+
+    def route(self, message: str) -> Optional[Route]:
+        text = message.lower().strip()
+        if not text or _NEEDS_AGENT.search(text) or _QUALIFIED.search(text):
+            return None
+
+        matches = {}
+        for tool, pattern, param in self.rules:
+            if pattern.search(text) and not self._declines(tool, text):
+                value = param.search(text) if param is not None else None
+                matches[tool] = next((g for g in value.groups() if g), None) if value else None
+        for specific, general in _SUPERSEDES.items():
+            if specific in matches:
+                matches.pop(general, None)
+
+        if len(matches) == 1:
+            tool, tool_input = next(iter(matches.items()))
+            return Route(tool, tool_input, "rule")
+        if len(matches) > 1:
+            logger.debug(f"Ambiguous query matched {sorted(matches)}, using the agent")
+            return None
+
+        if _HAS_NUMBER.search(text):
+            return None
+        label, score, margin = self.classifier.predict(text)
+        if (label is not None and score >= self.min_confidence and margin >= self.min_margin
+                and not self._declines(label, text)):
+            # The classifier has no parameter patterns, so tools use their defaults
+            return Route(label, None, "classifier", round(score, 3))
+        return None
+
+    @staticmethod
+    def _declines(tool: str, text: str) -> bool:
+        decline = _DECLINES.get(tool)
+        return decline is not None and decline.search(text) is not None
+
+# Create a singleton instance for easy import
+intent_router = IntentRouter()
@@ -1,6 +1,23 @@
+import os
 from dataclasses import dataclass
 from typing import Dict, Any, Optional, List
 
+# CPU loading defaults for every model (see model_loading.py); entries in
+# AVAILABLE_MODELS can override them.
+# MODEL_BACKEND: "torch", or "onnx" for an ONNX Runtime graph (needs optimum[onnxruntime])
+# MODEL_QUANTIZATION: "none", or "int8" for dynamic int8 quantization of the linear layers
+# MODEL_DTYPE: "float32", "bfloat16", or "auto" for bfloat16 where the CPU supports it
+# MODEL_COMPILE: wrap the torch model's forward pass in torch.compile
+# MODEL_NUM_THREADS / MODEL_INTEROP_THREADS: intra-/inter-op threads (0 keeps the default)
+# MODEL_CACHE_DIR: where converted models are stored, so conversion happens once
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch")
+MODEL_QUANTIZATION = os.getenv("MODEL_QUANTIZATION", "none")
+MODEL_DTYPE = os.getenv("MODEL_DTYPE", "float32")
+MODEL_COMPILE = os.getenv("MODEL_COMPILE", "false").lower() == "true"
+MODEL_NUM_THREADS = int(os.getenv("MODEL_NUM_THREADS", "0"))
+MODEL_INTEROP_THREADS = int(os.getenv("MODEL_INTEROP_THREADS", "0"))
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_cache"))
+
 @dataclass
 class ModelConfig:
     """Configuration for LLM models"""
@@ -9,9 +26,16 @@ class ModelConfig:
     temperature: float = 0.7
     top_p: float = 0.95
     repetition_penalty: float = 1.15
+    # Stream every generation; the chat stream endpoint enables it per request
     streaming: bool = False
     use_cache: bool = True
     device_map: str = "auto"
+    task: str = "text-generation"
+    backend: str = MODEL_BACKEND
+    quantization: str = MODEL_QUANTIZATION
+    dtype: str = MODEL_DTYPE
+    compile: bool = MODEL_COMPILE
+    num_threads: int = MODEL_NUM_THREADS
 
 # Available models configuration
 AVAILABLE_MODELS = {
@@ -34,15 +58,37 @@ AVAILABLE_MODELS = {
     "google/flan-t5-base": ModelConfig(
         model_id="google/flan-t5-base",
         max_new_tokens=256,
+        task="text2text-generation",
     ),
     "google/flan-t5-large": ModelConfig(
         model_id="google/flan-t5-large",
         max_new_tokens=256,
+        task="text2text-generation",
     ),
 }
 
 # Default model to use
-DEFAULT_MODEL = "google/flan-t5-large"
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "google/flan-t5-large")
+
+# Model pool settings: how many models may stay resident at once, and how long
+# (in seconds) an unused model is kept before it is freed
+MAX_LOADED_MODELS = int(os.getenv("MAX_LOADED_MODELS", "1"))
+MODEL_IDLE_TTL = float(os.getenv("MODEL_IDLE_TTL", "1800"))
+
+# Inference batching: concurrent prompts for a model are generated together in
+# batches of up to INFERENCE_BATCH_SIZE. A batch waits at most INFERENCE_BATCH_WAIT_MS
+# for more prompts, and only groups prompts whose padding stays under
+# INFERENCE_BATCH_MAX_PADDING (fraction of the batch's input tokens)
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "true").lower() == "true"
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "8"))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "20"))
+INFERENCE_BATCH_MAX_PADDING = float(os.getenv("INFERENCE_BATCH_MAX_PADDING", "0.5"))
+# Bytes of key/value states kept for shared prompt prefixes such as the agent
+# preamble (decoder-only models; gpt2 takes about 72KB per token; 0 disables prefix caching)
+PREFIX_CACHE_MAX_BYTES = int(os.getenv("PREFIX_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Comma-separated list of models to load and warm when the server starts
+WARM_MODELS = [m.strip() for m in os.getenv("WARM_MODELS", DEFAULT_MODEL).split(",") if m.strip()]
 
 # System prompt templates for different tasks
 SYSTEM_PROMPTS = {
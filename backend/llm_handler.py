@@ -1,31 +1,21 @@
 from langchain import LLMChain, PromptTemplate
-from langchain.llms import HuggingFacePipeline
-from langchain.memory import ConversationBufferMemory
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-import torch
-from typing import List, Dict
+from typing import List, Dict, Optional, Any
 
-# Initialize the language model
-def init_llm():
-    model_id = "meta-llama/Llama-3.2-11B-Vision-Instruct"  # You can replace with any preferred Hugging Face model
-    tokenizer = AutoTokenizer.from_pretrained(model_id)
-    model = AutoModelForCausalLM.from_pretrained(model_id)
-    
-    pipe = pipeline(
-        "text-generation",
-        model=model,
-        tokenizer=tokenizer,
-        max_new_tokens=512,
-        temperature=0.7,
-        top_p=0.95,
-        repetition_penalty=1.15
-    )
-    
-    llm = HuggingFacePipeline(pipeline=pipe)
-    return llm
+from model_registry import model_registry
+from executors import executor_pool
+from conversation_memory import ConversationMemory
+
+# Get the shared language model from the process-wide pool
+def init_llm(model_name: Optional[str] = None):
+    return model_registry.get(model_name)
 
 # Process user query with LLM
-async def process_query_with_llm(query: str, history: List[Dict[str, str]]):
+async def process_query_with_llm(
+    query: str,
+    history: List[Dict[str, str]],
+    callbacks: Optional[List[Any]] = None,
+    memory: Optional[ConversationMemory] = None,
+):
     llm = init_llm()
     
     # Create a template for the LLM prompt
@@ -39,10 +29,10 @@ async def process_query_with_llm(query: str, history: List[Dict[str, str]]):
     AI: 
     """
     
-    # Format the history for the template
-    formatted_history = ""
-    for entry in history:
-        formatted_history += f"Human: {entry['user']}\nAI: {entry['assistant']}\n"
+    # Format the history for the template, within the memory token budget
+    if memory is None:
+        memory = await executor_pool.run_in_thread(ConversationMemory.from_history, history)
+    formatted_history = memory.render()
     
     prompt = PromptTemplate(
         input_variables=["history", "query"],
@@ -52,6 +42,7 @@ async def process_query_with_llm(query: str, history: List[Dict[str, str]]):
     # Create the chain
     chain = LLMChain(llm=llm, prompt=prompt)
     
-    # Run the chain
-    response = chain.run(history=formatted_history, query=query)
+    # Run the chain on a worker thread so inference doesn't block the event loop;
+    # concurrent chains share forward passes through the model's inference scheduler
+    response = await executor_pool.run_in_thread(chain.run, history=formatted_history, query=query, callbacks=callbacks)
     return response.strip()
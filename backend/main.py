@@ -38,7 +38,7 @@ def parse_args():
         "--data-path", 
         type=str, 
         default="./data/qpc_data.json", 
-        help="Path to QPU data JSON file"
+        help="Path to QPU data JSON file or column directory (*.cols)"
     )
     return parser.parse_args()
 
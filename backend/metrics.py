@@ -0,0 +1,224 @@
+"""
+Per-stage latency spans, counters and histograms, exposed in the Prometheus text format
+"""
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+METRICS_BUCKETS = [float(b) for b in os.getenv(
+    "METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60"
+).split(",") if b.strip()]
+
+# (labels, value) pairs of one metric, as reported by a collector
+Samples = List[Tuple[Dict[str, str], float]]
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    """Monotonic count per combination of label values"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labels, key)), value
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, per combination of label values"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = METRICS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = sorted(buckets)
+        # Per label key: [count per bucket..., count above the last bucket], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + [math.inf], counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+@dataclass
+class Span:
+    """One timed stage; `attributes` can be filled in while the stage runs"""
+    stage: str
+    start: float
+    seconds: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+class Trace:
+    """The spans recorded while handling one request"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Total time, time per stage, and each span with its offset from the start of the request
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        stages: Dict[str, float] = {}
+        for span in spans:
+            stages[span.stage] = stages.get(span.stage, 0.0) + span.seconds
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "stages": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+            "spans": [
+                {"stage": s.stage, "offset": round(s.start - self.started, 4), "seconds": round(s.seconds, 4), **s.attributes}
+                for s in spans
+            ],
+        }
+
+# The trace of the request being handled; executor_pool copies it to worker threads
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+class MetricsRegistry:
+    """
+    Counters and histograms of the server, plus collectors that report the
+    counters components already keep (cache hit rates, batching statistics).
+
+    `span()` times a stage into the qpu_stage_seconds histogram and, while a
+    `trace()` is active, into the request's trace.
+    """
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Samples]]]] = []
+        self.stage_seconds = self.histogram("qpu_stage_seconds", "Latency of request processing stages", ["stage"])
+        self.tool_seconds = self.histogram("qpu_tool_seconds", "Latency of agent tool calls", ["tool"])
+        self.llm_tokens = self.counter("qpu_llm_tokens_generated_total", "Tokens generated by the LLM", ["model"])
+        self.http_seconds = self.histogram(
+            "qpu_http_request_seconds", "Latency of HTTP requests", ["method", "route", "status"]
+        )
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = METRICS_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Samples]]]):
+        """
+        Add a function called at each scrape, returning (name, type, help, samples) tuples
+        """
+        self._collectors.append(collect)
+
+    @contextmanager
+    def span(self, stage: str, histogram: Optional[Histogram] = None, **labels) -> Iterator[Span]:
+        """
+        Time a stage. `labels` are recorded in the trace and, when a histogram
+        is given, used as its labels too.
+        """
+        span = Span(stage, time.perf_counter(), attributes=dict(labels))
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - span.start
+            self.stage_seconds.observe(span.seconds, stage=stage)
+            if histogram is not None:
+                histogram.observe(span.seconds, **labels)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add(span)
+
+    @contextmanager
+    def trace(self) -> Iterator[Trace]:
+        """
+        Collect the spans of the current request (and the worker threads it uses)
+        """
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in metric.samples())
+
+        for collect in self._collectors:
+            try:
+                collected = list(collect())
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+                continue
+            for name, kind, help, samples in collected:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+# Create a singleton instance for easy import
+metrics = MetricsRegistry()
@@ -0,0 +1,256 @@
+"""
+CPU-oriented model loading: int8 quantization, bfloat16, torch.compile, ONNX Runtime,
+thread pinning, and a cache of converted models so each conversion happens once
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+import transformers
+from transformers import AutoTokenizer, AutoModelForCausalLM, AutoModelForSeq2SeqLM, pipeline
+from transformers.pytorch_utils import Conv1D
+
+from llm_config import MODEL_CACHE_DIR, MODEL_INTEROP_THREADS, WARM_MODELS, ModelConfig, get_model_config
+
+try:
+    import onnxruntime
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from optimum.onnxruntime import ORTModelForCausalLM, ORTModelForSeq2SeqLM
+    from optimum.pipelines import pipeline as ort_pipeline
+except ImportError:  # optimum[onnxruntime] is optional; without it models load with torch
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+_threads_lock = threading.Lock()
+_interop_configured = False
+
+def configure_threads(num_threads: int, interop_threads: int = MODEL_INTEROP_THREADS):
+    """
+    Pin torch's intra-op and inter-op thread counts (0 keeps the default).
+    The inter-op count can only be set once per process, before any parallel work.
+    """
+    global _interop_configured
+    with _threads_lock:
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        if interop_threads > 0 and not _interop_configured:
+            _interop_configured = True
+            try:
+                torch.set_num_interop_threads(interop_threads)
+            except RuntimeError as e:
+                logger.warning(f"Could not set inter-op threads: {e}")
+
+def bf16_supported() -> bool:
+    """
+    Whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+def torch_dtype(config: ModelConfig) -> torch.dtype:
+    # Dynamic quantization computes activations in float32
+    if config.quantization == "int8":
+        return torch.float32
+    if config.dtype == "bfloat16" or (config.dtype == "auto" and bf16_supported()):
+        return torch.bfloat16
+    return torch.float32
+
+def resolve_config(config: ModelConfig) -> ModelConfig:
+    """
+    The config actually used: ONNX falls back to torch when optimum is not installed
+    """
+    if config.backend == "onnx" and onnxruntime is None:
+        logger.warning(f"optimum[onnxruntime] is not installed, loading {config.model_id} with torch")
+        return dataclasses.replace(config, backend="torch")
+    return config
+
+def variant_name(config: ModelConfig) -> str:
+    """
+    Name of the converted form of a model, e.g. torch-int8, torch-bfloat16 or onnx-int8
+    """
+    if config.backend == "onnx":
+        return "onnx-int8" if config.quantization == "int8" else "onnx"
+    if config.quantization == "int8":
+        return "torch-int8"
+    return "torch-bfloat16" if torch_dtype(config) == torch.bfloat16 else "torch-float32"
+
+def artifact_dir(config: ModelConfig, cache_dir: str = MODEL_CACHE_DIR) -> Optional[str]:
+    """
+    Cache directory of a model's variant, or None for plain float32 torch
+    (the Hugging Face cache already holds that)
+    """
+    variant = variant_name(config)
+    if variant == "torch-float32":
+        return None
+    return os.path.join(cache_dir, config.model_id.replace("/", "--"), variant)
+
+def _manifest(config: ModelConfig) -> Dict[str, Any]:
+    # Pickled and exported models are tied to the library versions that wrote them
+    return {
+        "model_id": config.model_id,
+        "variant": variant_name(config),
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+        "onnxruntime": onnxruntime.__version__ if onnxruntime is not None else None,
+    }
+
+def is_cached(config: ModelConfig, cache_dir: str = MODEL_CACHE_DIR) -> bool:
+    path = artifact_dir(config, cache_dir)
+    if path is None:
+        return True
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f) == _manifest(config)
+    except (OSError, ValueError):
+        return False
+
+def _auto_class(config: ModelConfig):
+    if config.backend == "onnx":
+        return ORTModelForSeq2SeqLM if config.task == "text2text-generation" else ORTModelForCausalLM
+    return AutoModelForSeq2SeqLM if config.task == "text2text-generation" else AutoModelForCausalLM
+
+def _linear_from_conv1d(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    GPT-2 style models use transformers' Conv1D (a Linear with transposed
+    weights), which dynamic quantization skips; swap in nn.Linear first
+    """
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                linear = torch.nn.Linear(child.weight.shape[0], child.nf)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(module, name, linear)
+    return model
+
+def quantize_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Dynamic int8 quantization of the linear layers: weights are stored as int8
+    and activations quantized on the fly, which suits CPU inference
+    """
+    return torch.ao.quantization.quantize_dynamic(_linear_from_conv1d(model), {torch.nn.Linear}, dtype=torch.qint8)
+
+def _quantize_onnx(path: str):
+    for name in os.listdir(path):
+        if name.endswith(".onnx"):
+            source = os.path.join(path, name)
+            quantized = source + ".int8"
+            quantize_dynamic(source, quantized, weight_type=QuantType.QInt8)
+            os.replace(quantized, source)
+
+def export_model(config: ModelConfig, cache_dir: str = MODEL_CACHE_DIR, force: bool = False) -> Optional[str]:
+    """
+    Convert a model to its configured variant and store it, with its tokenizer,
+    in the cache. Returns the directory, or None when no conversion is needed.
+    """
+    config = resolve_config(config)
+    path = artifact_dir(config, cache_dir)
+    if path is None or (is_cached(config, cache_dir) and not force):
+        return path
+
+    logger.info(f"Converting {config.model_id} to {variant_name(config)}")
+    # Build next to the target and swap it in, so a crash never leaves a partial artifact
+    staging = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    AutoTokenizer.from_pretrained(config.model_id).save_pretrained(staging)
+
+    if config.backend == "onnx":
+        model = _auto_class(config).from_pretrained(config.model_id, export=True, use_cache=config.use_cache)
+        model.save_pretrained(staging)
+        if config.quantization == "int8":
+            _quantize_onnx(staging)
+    else:
+        model = _auto_class(config).from_pretrained(config.model_id, torch_dtype=torch_dtype(config))
+        if config.quantization == "int8":
+            torch.save(quantize_int8(model.eval()), os.path.join(staging, "model.pt"))
+        else:
+            model.save_pretrained(staging)
+
+    with open(os.path.join(staging, MANIFEST), "w") as f:
+        json.dump(_manifest(config), f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(staging, path)
+    return path
+
+def load_model(config: ModelConfig, cache_dir: str = MODEL_CACHE_DIR) -> Tuple[Any, Any]:
+    """
+    Load (tokenizer, model) for a config, converting and caching the model on first use
+    """
+    config = resolve_config(config)
+    configure_threads(config.num_threads)
+    path = export_model(config, cache_dir)
+
+    if path is None:
+        tokenizer = AutoTokenizer.from_pretrained(config.model_id)
+        model = _auto_class(config).from_pretrained(config.model_id)
+    elif config.backend == "onnx":
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        options = onnxruntime.SessionOptions()
+        if config.num_threads > 0:
+            options.intra_op_num_threads = config.num_threads
+        if MODEL_INTEROP_THREADS > 0:
+            options.inter_op_num_threads = MODEL_INTEROP_THREADS
+        model = _auto_class(config).from_pretrained(path, session_options=options, use_cache=config.use_cache)
+    elif config.quantization == "int8":
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        model = torch.load(os.path.join(path, "model.pt"), weights_only=False)
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        model = _auto_class(config).from_pretrained(path, torch_dtype=torch_dtype(config))
+
+    if config.backend == "torch":
+        model.eval()
+        if config.compile:
+            # Keep compiled kernels next to the converted models so restarts reuse them
+            os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(cache_dir, "inductor"))
+            os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+            model.forward = torch.compile(model.forward, dynamic=True)
+    return tokenizer, model
+
+def build_pipeline(config: ModelConfig, tokenizer, model):
+    """
+    Text generation pipeline around a loaded model, with the config's generation settings
+    """
+    kwargs = {
+        "max_new_tokens": config.max_new_tokens,
+        "temperature": config.temperature,
+        "top_p": config.top_p,
+        "repetition_penalty": config.repetition_penalty,
+    }
+    if onnxruntime is not None and isinstance(model, (ORTModelForCausalLM, ORTModelForSeq2SeqLM)):
+        return ort_pipeline(config.task, model=model, tokenizer=tokenizer, accelerator="ort", **kwargs)
+    return pipeline(config.task, model=model, tokenizer=tokenizer, **kwargs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert models to their configured CPU variants ahead of startup")
+    parser.add_argument("models", nargs="*", help="Entries of AVAILABLE_MODELS (defaults to WARM_MODELS)")
+    parser.add_argument("--backend", choices=["torch", "onnx"], help="Override MODEL_BACKEND")
+    parser.add_argument("--quantization", choices=["none", "int8"], help="Override MODEL_QUANTIZATION")
+    parser.add_argument("--dtype", choices=["float32", "bfloat16", "auto"], help="Override MODEL_DTYPE")
+    parser.add_argument("--force", action="store_true", help="Convert again even if a cached copy exists")
+    args = parser.parse_args()
+
+    overrides = {k: v for k, v in (("backend", args.backend), ("quantization", args.quantization), ("dtype", args.dtype)) if v}
+    for model_name in args.models or WARM_MODELS:
+        config = dataclasses.replace(get_model_config(model_name), **overrides)
+        path = export_model(config, force=args.force)
+        print(f"{model_name}: {path or 'no conversion needed'}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
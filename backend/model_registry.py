@@ -0,0 +1,232 @@
+"""
+Process-wide pool of loaded LLMs, keyed by the entries in llm_config.AVAILABLE_MODELS
+"""
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from langchain.llms import HuggingFacePipeline
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.schema import Generation, LLMResult
+
+from inference_scheduler import InferenceScheduler
+from metrics import metrics
+from model_loading import build_pipeline, load_model
+from llm_config import (
+    DEFAULT_MODEL,
+    INFERENCE_BATCHING,
+    MAX_LOADED_MODELS,
+    MODEL_IDLE_TTL,
+    ModelConfig,
+    get_model_config,
+)
+
+logger = logging.getLogger(__name__)
+
+def _handlers_stream(run_manager: Optional[CallbackManagerForLLMRun]) -> bool:
+    # Callback handlers set `streams_tokens` when they forward tokens as they are generated
+    return run_manager is not None and any(getattr(handler, "streams_tokens", False) for handler in run_manager.handlers)
+
+class StreamingHuggingFacePipeline(HuggingFacePipeline):
+    """
+    HuggingFacePipeline that generates through the token streamer when
+    `streaming` is set or a callback handler of the request streams tokens,
+    so handlers receive on_llm_new_token while the answer is being produced
+    """
+    streaming: bool = False
+    model_id: str = ""
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        with metrics.span("llm_generate", model=self.model_id) as span:
+            if not (self.streaming or _handlers_stream(run_manager)):
+                result = super()._generate(prompts, stop=stop, run_manager=run_manager, **kwargs)
+            else:
+                generations = []
+                for prompt in prompts:
+                    text = ""
+                    for chunk in self._stream(prompt, stop=stop, run_manager=run_manager, **kwargs):
+                        text += chunk.text
+                    generations.append([Generation(text=text)])
+                result = LLMResult(generations=generations)
+            # The pipeline does not report token counts, so count the generated text's tokens
+            tokens = sum(len(self.pipeline.tokenizer.encode(g[0].text, add_special_tokens=False)) for g in result.generations)
+            span.attributes["tokens"] = tokens
+        metrics.llm_tokens.inc(tokens, model=self.model_id)
+        return result
+
+def _handlers_cancelled(run_manager: CallbackManagerForLLMRun) -> bool:
+    # Callback handlers set `cancelled` when nobody is waiting for the answer any more
+    return any(getattr(handler, "cancelled", False) for handler in run_manager.handlers)
+
+class BatchedHuggingFacePipeline(HuggingFacePipeline):
+    """
+    HuggingFacePipeline that generates through an InferenceScheduler, so
+    prompts from concurrent requests and agent steps share forward passes
+    """
+    scheduler: Any = None
+    streaming: bool = False
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        streaming = run_manager is not None and (self.streaming or _handlers_stream(run_manager))
+        on_token = run_manager.on_llm_new_token if streaming else None
+        is_cancelled = partial(_handlers_cancelled, run_manager) if run_manager is not None else None
+        texts = self.scheduler.generate(prompts, stop, on_token=on_token, is_cancelled=is_cancelled)
+        return LLMResult(generations=[[Generation(text=text)] for text in texts])
+
+def load_llm(config: ModelConfig) -> HuggingFacePipeline:
+    """
+    Load tokenizer and weights for a model (in the CPU variant its config asks
+    for) and wrap them in a LangChain LLM
+    """
+    tokenizer, model = load_model(config)
+    pipe = build_pipeline(config, tokenizer, model)
+
+    if INFERENCE_BATCHING:
+        scheduler = InferenceScheduler(model, tokenizer, config)
+        return BatchedHuggingFacePipeline(pipeline=pipe, scheduler=scheduler, streaming=config.streaming)
+    return StreamingHuggingFacePipeline(pipeline=pipe, streaming=config.streaming, model_id=config.model_id)
+
+class _LoadedModel:
+    def __init__(self, llm: HuggingFacePipeline):
+        self.llm = llm
+        self.last_used = time.monotonic()
+
+class ModelRegistry:
+    """
+    Loads each model once and shares it across requests.
+
+    Models are kept in least-recently-used order. When more than `max_loaded`
+    models are resident, or a model has not been used for `idle_ttl` seconds,
+    it is dropped so its memory can be reclaimed.
+    """
+    def __init__(self, max_loaded: int = MAX_LOADED_MODELS, idle_ttl: float = MODEL_IDLE_TTL):
+        self.max_loaded = max(1, max_loaded)
+        self.idle_ttl = idle_ttl
+        self._models: "OrderedDict[str, _LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, model_name: Optional[str] = None) -> HuggingFacePipeline:
+        """
+        Return the LLM for `model_name` (or the default model), loading it on first use
+        """
+        model_name = model_name or DEFAULT_MODEL
+        config = get_model_config(model_name)
+        self.evict_idle()
+
+        with self._lock:
+            entry = self._models.get(model_name)
+            if entry is not None:
+                self._models.move_to_end(model_name)
+                entry.last_used = time.monotonic()
+                return entry.llm
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Only one thread loads a given model; the others wait and reuse it
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(model_name)
+                if entry is not None:
+                    entry.last_used = time.monotonic()
+                    return entry.llm
+
+            logger.info(f"Loading model {config.model_id}")
+            with metrics.span("model_load", model=config.model_id) as span:
+                llm = load_llm(config)
+            logger.info(f"Model {config.model_id} loaded in {span.seconds:.1f}s")
+
+            with self._lock:
+                self._models[model_name] = _LoadedModel(llm)
+                self._evict_over_capacity()
+            return llm
+
+    def warm_up(self, model_names: Optional[List[str]] = None):
+        """
+        Load the given models (the default model when None; an empty list warms
+        nothing) and run a short generation so the first real request is fast
+        """
+        if model_names is None:
+            model_names = [DEFAULT_MODEL]
+        for model_name in model_names:
+            try:
+                llm = self.get(model_name)
+                llm.invoke("Hello")
+                logger.info(f"Model {model_name} warmed up")
+            except Exception as e:
+                logger.error(f"Error warming up model {model_name}: {e}")
+
+    def evict_idle(self):
+        """
+        Drop models that have not been used within the idle TTL
+        """
+        if self.idle_ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            idle = [name for name, entry in self._models.items() if now - entry.last_used > self.idle_ttl]
+            for name in idle:
+                self._unload(name)
+
+    def unload(self, model_name: str):
+        """
+        Explicitly drop a model from the pool
+        """
+        with self._lock:
+            self._unload(model_name)
+
+    def tokenizer(self, model_name: Optional[str] = None):
+        """
+        Tokenizer of a model that is already loaded, or None (this never triggers a load)
+        """
+        with self._lock:
+            entry = self._models.get(model_name or DEFAULT_MODEL)
+        return entry.llm.pipeline.tokenizer if entry is not None else None
+
+    def inference_stats(self) -> Dict[str, Any]:
+        """
+        Batching statistics of the loaded models that use an inference scheduler
+        """
+        with self._lock:
+            entries = list(self._models.items())
+        return {
+            name: entry.llm.scheduler.stats()
+            for name, entry in entries
+            if getattr(entry.llm, "scheduler", None) is not None
+        }
+
+    def loaded_models(self) -> List[str]:
+        with self._lock:
+            return list(self._models.keys())
+
+    def _evict_over_capacity(self):
+        while len(self._models) > self.max_loaded:
+            name = next(iter(self._models))
+            self._unload(name)
+
+    def _unload(self, model_name: str):
+        entry = self._models.pop(model_name, None)
+        if entry is not None:
+            logger.info(f"Unloading model {model_name}")
+            scheduler = getattr(entry.llm, "scheduler", None)
+            if scheduler is not None:
+                scheduler.stop()
+            gc.collect()
+
+# Create a singleton instance for easy import
+model_registry = ModelRegistry()
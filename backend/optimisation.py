@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 # Cost parameters (daily lease cost assumes 24 hours)
@@ -16,6 +17,9 @@ WORKLOAD_EXECUTION_COST = {
 # Workload trigger cost (same for all categories)
 WORKLOAD_TRIGGER_COST = 0.01
 
+# Categories in the order they are considered (ties go to the earliest one)
+CATEGORIES = ['Atom', 'Photon', 'Spin']
+
 def compute_block_cost(qpu_units, workload_count, category, hours=24):
     """
     Compute the daily cost for a block given:
@@ -41,7 +45,7 @@ def optimize_block_category(qpu_units, workload_count):
     best_category = None
     best_cost = float('inf')
     
-    for cat in ['Atom', 'Photon', 'Spin']:
+    for cat in CATEGORIES:
         cost = compute_block_cost(qpu_units, workload_count, cat)
         if cost < best_cost:
             best_cost = cost
@@ -49,24 +53,41 @@ def optimize_block_category(qpu_units, workload_count):
             
     return best_category, best_cost
 
+def compute_cost_matrix(qpu_units, workload_count, hours=24):
+    """
+    Vectorized version of compute_block_cost for many blocks at once.
+    
+    Returns an array of shape (len(qpu_units), len(CATEGORIES)) holding the daily
+    cost of every block in every category, computed in a single NumPy pass.
+    """
+    qpu_units = np.asarray(qpu_units, dtype=float)[:, None]
+    workload_count = np.asarray(workload_count, dtype=float)[:, None]
+    
+    lease_rate = np.array([LEASE_COST_PER_HOUR[cat] for cat in CATEGORIES])
+    execution_rate = np.array([WORKLOAD_EXECUTION_COST[cat] for cat in CATEGORIES])
+    
+    # Same operation order as compute_block_cost so results match exactly
+    lease_fee = lease_rate * hours * qpu_units
+    execution_cost = execution_rate * qpu_units * workload_count
+    trigger_cost = WORKLOAD_TRIGGER_COST * workload_count
+    return lease_fee + execution_cost + trigger_cost
+
 def optimize_distribution(df):
     """
     Given a DataFrame 'df' with the following columns:
-      - 'block_id': Unique identifier for the block.
-      - 'qpu_units': The number of QPU units in the block.
-      - 'workload_count': The number of workloads executed on that block.
+      - 'new_blocks_total': The number of QPU units in the block.
+      - 'daily_workloads': The number of workloads executed on that block.
     
     This function computes the optimal category for each block (minimizing the daily cost)
     and adds two new columns:
       - 'optimal_category'
       - 'optimal_cost'
     """
-    # Apply the optimization function row by row
-    optimal_results = df.apply(
-        lambda row: optimize_block_category(row['new_blocks_total'], row['daily_workloads']),
-        axis=1
-    )
-    df[['optimal_category', 'optimal_cost']] = pd.DataFrame(optimal_results.tolist(), index=df.index)
+    costs = compute_cost_matrix(df['new_blocks_total'], df['daily_workloads'])
+    best = costs.argmin(axis=1)
+    
+    df['optimal_category'] = np.array(CATEGORIES, dtype=object)[best]
+    df['optimal_cost'] = costs[np.arange(len(costs)), best]
     return df
 
 def compute_daily_total_cost(df, hours=24):
@@ -74,11 +95,13 @@ def compute_daily_total_cost(df, hours=24):
     Compute the total daily cost for all blocks in the DataFrame using their optimal category.
     Adds a 'daily_cost' column for each block.
     """
-    def block_daily_cost(row):
-        # Use the optimal category computed by optimize_distribution
-        return compute_block_cost(row['new_blocks_total'], row['daily_workloads'], row['optimal_category'], hours)
+    # Use the optimal category computed by optimize_distribution
+    category_index = pd.Categorical(df['optimal_category'], categories=CATEGORIES).codes
+    if (category_index < 0).any():
+        raise KeyError("Unknown category in 'optimal_category'")
     
-    df['daily_cost'] = df.apply(block_daily_cost, axis=1)
+    costs = compute_cost_matrix(df['new_blocks_total'], df['daily_workloads'], hours)
+    df['daily_cost'] = costs[np.arange(len(costs)), category_index]
     total_cost = df['daily_cost'].sum()
     return total_cost
 
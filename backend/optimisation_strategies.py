@@ -1,6 +1,9 @@
+import numpy as np
+import pandas as pd
+
 from data_processor import get_sample_data
 
-def optimize_block_mix(target_atom_ratio=0.8):
+def block_mix_savings(target_atom_ratio=0.8):
     """
     Estimate cost savings by increasing the proportion of Atom blocks.
     The simulation assumes that if the overall Atom block ratio increases,
@@ -10,7 +13,7 @@ def optimize_block_mix(target_atom_ratio=0.8):
         target_atom_ratio (float): Desired overall ratio of Atom blocks (e.g., 0.8 for 80%)
     
     Returns:
-        str: A message with the estimated cost savings.
+        dict: Current ratio, improvement factor, current and new total cost, and the saving.
     """
     df = get_sample_data()
     # Calculate the current overall Atom ratio
@@ -28,9 +31,76 @@ def optimize_block_mix(target_atom_ratio=0.8):
     new_total_cost = current_total_cost * (1 - improvement_factor)
     cost_saving = current_total_cost - new_total_cost
     
+    return {
+        "target_atom_ratio": float(target_atom_ratio),
+        "current_atom_ratio": float(overall_current_ratio),
+        "improvement_factor": float(improvement_factor),
+        "current_total_cost": float(current_total_cost),
+        "new_total_cost": float(new_total_cost),
+        "cost_saving": float(cost_saving),
+    }
+
+def optimize_block_mix(target_atom_ratio=0.8):
+    """
+    Estimate cost savings by increasing the proportion of Atom blocks (see block_mix_savings).
+    
+    Returns:
+        str: A message with the estimated cost savings.
+    """
+    result = block_mix_savings(target_atom_ratio)
     return (f"By increasing the Atom block ratio to {target_atom_ratio*100:.1f}%, "
-            f"estimated cost savings are approximately ${cost_saving:,.2f} "
-            f"({improvement_factor*100:.1f}% reduction in cost per workload).")
+            f"estimated cost savings are approximately ${result['cost_saving']:,.2f} "
+            f"({result['improvement_factor']*100:.1f}% reduction in cost per workload).")
+
+def batch_savings_curve(windows=None, max_window=None):
+    """
+    Evaluate batch scheduling for many batch windows in one vectorized pass.
+    
+    A batch of w days pays its variable cost for every day but the fixed costs
+    (acquisition, lease, workload trigger) only for its first day, so the total
+    for window w is the variable total plus the fixed cost on days 0, w, 2w, ...
+    The batch-start indices of every window are laid out in one array and summed
+    per window with a single segmented reduction.
+    
+    Parameters:
+        windows (list of int): Batch windows to evaluate. Defaults to 1..max_window.
+        max_window (int): Largest window when `windows` is not given. Defaults to the number of days.
+    
+    Returns:
+        pd.DataFrame: One row per window with new_total_cost, cost_saving and percentage.
+    """
+    df = get_sample_data()
+    n = len(df)
+    if windows is None:
+        windows = np.arange(1, min(int(max_window or n), n) + 1)
+    windows = np.asarray(windows, dtype=np.int64)
+    if n == 0 or len(windows) == 0:
+        return pd.DataFrame(columns=["batch_window", "new_total_cost", "cost_saving", "percentage"])
+    if (windows < 1).any():
+        raise ValueError("Batch windows must be at least 1 day")
+    
+    fixed = (df['acquisition_cost'] + df['lease_fee_cost'] + df['workload_trigger_cost']).to_numpy(dtype=float)
+    variable_total = df['workload_execution_cost'].sum()
+    original_total_cost = df['total_daily_cost'].sum()
+    
+    # Number of batches per window, and where each window's segment starts
+    batch_counts = -(-n // windows)
+    segment_starts = np.concatenate(([0], np.cumsum(batch_counts)[:-1]))
+    
+    # Batch number within its window, times the window, gives the first day of each batch
+    batch_number = np.arange(batch_counts.sum()) - np.repeat(segment_starts, batch_counts)
+    first_days = batch_number * np.repeat(windows, batch_counts)
+    
+    fixed_per_window = np.add.reduceat(fixed[first_days], segment_starts)
+    new_total_cost = variable_total + fixed_per_window
+    cost_saving = original_total_cost - new_total_cost
+    
+    return pd.DataFrame({
+        "batch_window": windows,
+        "new_total_cost": new_total_cost,
+        "cost_saving": cost_saving,
+        "percentage": cost_saving / original_total_cost * 100,
+    })
 
 def simulate_batch_scheduling(batch_window=3):
     """
@@ -44,29 +114,16 @@ def simulate_batch_scheduling(batch_window=3):
     Returns:
         str: A message with the estimated cost savings.
     """
-    df = get_sample_data()
-    n = len(df)
-    batches = [df.iloc[i:i+batch_window] for i in range(0, n, batch_window)]
-    
-    original_total_cost = df['total_daily_cost'].sum()
-    new_total_cost = 0
+    batch_window = int(batch_window)
+    result = batch_savings_curve(windows=[batch_window]).iloc[0]
     
-    for batch in batches:
-        # Sum variable cost (assumed to be workload_execution_cost)
-        variable_cost = batch['workload_execution_cost'].sum()
-        # Fixed cost for the batch: use the fixed costs from the first day of the batch
-        fixed_cost = (batch.iloc[0]['acquisition_cost'] +
-                      batch.iloc[0]['lease_fee_cost'] +
-                      batch.iloc[0]['workload_trigger_cost'])
-        new_total_cost += variable_cost + fixed_cost
-    
-    cost_saving = original_total_cost - new_total_cost
-    percentage = (cost_saving / original_total_cost) * 100
+    cost_saving = result['cost_saving']
+    percentage = result['percentage']
     
     return (f"Batch scheduling every {batch_window} days could save approximately "
             f"${cost_saving:,.2f} ({percentage:.1f}% reduction in costs) over the period.")
 
-def negotiate_costs(reduction_percent=10):
+def negotiation_savings(reduction_percent=10):
     """
     Estimate cost savings by negotiating a reduction in fixed cost components:
     acquisition_cost, lease_fee_cost, and workload_trigger_cost.
@@ -75,7 +132,7 @@ def negotiate_costs(reduction_percent=10):
         reduction_percent (float): The percentage reduction to apply to the fixed costs.
     
     Returns:
-        str: A message with the estimated cost savings.
+        dict: Original and new total cost, the saving and its percentage.
     """
     df = get_sample_data()
     
@@ -96,5 +153,21 @@ def negotiate_costs(reduction_percent=10):
     cost_saving = original_total_cost - new_total_cost
     percentage = (cost_saving / original_total_cost) * 100
     
+    return {
+        "reduction_percent": float(reduction_percent),
+        "original_total_cost": float(original_total_cost),
+        "new_total_cost": float(new_total_cost),
+        "cost_saving": float(cost_saving),
+        "percentage": float(percentage),
+    }
+
+def negotiate_costs(reduction_percent=10):
+    """
+    Estimate cost savings by negotiating a reduction in fixed costs (see negotiation_savings).
+    
+    Returns:
+        str: A message with the estimated cost savings.
+    """
+    result = negotiation_savings(reduction_percent)
     return (f"Negotiating a {reduction_percent}% reduction in fixed costs could save approximately "
-            f"${cost_saving:,.2f} ({percentage:.1f}% reduction in total costs) over the period.")
+            f"${result['cost_saving']:,.2f} ({result['percentage']:.1f}% reduction in total costs) over the period.")
@@ -0,0 +1,185 @@
+"""
+Content-addressed cache of rendered graphs, keyed by graph type, dataset version and render parameters
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from dataset_store import dataset_store, DEFAULT_DATASET
+from visualization import GRAPH_DIR, RENDERERS
+
+logger = logging.getLogger(__name__)
+
+# Maximum size of rendered graphs kept in memory; older entries spill to disk,
+# where the least recently used are deleted beyond RENDER_CACHE_DISK_MAX_BYTES
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RENDER_CACHE_DISK_MAX_BYTES = int(os.getenv("RENDER_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+RENDER_CACHE_DIR = os.path.join(GRAPH_DIR, "cache")
+
+# Parameters every renderer accepts, merged into keys so equivalent requests share an entry
+DEFAULT_RENDER_PARAMS = {"dpi": 300}
+
+@dataclass
+class RenderedGraph:
+    """PNG bytes for one graph plus the validators used for HTTP caching"""
+    key: str
+    graph_type: str
+    data: bytes
+    etag: str
+
+class RenderCache:
+    """
+    Size-bounded LRU of rendered graphs.
+
+    Entries evicted from memory are written to RENDER_CACHE_DIR and promoted back
+    on the next hit, so a graph is only re-rendered when its inputs change.
+    The spill directory is bounded too: beyond `max_disk_bytes` the files used
+    least recently (by mtime, refreshed on each read) are deleted, which also
+    clears graphs of old dataset versions. Renders themselves are queued
+    through render_jobs.py.
+    """
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES, spill_dir: str = RENDER_CACHE_DIR,
+                 max_disk_bytes: int = RENDER_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = spill_dir
+        self._spill_lock = threading.Lock()
+        self._entries: "OrderedDict[str, RenderedGraph]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, graph_type: str, params: Optional[Dict[str, Any]] = None) -> str:
+        if graph_type not in RENDERERS:
+            raise ValueError(f"Invalid graph type {graph_type}")
+        payload = json.dumps(
+            [graph_type, dataset_store.version(DEFAULT_DATASET), {**DEFAULT_RENDER_PARAMS, **(params or {})}],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, key: str) -> Optional[RenderedGraph]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_spilled(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._insert(entry)
+        return entry
+
+    def store(self, key: str, graph_type: str, data: bytes) -> RenderedGraph:
+        entry = RenderedGraph(key, graph_type, data, f'"{hashlib.sha256(data).hexdigest()[:32]}"')
+        self._insert(entry)
+        return entry
+
+    def file_path(self, entry: RenderedGraph) -> str:
+        """
+        Path of a disk copy of a graph, for callers that need a file. The copy
+        lives in the spill directory, so it counts against `max_disk_bytes`.
+        """
+        path = self._spill_path(entry.key)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            self._spill(entry)
+            if not os.path.exists(path):
+                raise OSError(f"Could not write graph {entry.key} to {self.spill_dir}")
+            self._trim_spilled()
+        return path
+
+    def _insert(self, entry: RenderedGraph):
+        with self._lock:
+            previous = self._entries.pop(entry.key, None)
+            if previous is not None:
+                self._size -= len(previous.data)
+            self._entries[entry.key] = entry
+            self._size += len(entry.data)
+
+            spilled = []
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.data)
+                spilled.append(evicted)
+
+        for evicted in spilled:
+            self._spill(evicted)
+        if spilled:
+            self._trim_spilled()
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.png")
+
+    def _spill(self, entry: RenderedGraph):
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = self._spill_path(entry.key)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(entry.data)
+                os.replace(tmp_path, path)
+                # Keep the graph type alongside the bytes so the entry can be rebuilt
+                with open(f"{path}.type", "w") as f:
+                    f.write(entry.graph_type)
+        except OSError as e:
+            logger.error(f"Error spilling graph {entry.key} to disk: {e}")
+
+    def _read_spilled(self, key: str) -> Optional[RenderedGraph]:
+        path = self._spill_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(f"{path}.type") as f:
+                graph_type = f.read().strip()
+            # Mark the file as recently used for the spill directory's LRU
+            os.utime(path)
+        except OSError:
+            return None
+        return RenderedGraph(key, graph_type, data, f'"{hashlib.sha256(data).hexdigest()[:32]}"')
+
+    def _trim_spilled(self):
+        """
+        Delete the least recently used spilled graphs while the directory is over its byte limit
+        """
+        with self._spill_lock:
+            try:
+                files = []
+                with os.scandir(self.spill_dir) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".png") and entry.is_file():
+                            stat = entry.stat()
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError as e:
+                logger.error(f"Error listing spilled graphs: {e}")
+                return
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                for stale in (path, f"{path}.type"):
+                    try:
+                        os.remove(stale)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.error(f"Error deleting spilled graph {stale}: {e}")
+                total -= size
+
+# Create a singleton instance for easy import
+render_cache = RenderCache()
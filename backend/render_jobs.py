@@ -0,0 +1,157 @@
+"""
+Background queue of graph renders on the process pool, with job ids clients can poll or subscribe to
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from executors import executor_pool
+from metrics import metrics
+from render_cache import render_cache, RenderedGraph, DEFAULT_RENDER_PARAMS
+from visualization import render_graph
+
+logger = logging.getLogger(__name__)
+
+# Number of finished jobs whose status can still be queried
+RENDER_JOB_HISTORY = int(os.getenv("RENDER_JOB_HISTORY", "256"))
+
+@dataclass
+class RenderJob:
+    """One graph render; jobs for the same cache key while it is in flight share this object"""
+    id: str
+    graph_type: str
+    params: Dict[str, Any]
+    key: str
+    status: str = "pending"
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    graph: Optional[RenderedGraph] = None
+    # Resolved with the RenderedGraph once it is in the render cache
+    done: Future = field(default_factory=Future, repr=False)
+
+    def result(self, timeout: Optional[float] = None) -> RenderedGraph:
+        """
+        Block until the graph is rendered
+        """
+        return self.done.result(timeout=timeout or executor_pool.timeout)
+
+    async def wait(self, timeout: Optional[float] = None) -> RenderedGraph:
+        """
+        Await the rendered graph without blocking the event loop
+        """
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.done)), timeout or executor_pool.timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "graph_type": self.graph_type,
+            "params": self.params,
+            "status": self.status,
+            "error": self.error,
+            "etag": self.graph.etag if self.graph is not None else None,
+        }
+
+class RenderJobQueue:
+    """
+    Submits renders to the process pool (pyplot is not thread-safe) and tracks them by job id.
+
+    A request whose graph is already cached gets a finished job at once. A
+    request for a graph that is being rendered joins the in-flight job, so
+    each distinct graph is rendered once however many clients ask for it.
+    """
+    def __init__(self, history: int = RENDER_JOB_HISTORY):
+        self.history = history
+        self._jobs: "OrderedDict[str, RenderJob]" = OrderedDict()
+        self._in_flight: Dict[str, RenderJob] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def submit(self, graph_type: str, **params) -> RenderJob:
+        params = {**DEFAULT_RENDER_PARAMS, **params}
+        key = render_cache.make_key(graph_type, params)
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None:
+                self.coalesced += 1
+                return job
+
+        job = RenderJob(uuid.uuid4().hex, graph_type, params, key)
+        cached = render_cache.lookup(key)
+        if cached is not None:
+            self._finish(job, cached)
+            self._remember(job)
+            return job
+
+        with self._lock:
+            # Another thread may have started the same render meanwhile
+            existing = self._in_flight.get(key)
+            if existing is not None:
+                self.coalesced += 1
+                return existing
+            self._in_flight[key] = job
+        self._remember(job)
+
+        try:
+            future = executor_pool.processes.submit(render_graph, graph_type, **params)
+        except Exception as e:
+            self._fail(job, e)
+            raise
+        job.status = "running"
+        future.add_done_callback(lambda f: self._complete(job, f))
+        return job
+
+    def get(self, job_id: str) -> Optional[RenderJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._in_flight), "tracked": len(self._jobs), "coalesced": self.coalesced}
+
+    def _complete(self, job: RenderJob, future: Future):
+        try:
+            data = future.result()
+        except Exception as e:
+            logger.error(f"Error rendering {job.graph_type} graph: {e}")
+            self._fail(job, e)
+            return
+        self._finish(job, render_cache.store(job.key, job.graph_type, data))
+        # The render (plotting and savefig) runs in a worker process; time it from submission
+        metrics.stage_seconds.observe(job.finished - job.created, stage="graph_render")
+
+    def _finish(self, job: RenderJob, graph: RenderedGraph):
+        job.graph = graph
+        job.status = "done"
+        job.finished = time.time()
+        with self._lock:
+            self._in_flight.pop(job.key, None)
+        job.done.set_result(graph)
+
+    def _fail(self, job: RenderJob, error: Exception):
+        job.status = "error"
+        job.error = str(error) or type(error).__name__
+        job.finished = time.time()
+        with self._lock:
+            self._in_flight.pop(job.key, None)
+        job.done.set_exception(error)
+
+    def _remember(self, job: RenderJob):
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs; in-flight ones are always kept
+            for job_id in list(self._jobs):
+                if len(self._jobs) <= self.history:
+                    break
+                if self._jobs[job_id].finished is not None:
+                    del self._jobs[job_id]
+
+# Create a singleton instance for easy import
+render_jobs = RenderJobQueue()
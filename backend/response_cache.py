@@ -0,0 +1,197 @@
+"""
+Cache of chat answers in front of the agent, with an optional embedding-similarity tier
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dataset_store import dataset_store, DEFAULT_DATASET
+
+logger = logging.getLogger(__name__)
+
+# Cache settings
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Number of most recent turns that make a cached answer context-specific
+RESPONSE_CACHE_HISTORY_TURNS = int(os.getenv("RESPONSE_CACHE_HISTORY_TURNS", "2"))
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true"
+RESPONSE_CACHE_EMBEDDING_MODEL = os.getenv("RESPONSE_CACHE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+_NON_WORD = re.compile(r"[^a-z0-9.%$ ]+")
+_SPACES = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercase, drop punctuation and collapse whitespace so trivially different
+    phrasings of the same question share a key
+    """
+    text = _NON_WORD.sub(" ", query.lower())
+    return _SPACES.sub(" ", text).strip().rstrip(".")
+
+def query_numbers(normalized: str) -> Tuple[str, ...]:
+    """
+    Numbers in a normalized query ("batch 3 days" -> ("3",)); questions that
+    differ in them ask for different results however similar they read
+    """
+    return tuple(sorted(_NUMBER.findall(normalized)))
+
+def history_fingerprint(history: List[Dict[str, str]], turns: int = RESPONSE_CACHE_HISTORY_TURNS) -> str:
+    """
+    Hash of the most recent turns, which is all the context a cached answer depends on
+    """
+    recent = history[-turns:] if turns > 0 else []
+    payload = json.dumps(
+        [[normalize_query(t.get("user", "")), normalize_query(t.get("assistant", ""))] for t in recent]
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+class SentenceEmbedder:
+    """
+    Local sentence embeddings via sentence-transformers, if it is installed
+    """
+    def __init__(self, model_name: str = RESPONSE_CACHE_EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = self.model.encode([text], normalize_embeddings=True)[0]
+        return np.asarray(vector, dtype=np.float32)
+
+@dataclass
+class _Entry:
+    response: str
+    context: str
+    created: float
+    vector: Optional[np.ndarray] = None
+    numbers: Tuple[str, ...] = ()
+
+class ResponseCache:
+    """
+    LRU + TTL cache of agent answers.
+
+    Exact hits match on the normalized query, the recent-history fingerprint and
+    the dataset version. When an embedder is configured, a miss falls back to the
+    most similar cached question with the same context and the same numbers,
+    above `similarity`.
+    """
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        embedder: Optional[Any] = None,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embedder = embedder
+        self.similarity = similarity
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "semantic_hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def _context(self, history: List[Dict[str, str]]) -> str:
+        return f"{history_fingerprint(history)}:{dataset_store.version(DEFAULT_DATASET)}"
+
+    def get(self, query: str, history: List[Dict[str, str]]) -> Optional[str]:
+        normalized = normalize_query(query)
+        context = self._context(history)
+        key = f"{context}:{normalized}"
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._metrics["hits"] += 1
+                return entry.response
+            numbers = query_numbers(normalized)
+            candidates = [
+                (k, e) for k, e in self._entries.items()
+                if e.context == context and e.vector is not None and e.numbers == numbers
+            ]
+
+        if self.embedder is not None and candidates:
+            vector = self._embed(normalized)
+            if vector is not None:
+                matrix = np.stack([e.vector for _, e in candidates])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    best_key, best_entry = candidates[best]
+                    with self._lock:
+                        if best_key in self._entries:
+                            self._entries.move_to_end(best_key)
+                        self._metrics["semantic_hits"] += 1
+                    return best_entry.response
+
+        with self._lock:
+            self._metrics["misses"] += 1
+        return None
+
+    def put(self, query: str, history: List[Dict[str, str]], response: str):
+        normalized = normalize_query(query)
+        context = self._context(history)
+        vector = self._embed(normalized) if self.embedder is not None else None
+
+        with self._lock:
+            key = f"{context}:{normalized}"
+            self._entries.pop(key, None)
+            self._entries[key] = _Entry(response, context, time.monotonic(), vector, query_numbers(normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics["evicted"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._metrics["hits"] + self._metrics["semantic_hits"] + self._metrics["misses"]
+            hit_rate = (self._metrics["hits"] + self._metrics["semantic_hits"]) / lookups if lookups else 0.0
+            return {
+                **self._metrics,
+                "size": len(self._entries),
+                "hit_rate": round(hit_rate, 4),
+                "semantic": self.embedder is not None,
+            }
+
+    def _expire(self, now: float):
+        if self.ttl <= 0:
+            return
+        # Entries are in insertion/use order, but TTL counts from insertion, so scan all
+        stale = [k for k, e in self._entries.items() if now - e.created > self.ttl]
+        for k in stale:
+            del self._entries[k]
+        self._metrics["expired"] += len(stale)
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            return self.embedder(text)
+        except Exception as e:
+            logger.error(f"Error embedding query for the response cache: {e}")
+            return None
+
+def _create_embedder() -> Optional[SentenceEmbedder]:
+    if not RESPONSE_CACHE_SEMANTIC:
+        return None
+    try:
+        return SentenceEmbedder()
+    except Exception as e:
+        logger.warning(f"Semantic response cache disabled: {e}")
+        return None
+
+# Create a singleton instance for easy import
+response_cache = ResponseCache(embedder=_create_embedder())
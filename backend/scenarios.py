@@ -0,0 +1,152 @@
+"""
+Monte Carlo cost scenarios built on the optimisation strategies
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from data_processor import get_sample_data
+from executors import executor_pool
+
+# Draws evaluated per vectorized batch; bounds memory at CHUNK_SIZE x days floats
+CHUNK_SIZE = 1000
+
+STRATEGIES = ("block_mix", "negotiation", "batch_scheduling")
+
+def _strategy_inputs() -> Dict[str, Any]:
+    """
+    Per-day cost components the strategies need, as plain arrays that pickle cheaply
+    """
+    df = get_sample_data()
+    return {
+        "acquisition": df['acquisition_cost'].to_numpy(dtype=float),
+        "lease": df['lease_fee_cost'].to_numpy(dtype=float),
+        "trigger": df['workload_trigger_cost'].to_numpy(dtype=float),
+        "execution": df['workload_execution_cost'].to_numpy(dtype=float),
+        "atom_ratio": df['new_blocks_atom'].sum() / df['new_blocks_total'].sum(),
+    }
+
+def _simulate_chunk(inputs: Dict[str, Any], params: Dict[str, Any], n_draws: int, seed) -> Dict[str, np.ndarray]:
+    """
+    Evaluate `n_draws` scenarios at once. Module-level so it can run on the process pool.
+
+    Workload noise scales the per-workload costs (trigger and execution) of every
+    day by an independent lognormal factor; acquisition and lease are unaffected.
+    """
+    rng = np.random.default_rng(seed)
+    n_days = len(inputs["execution"])
+
+    target_ratio = rng.uniform(*params["atom_ratio"], size=n_draws)
+    reduction = rng.uniform(*params["reduction_percent"], size=n_draws)
+    window = rng.integers(params["batch_window"][0], params["batch_window"][1] + 1, size=n_draws)
+    growth = rng.lognormal(mean=0.0, sigma=params["workload_noise"], size=(n_draws, n_days))
+
+    fixed = inputs["acquisition"] + inputs["lease"] + inputs["trigger"] * growth
+    execution = inputs["execution"] * growth
+    fixed_total = fixed.sum(axis=1)
+    total_cost = fixed_total + execution.sum(axis=1)
+
+    # optimize_block_mix: up to 10% off the total as the atom ratio approaches the target
+    current = inputs["atom_ratio"]
+    improvement = np.clip((target_ratio - current) * 0.10 / (1 - current), 0.0, 0.10)
+    block_mix = total_cost * improvement
+
+    # negotiate_costs: a percentage off the fixed components
+    negotiation = fixed_total * reduction / 100
+
+    # simulate_batch_scheduling: fixed costs are only paid on the first day of each batch
+    first_days = (np.arange(n_days)[None, :] % window[:, None]) == 0
+    batch_scheduling = fixed_total - (fixed * first_days).sum(axis=1)
+
+    return {
+        "total_cost": total_cost,
+        "block_mix": block_mix,
+        "negotiation": negotiation,
+        "batch_scheduling": batch_scheduling,
+    }
+
+def _summarize(values: np.ndarray, percentiles: Sequence[float]) -> Dict[str, float]:
+    summary = {"mean": float(values.mean()), "std": float(values.std())}
+    for p, v in zip(percentiles, np.percentile(values, percentiles)):
+        summary[f"p{p:g}"] = float(v)
+    return summary
+
+def run_cost_scenarios(
+    n_draws: int = 5000,
+    atom_ratio: Tuple[float, float] = (0.5, 0.9),
+    reduction_percent: Tuple[float, float] = (5, 15),
+    batch_window: Tuple[int, int] = (1, 14),
+    workload_noise: float = 0.1,
+    seed: Optional[int] = None,
+    parallel: bool = False,
+    percentiles: Sequence[float] = (10, 50, 90),
+) -> Dict[str, Any]:
+    """
+    Sample strategy parameters and workload noise and return savings distributions.
+
+    Parameters:
+        n_draws (int): Number of scenarios.
+        atom_ratio (tuple): Uniform range of target Atom block ratios.
+        reduction_percent (tuple): Uniform range of negotiated fixed-cost reductions.
+        batch_window (tuple): Inclusive range of batch windows in days.
+        workload_noise (float): Sigma of the lognormal per-day workload multiplier.
+        seed (int): Seed for reproducible results.
+        parallel (bool): Spread the draws across the process pool.
+        percentiles (list): Percentiles to report.
+
+    Returns:
+        dict: For each strategy, savings and percentage-saving statistics.
+    """
+    if n_draws < 1:
+        raise ValueError("n_draws must be at least 1")
+    if batch_window[0] < 1 or batch_window[1] < batch_window[0]:
+        raise ValueError("batch_window must be an increasing range starting at 1 or more")
+
+    inputs = _strategy_inputs()
+    params = {
+        "atom_ratio": tuple(atom_ratio),
+        "reduction_percent": tuple(reduction_percent),
+        "batch_window": (int(batch_window[0]), int(batch_window[1])),
+        "workload_noise": float(workload_noise),
+    }
+
+    sizes = [CHUNK_SIZE] * (n_draws // CHUNK_SIZE)
+    if n_draws % CHUNK_SIZE:
+        sizes.append(n_draws % CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if parallel and len(sizes) > 1:
+        futures = [executor_pool.processes.submit(_simulate_chunk, inputs, params, size, s) for size, s in zip(sizes, seeds)]
+        chunks: List[Dict[str, np.ndarray]] = [f.result(timeout=executor_pool.timeout) for f in futures]
+    else:
+        chunks = [_simulate_chunk(inputs, params, size, s) for size, s in zip(sizes, seeds)]
+
+    samples = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+    total_cost = samples["total_cost"]
+
+    result = {
+        "draws": n_draws,
+        "parameters": params,
+        "total_cost": _summarize(total_cost, percentiles),
+    }
+    for strategy in STRATEGIES:
+        result[strategy] = {
+            "savings": _summarize(samples[strategy], percentiles),
+            "percentage": _summarize(samples[strategy] / total_cost * 100, percentiles),
+        }
+    return result
+
+def format_cost_scenarios(result: Dict[str, Any]) -> str:
+    """
+    Describe the P10/P50/P90 savings per strategy of a run_cost_scenarios result
+    """
+    names = {
+        "block_mix": "Increasing the Atom block ratio",
+        "negotiation": "Negotiating fixed costs",
+        "batch_scheduling": "Batch scheduling",
+    }
+    lines = [f"Across {result['draws']:,} simulated scenarios, estimated savings (P10 / P50 / P90):"]
+    for strategy in STRATEGIES:
+        savings = result[strategy]["savings"]
+        lines.append(f"- {names[strategy]}: ${savings['p10']:,.0f} / ${savings['p50']:,.0f} / ${savings['p90']:,.0f}")
+    return "\n".join(lines)
@@ -0,0 +1,279 @@
+"""
+Server-side chat sessions, so clients send only the new message on each turn
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from conversation_memory import ConversationMemory, Turn
+
+logger = logging.getLogger(__name__)
+
+# Session settings
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.db"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+# Attempts at appending a turn when other workers keep appending to the same session
+SESSION_APPEND_RETRIES = 5
+
+class SessionConflict(Exception):
+    """Raised when another worker changed a session since this process loaded it"""
+
+class MemoryBackend:
+    """
+    Keeps nothing beyond the in-process cache; sessions end with the process
+    """
+    # Only this process sees the sessions, so its cache is always current
+    shared = False
+
+    def load(self, session_id: str, min_updated: float) -> Optional[ConversationMemory]:
+        return None
+
+    def total_turns(self, session_id: str, min_updated: float) -> Optional[int]:
+        return None
+
+    def save(self, session_id: str, memory: ConversationMemory, new_turn: Optional[Turn] = None):
+        pass
+
+    def delete(self, session_id: str):
+        pass
+
+    def expire(self, min_updated: float) -> int:
+        return 0
+
+class SQLiteBackend:
+    """
+    Persists the summary and window of each session.
+
+    A turn is one INSERT; turns that left the window are deleted and the
+    summary updated in the same transaction, so a session's rows stay bounded.
+    The database can be shared by several workers: a turn is only written if
+    the stored turn count is still the one the memory was built from.
+    """
+    shared = True
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, summary TEXT NOT NULL, total_turns INTEGER NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, user TEXT NOT NULL, assistant TEXT NOT NULL, "
+                "tokens INTEGER NOT NULL, PRIMARY KEY (session_id, seq))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def load(self, session_id: str, min_updated: float) -> Optional[ConversationMemory]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, total_turns FROM sessions WHERE id = ? AND updated >= ?", (session_id, min_updated)
+            ).fetchone()
+            if row is None:
+                return None
+            turns = self._conn.execute(
+                "SELECT user, assistant, tokens FROM turns WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return ConversationMemory.restore(row[0], [Turn(*t) for t in turns], row[1])
+
+    def total_turns(self, session_id: str, min_updated: float) -> Optional[int]:
+        """
+        Stored turn count of a live session, to check whether a cached memory is current
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total_turns FROM sessions WHERE id = ? AND updated >= ?", (session_id, min_updated)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def save(self, session_id: str, memory: ConversationMemory, new_turn: Optional[Turn] = None):
+        """
+        Write a new session, or the memory's latest turn. Raises SessionConflict,
+        writing nothing, if another worker appended a turn in the meantime.
+        """
+        summary, window, total_turns = memory.state()
+        first_seq = total_turns - len(window)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if new_turn is None:
+                    # Initial save writes the whole window
+                    self._conn.execute(
+                        "INSERT INTO sessions (id, summary, total_turns, updated) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET summary = excluded.summary, "
+                        "total_turns = excluded.total_turns, updated = excluded.updated",
+                        (session_id, summary, total_turns, time.time()),
+                    )
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?, ?)",
+                        [(session_id, first_seq + i, t.user, t.assistant, t.tokens) for i, t in enumerate(window)],
+                    )
+                else:
+                    updated = self._conn.execute(
+                        "UPDATE sessions SET summary = ?, total_turns = ?, updated = ? WHERE id = ? AND total_turns = ?",
+                        (summary, total_turns, time.time(), session_id, total_turns - 1),
+                    )
+                    if updated.rowcount == 0:
+                        raise SessionConflict(f"Session {session_id} changed or expired")
+                    self._conn.execute(
+                        "INSERT INTO turns VALUES (?, ?, ?, ?, ?)",
+                        (session_id, total_turns - 1, new_turn.user, new_turn.assistant, new_turn.tokens),
+                    )
+                self._conn.execute("DELETE FROM turns WHERE session_id = ? AND seq < ?", (session_id, first_seq))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def expire(self, min_updated: float) -> int:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM turns WHERE session_id IN (SELECT id FROM sessions WHERE updated < ?)", (min_updated,)
+            )
+            return self._conn.execute("DELETE FROM sessions WHERE updated < ?", (min_updated,)).rowcount
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend}
+
+class _Session:
+    def __init__(self, memory: ConversationMemory):
+        self.memory = memory
+        self.last_used = time.monotonic()
+
+class SessionStore:
+    """
+    Conversation memories by session id.
+
+    Active sessions are cached in process (least recently used dropped past
+    `max_sessions`); the backend keeps them across restarts and workers.
+    With a shared backend, a cached memory is only used while its turn count
+    matches the stored one, and an append that loses a race with another
+    worker is retried on the reloaded session. Sessions unused for `ttl`
+    seconds expire. Each turn is appended incrementally, so the cost per
+    turn does not grow with the conversation.
+    """
+    def __init__(self, backend: Optional[Any] = None, ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Appends to one session are serialized in process (striped by session id)
+        self._append_locks = [threading.Lock() for _ in range(64)]
+
+    def create(self, history: Optional[List[Dict[str, str]]] = None) -> str:
+        """
+        Start a session, optionally seeded with a client-side history
+        """
+        self.expire()
+        session_id = uuid.uuid4().hex
+        memory = ConversationMemory.from_history(history or [])
+        self.backend.save(session_id, memory)
+        self._cache(session_id, memory)
+        return session_id
+
+    def get(self, session_id: str) -> Optional[ConversationMemory]:
+        """
+        Return the memory of a live session, or None if it is unknown or expired
+        """
+        now = time.monotonic()
+        cached = None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if self.ttl > 0 and now - session.last_used > self.ttl:
+                    del self._sessions[session_id]
+                else:
+                    session.last_used = now
+                    self._sessions.move_to_end(session_id)
+                    cached = session.memory
+
+        min_updated = time.time() - self.ttl if self.ttl > 0 else 0
+        if cached is not None:
+            if not self.backend.shared or self.backend.total_turns(session_id, min_updated) == cached.total_turns:
+                return cached
+            # Another worker appended to, deleted or expired the session
+            self._evict(session_id, cached)
+
+        memory = self.backend.load(session_id, min_updated)
+        if memory is not None:
+            self._cache(session_id, memory)
+        return memory
+
+    def append(self, session_id: str, user: str, assistant: str):
+        """
+        Record a turn in a session's memory and persist just that turn
+        """
+        with self._append_locks[hash(session_id) % len(self._append_locks)]:
+            for _ in range(SESSION_APPEND_RETRIES):
+                memory = self.get(session_id)
+                if memory is None:
+                    raise KeyError(f"Session {session_id} not found")
+                turn = memory.add_turn(user, assistant)
+                try:
+                    self.backend.save(session_id, memory, turn)
+                    return
+                except SessionConflict:
+                    # The cached memory now holds a turn that was not stored; reload and reapply
+                    self._evict(session_id, memory)
+        raise SessionConflict(f"Session {session_id} kept changing, turn not recorded")
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        self.backend.delete(session_id)
+
+    def expire(self) -> int:
+        """
+        Drop sessions idle for longer than the TTL
+        """
+        if self.ttl <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            stale = [sid for sid, s in self._sessions.items() if now - s.last_used > self.ttl]
+            for sid in stale:
+                del self._sessions[sid]
+        return len(stale) + self.backend.expire(time.time() - self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": len(self._sessions), "backend": type(self.backend).__name__, "ttl": self.ttl}
+
+    def _evict(self, session_id: str, memory: ConversationMemory):
+        # Only drop the entry if it still holds this memory
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and session.memory is memory:
+                del self._sessions[session_id]
+
+    def _cache(self, session_id: str, memory: ConversationMemory):
+        with self._lock:
+            self._sessions[session_id] = _Session(memory)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+def _create_backend():
+    backend = BACKENDS.get(SESSION_BACKEND)
+    if backend is None:
+        logger.warning(f"Unknown session backend {SESSION_BACKEND}, using memory")
+        return MemoryBackend()
+    return backend()
+
+# Create a singleton instance for easy import
+session_store = SessionStore(_create_backend())
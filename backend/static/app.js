@@ -29,7 +29,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const suggestionChips = document.querySelectorAll('.suggestion-chip');
     const toolButtons = document.querySelectorAll('.tool-button');
     
-    let chatHistory = [];
+    // The server keeps the conversation; only its id is sent with each message
+    let sessionId = null;
     
     // Initialize loading state
     let isLoading = false;
@@ -61,44 +62,92 @@ document.addEventListener('DOMContentLoaded', function() {
         // Scroll to bottom
         chatMessages.scrollTop = chatMessages.scrollHeight;
         
-        // Send to backend API
-        fetch('/api/chat', {
+        // Send to backend API and render the answer as it streams in
+        let botMessageElement = null;
+        let streamedText = '';
+        
+        function ensureBotMessage() {
+            if (!botMessageElement) {
+                chatMessages.removeChild(loadingElement);
+                botMessageElement = createMessageElement('', 'bot');
+                chatMessages.appendChild(botMessageElement);
+            }
+            return botMessageElement;
+        }
+        
+        function handleStreamEvent(event, data) {
+            if (event === 'token') {
+                streamedText += data;
+                ensureBotMessage().querySelector('.message-text').innerHTML = formatText(streamedText);
+            } else if (event === 'thought' || event === 'action' || event === 'observation') {
+                const status = ensureBotMessage().querySelector('.message-status');
+                status.textContent = event === 'action'
+                    ? `Using ${data.tool}...`
+                    : event === 'observation' ? 'Analyzing results...' : 'Thinking...';
+            } else if (event === 'done') {
+                const finalElement = createMessageElement(data.response, 'bot', data.graph);
+                if (botMessageElement) {
+                    chatMessages.replaceChild(finalElement, botMessageElement);
+                } else {
+                    chatMessages.removeChild(loadingElement);
+                    chatMessages.appendChild(finalElement);
+                }
+                botMessageElement = finalElement;
+                
+                // Graphs are drawn here from the chart data
+                if (data.chart) {
+                    attachChart(finalElement, data.chart);
+                } else if (data.graph_job) {
+                    // The graph is still rendering; add it when its job finishes
+                    attachGraphWhenReady(finalElement, data.graph_job);
+                }
+                
+                // Remember the session (the server starts a new one if it expired)
+                if (data.session_id) {
+                    sessionId = data.session_id;
+                }
+            } else if (event === 'error') {
+                throw new Error(data.detail);
+            }
+            
+            // Scroll to bottom
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        }
+        
+        fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
             },
             body: JSON.stringify({
                 message: message,
-                history: chatHistory
+                session_id: sessionId,
+                client_charts: true,
+                graph_jobs: true
             })
         })
-        .then(response => response.json())
-        .then(data => {
-            // Remove loading indicator
-            chatMessages.removeChild(loadingElement);
+        .then(response => {
+            if (!response.ok || !response.body) {
+                throw new Error(`Request failed with status ${response.status}`);
+            }
+            return readEventStream(response.body, handleStreamEvent);
+        })
+        .then(() => {
             isLoading = false;
             
-            // Add bot response to UI
-            const botMessageElement = createMessageElement(data.response, 'bot', data.graph);
-            chatMessages.appendChild(botMessageElement);
-            
-            // Update chat history
-            chatHistory.push({
-                user: message,
-                assistant: data.response
-            });
-            
-            // Scroll to bottom
-            chatMessages.scrollTop = chatMessages.scrollHeight;
-            
             // Add quantum particles for visual effect
             addQuantumParticles();
         })
         .catch(error => {
             console.error('Error:', error);
             
-            // Remove loading indicator
-            chatMessages.removeChild(loadingElement);
+            // Remove loading indicator or partial answer
+            if (botMessageElement) {
+                chatMessages.removeChild(botMessageElement);
+            } else if (loadingElement.parentElement) {
+                chatMessages.removeChild(loadingElement);
+            }
             isLoading = false;
             
             // Show error message
@@ -116,6 +165,228 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Read a Server-Sent Events body and call onEvent(event, data) for each message
+    function readEventStream(body, onEvent) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        function dispatch(rawEvent) {
+            let event = 'message';
+            const dataLines = [];
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            if (dataLines.length) {
+                onEvent(event, JSON.parse(dataLines.join('\n')));
+            }
+        }
+        
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                if (value) {
+                    buffer += decoder.decode(value, { stream: true });
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        dispatch(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                    }
+                }
+                if (done) {
+                    if (buffer.trim()) {
+                        dispatch(buffer);
+                    }
+                    return;
+                }
+                return pump();
+            });
+        }
+        
+        return pump();
+    }
+    
+    // Subscribe to a render job and show the graph once it is ready
+    function attachGraphWhenReady(messageElement, jobId) {
+        const status = messageElement.querySelector('.message-status');
+        status.textContent = 'Rendering graph...';
+        
+        const source = new EventSource(`/api/jobs/${jobId}/events`);
+        source.addEventListener('done', (e) => {
+            source.close();
+            status.textContent = '';
+            const graphElement = document.createElement('div');
+            graphElement.className = 'message-graph';
+            graphElement.innerHTML = `<img src="${JSON.parse(e.data).url}" alt="Analysis Graph">`;
+            messageElement.querySelector('.message-content').appendChild(graphElement);
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        });
+        source.addEventListener('error', () => {
+            source.close();
+            status.textContent = 'The graph could not be rendered.';
+        });
+    }
+    
+    // Fetch a chart's data, downsampled to the width of the message, and draw it
+    function attachChart(messageElement, chartType) {
+        const content = messageElement.querySelector('.message-content');
+        const graphElement = document.createElement('div');
+        graphElement.className = 'message-graph';
+        const canvas = document.createElement('canvas');
+        canvas.setAttribute('aria-label', 'Analysis Graph');
+        graphElement.appendChild(canvas);
+        content.appendChild(graphElement);
+        
+        const width = Math.max(300, Math.round(graphElement.clientWidth || content.clientWidth || 600));
+        fetch(`/api/charts/${chartType}?points=${width}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Request failed with status ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(spec => {
+                drawChart(canvas, spec, width);
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            })
+            .catch(error => {
+                console.error('Error loading chart:', error);
+                content.removeChild(graphElement);
+                messageElement.querySelector('.message-status').textContent = 'The graph could not be loaded.';
+            });
+    }
+    
+    const CHART_FORMATS = {
+        currency: v => '$' + Math.round(v).toLocaleString(),
+        currency2: v => '$' + v.toFixed(2),
+        integer: v => Math.round(v).toLocaleString(),
+        ratio: v => v.toFixed(2)
+    };
+    
+    // Draw a chart spec from /api/charts (line or bar series, one or two y axes) on a canvas
+    function drawChart(canvas, spec, width, height = 320) {
+        const ratio = window.devicePixelRatio || 1;
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+        canvas.style.width = '100%';
+        canvas.style.maxWidth = `${width}px`;
+        const ctx = canvas.getContext('2d');
+        ctx.scale(ratio, ratio);
+        
+        const textColor = getComputedStyle(canvas).color || '#333';
+        const dualAxis = spec.axes.length > 1;
+        const margin = { top: 36, right: dualAxis ? 80 : 20, bottom: 44, left: 80 };
+        const plotWidth = width - margin.left - margin.right;
+        const plotHeight = height - margin.top - margin.bottom;
+        
+        const times = spec.x.map(d => Date.parse(d));
+        const tMin = times[0];
+        const tSpan = Math.max(1, times[times.length - 1] - tMin);
+        const xAt = t => margin.left + (t - tMin) / tSpan * plotWidth;
+        
+        // Scale for each axis from its fixed range or the data of its series
+        const scales = {};
+        spec.axes.forEach(axis => {
+            const values = spec.series.filter(s => s.axis === axis.id).flatMap(s => s.y);
+            let min = axis.min !== undefined ? axis.min : Math.min(...values);
+            let max = axis.max !== undefined ? axis.max : Math.max(...values);
+            if (spec.kind === 'bar' && axis.min === undefined) min = Math.min(0, min);
+            if (max === min) max = min + 1;
+            if (axis.max === undefined) max += (max - min) * 0.05;
+            scales[axis.id] = { min, max, format: CHART_FORMATS[axis.format] || (v => String(v)) };
+        });
+        const yAt = (scale, v) => margin.top + plotHeight - (v - scale.min) / (scale.max - scale.min) * plotHeight;
+        
+        ctx.clearRect(0, 0, width, height);
+        ctx.font = '11px sans-serif';
+        ctx.fillStyle = textColor;
+        ctx.strokeStyle = 'rgba(128, 128, 128, 0.3)';
+        ctx.lineWidth = 1;
+        
+        // Grid lines and ticks of the y axes
+        const ticks = 5;
+        spec.axes.forEach((axis, i) => {
+            const scale = scales[axis.id];
+            ctx.textAlign = i === 0 ? 'right' : 'left';
+            ctx.textBaseline = 'middle';
+            for (let k = 0; k <= ticks; k++) {
+                const v = scale.min + (scale.max - scale.min) * k / ticks;
+                const y = yAt(scale, v);
+                if (i === 0) {
+                    ctx.beginPath();
+                    ctx.moveTo(margin.left, y);
+                    ctx.lineTo(margin.left + plotWidth, y);
+                    ctx.stroke();
+                }
+                ctx.fillText(scale.format(v), i === 0 ? margin.left - 6 : margin.left + plotWidth + 6, y);
+            }
+            
+            ctx.save();
+            ctx.textAlign = 'center';
+            ctx.translate(i === 0 ? 12 : width - 10, margin.top + plotHeight / 2);
+            ctx.rotate(i === 0 ? -Math.PI / 2 : Math.PI / 2);
+            ctx.fillText(axis.label, 0, 0);
+            ctx.restore();
+        });
+        
+        // Date labels along the x axis
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'top';
+        const labels = Math.min(6, times.length);
+        for (let k = 0; k < labels; k++) {
+            const i = labels > 1 ? Math.round(k * (times.length - 1) / (labels - 1)) : 0;
+            ctx.fillText(spec.x[i], xAt(times[i]), margin.top + plotHeight + 8);
+        }
+        ctx.fillText('Date', margin.left + plotWidth / 2, height - 16);
+        
+        // Series
+        spec.series.forEach(series => {
+            const scale = scales[series.axis];
+            ctx.strokeStyle = series.color;
+            ctx.fillStyle = series.color;
+            if (spec.kind === 'bar') {
+                const barWidth = Math.max(1, plotWidth / times.length * 0.8);
+                const base = yAt(scale, Math.max(scale.min, 0));
+                series.y.forEach((v, i) => {
+                    const y = yAt(scale, v);
+                    ctx.fillRect(xAt(times[i]) - barWidth / 2, Math.min(y, base), barWidth, Math.abs(base - y));
+                });
+            } else {
+                ctx.lineWidth = 1.5;
+                ctx.beginPath();
+                series.y.forEach((v, i) => {
+                    const x = xAt(times[i]);
+                    const y = yAt(scale, v);
+                    if (i === 0) ctx.moveTo(x, y); else ctx.lineTo(x, y);
+                });
+                ctx.stroke();
+            }
+        });
+        
+        // Title and legend
+        ctx.fillStyle = textColor;
+        ctx.font = 'bold 13px sans-serif';
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'top';
+        ctx.fillText(spec.title, width / 2, 8);
+        if (spec.series.length > 1) {
+            ctx.font = '11px sans-serif';
+            ctx.textAlign = 'left';
+            ctx.textBaseline = 'middle';
+            let x = margin.left + 8;
+            spec.series.forEach(series => {
+                ctx.fillStyle = series.color;
+                ctx.fillRect(x, margin.top + 8, 12, 3);
+                ctx.fillStyle = textColor;
+                ctx.fillText(series.name, x + 16, margin.top + 9);
+                x += 24 + ctx.measureText(series.name).width;
+            });
+        }
+    }
+    
     // Create message element
     function createMessageElement(text, sender, graph = null) {
         const messageElement = document.createElement('div');
@@ -124,6 +395,7 @@ document.addEventListener('DOMContentLoaded', function() {
         let messageHTML = `
             <div class="message-content">
                 <div class="message-text">${formatText(text)}</div>
+                <div class="message-status"></div>
             `;
         
         if (graph) {
@@ -189,14 +461,23 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
-    // Dashboard functionality
-    fetchDashboardData();
+    // Dashboard functionality: the most recent week loads first, longer ranges on demand
+    const rangeButtons = document.querySelectorAll('.range-button');
+    fetchDashboardData('-7d');
+    
+    rangeButtons.forEach(button => {
+        button.addEventListener('click', () => {
+            rangeButtons.forEach(b => b.classList.toggle('active', b === button));
+            fetchDashboardData(button.getAttribute('data-range'));
+        });
+    });
     
-    function fetchDashboardData() {
-        // Fetch the summary data from the API
+    function fetchDashboardData(range) {
+        // Fetch the summary data for the selected range (all data when empty)
+        const query = range ? `?start=${encodeURIComponent(range)}` : '';
         Promise.all([
-            fetch('/api/summary').then(res => res.json()),
-            fetch('/api/efficiency').then(res => res.json())
+            fetch(`/api/summary${query}`).then(res => res.json()),
+            fetch(`/api/efficiency${query}`).then(res => res.json())
         ])
         .then(([summaryData, efficiencyData]) => {
             // Hide loading and show content
@@ -217,6 +498,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     function createDashboardCards(summaryData, efficiencyData) {
         const dashboardGrid = document.querySelector('.dashboard-grid');
+        dashboardGrid.innerHTML = '';
         
         // Calculate average cost per workload from efficiency data
         const avgCostPerWorkload = efficiencyData.length 
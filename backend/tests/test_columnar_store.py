@@ -0,0 +1,32 @@
+import pandas as pd
+
+from columnar_store import read_columns, write_columns
+from data_handler import QPUDataHandler
+
+def test_save_over_mapped_tables_round_trips(tmp_path):
+    path = str(tmp_path / "qpc_data.cols")
+    QPUDataHandler(path).load_data()
+
+    handler = QPUDataHandler(path)
+    data = handler.load_data()
+    blocks = data["QPU_blocks"].copy()
+    assert blocks["workloads_executed"].sum() > 0
+
+    # The loaded tables are memory maps of the files being rewritten
+    assert handler.save_data()
+    pd.testing.assert_frame_equal(data["QPU_blocks"].copy(), blocks)
+
+    reloaded = QPUDataHandler(path).load_data()
+    pd.testing.assert_frame_equal(reloaded["QPU_blocks"].copy(), blocks)
+    assert {k: v for k, v in reloaded.items() if not isinstance(v, pd.DataFrame)} == \
+        {k: v for k, v in data.items() if not isinstance(v, pd.DataFrame)}
+
+def test_write_columns_over_its_own_mapping(tmp_path):
+    path = str(tmp_path / "frame.cols")
+    frame = pd.DataFrame({"a": [1150, 1400, 1300], "b": [0.5, 1.5, 2.5]})
+    write_columns(frame, path)
+
+    mapped = read_columns(path)
+    write_columns(mapped, path)
+    pd.testing.assert_frame_equal(mapped.copy(), frame)
+    pd.testing.assert_frame_equal(read_columns(path).copy(), frame)
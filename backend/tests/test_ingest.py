@@ -0,0 +1,93 @@
+import shutil
+import threading
+
+import pandas as pd
+import pytest
+
+from data_handler import append_daily_rows
+from dataset_store import DATASETS, DatasetSpec, dataset_store
+
+ROW = {
+    "date": "2023-07-01",
+    "new_blocks_atom": 10,
+    "new_blocks_photon": 20,
+    "new_blocks_spin": 30,
+    "daily_workloads": 1000,
+    "workloads_new_blocks": 400,
+    "acquisition_cost": 1.0,
+    "lease_fee_cost": 2.0,
+    "workload_trigger_cost": 3.0,
+    "workload_execution_cost": 4.0,
+}
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "hybrid.csv"
+    shutil.copy(DATASETS["hybrid"].path, path)
+    dataset_store.register("ingest_test", DatasetSpec(str(path), date_format="%Y-%m-%d"))
+    yield "ingest_test", path
+    dataset_store.unregister("ingest_test")
+
+def test_concurrent_ingests_of_the_same_day_append_once(dataset):
+    name, path = dataset
+    before = pd.read_csv(path)
+    results, errors = [], []
+    barrier = threading.Barrier(4)
+
+    def ingest():
+        barrier.wait()
+        try:
+            results.append(append_daily_rows([dict(ROW)], name))
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ingest) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 1
+    assert len(errors) == 3
+    after = pd.read_csv(path)
+    assert len(after) == len(before) + 1
+    assert after["day_index"].iloc[-1] == before["day_index"].iloc[-1] + 1
+    assert after["cumulative_blocks"].iloc[-1] == before["cumulative_blocks"].iloc[-1] + 60
+
+def test_concurrent_ingests_of_consecutive_days_chain_counters(dataset):
+    name, path = dataset
+    before = pd.read_csv(path)
+    days = ["2023-07-01", "2023-07-02", "2023-07-03", "2023-07-04"]
+    barrier = threading.Barrier(len(days))
+    errors = []
+
+    def ingest(day):
+        barrier.wait()
+        try:
+            append_daily_rows([{**ROW, "date": day}], name)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ingest, args=(day,)) for day in days]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Days that arrive after a later one are rejected; the accepted ones form a valid chain
+    after = pd.read_csv(path)
+    added = after.iloc[len(before):]
+    assert len(added) + len(errors) == len(days)
+    assert list(added["day_index"]) == list(range(before["day_index"].iloc[-1] + 1, before["day_index"].iloc[-1] + 1 + len(added)))
+    assert added["date"].is_monotonic_increasing
+    assert list(added["cumulative_blocks"].diff().dropna()) == [60] * (len(added) - 1)
+
+def test_unregister_drops_the_spec_and_cached_frame(tmp_path):
+    path = tmp_path / "hybrid.csv"
+    shutil.copy(DATASETS["hybrid"].path, path)
+    dataset_store.register("unregister_test", DatasetSpec(str(path), date_format="%Y-%m-%d"))
+    dataset_store.get("unregister_test")
+
+    dataset_store.unregister("unregister_test")
+    assert "unregister_test" not in dataset_store._specs
+    assert "unregister_test" not in dataset_store._cache
@@ -0,0 +1,53 @@
+import pytest
+
+from intent_router import intent_router
+
+@pytest.mark.parametrize("message, tool, tool_input", [
+    ("What are the top 5 most active days?", "QPU_Block_Activity", "5"),
+    ("Give me a summary of the QPU usage", "QPU_Summary", None),
+    ("Show me a graph of the daily costs", "Cost_Trend_Graph", None),
+    ("Plot the workloads trend", "Workloads_Graph", None),
+    ("What is the best batch window up to 20 days?", "Best_Batch_Window", "20"),
+    ("What if we batch workloads every 7 days", "Batch_Scheduling", "7"),
+    ("Run 2000 scenarios of the savings", "Cost_Scenarios", "2000"),
+    ("What if we negotiate a 10% reduction", "Negotiate_Costs", "10"),
+])
+def test_clear_questions_are_routed(message, tool, tool_input):
+    route = intent_router.route(message)
+    assert route is not None
+    assert (route.tool, route.tool_input) == (tool, tool_input)
+
+@pytest.mark.parametrize("message", [
+    "top 3 days in june",
+    "give me stats for the last week",
+    "summary of costs for February",
+    "show the cost graph for the last 30 days",
+    "Do not show me a graph of the costs",
+    "don't plot the workloads",
+    "what if we batch 2023 workloads",
+    "summary since 2023-03-01",
+    "top 10 days between march and april",
+    "workloads graph for the past 2 months",
+    "cost graph in may",
+])
+def test_qualified_questions_go_to_the_agent(message):
+    assert intent_router.route(message) is None
+
+@pytest.mark.parametrize("message", [
+    # Activity ranks days by workload count, not by cost or efficiency
+    "What are the top 3 days by cost?",
+    "highest cost per workload day",
+    "top cost driver for workloads",
+    "busiest days by spend",
+    # The summary tool describes the data, not the conversation
+    "Summarize the conversation so far",
+    "give me a summary of our chat",
+    "summarize this",
+    # "batch" without anything to schedule
+    "batch of questions: what is qpu?",
+    # A partial shift is not the atom-only analysis, and the classifier would drop the number
+    "What would 5% more atom blocks save?",
+    "how much would we save with more atom blocks",
+])
+def test_misleading_matches_go_to_the_agent(message):
+    assert intent_router.route(message) is None
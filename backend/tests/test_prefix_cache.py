@@ -0,0 +1,52 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from inference_scheduler import PrefixCache
+
+PREAMBLE = "You are an assistant with these tools: QPU_Summary, Cost_Analysis. "
+HISTORY = PREAMBLE + "Human: how many blocks?\nAI: 14 blocks.\n"
+
+class CharTokenizer:
+    def encode(self, text, add_special_tokens=True):
+        return [ord(c) % 100 for c in text]
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(n_layer=2, n_head=2, n_embd=32, vocab_size=100)
+    return transformers.GPT2LMHeadModel(config).eval()
+
+def _full_prefill(model, ids):
+    past = model(input_ids=torch.tensor([ids]), use_cache=True).past_key_values
+    return past.to_legacy_cache() if hasattr(past, "to_legacy_cache") else past
+
+def test_history_prefix_extends_the_cached_preamble(model):
+    cache = PrefixCache(model, CharTokenizer(), max_bytes=10**9)
+    cache.add(PREAMBLE)
+    cache.add(HISTORY)
+
+    # Only the history after the preamble is prefilled a second time
+    assert cache.stats()["tokens_prefilled"] == len(HISTORY)
+    ids, past, _ = cache._entries[HISTORY]
+    for layer, expected in zip(past, _full_prefill(model, ids)):
+        for tensor, reference in zip(layer, expected):
+            assert torch.allclose(tensor, reference, atol=1e-5)
+
+    assert cache.tokenize(HISTORY + "Question: cost?")[1] == HISTORY
+
+def test_cache_is_bounded_by_bytes(model):
+    probe = PrefixCache(model, CharTokenizer(), max_bytes=10**9)
+    probe.add(PREAMBLE)
+    per_token = probe.stats()["bytes"] // len(PREAMBLE)
+
+    cache = PrefixCache(model, CharTokenizer(), max_bytes=per_token * (len(HISTORY) + 10))
+    cache.add(PREAMBLE)
+    cache.add(HISTORY)
+    assert list(cache._entries) == [HISTORY]
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+    # A prefix larger than the whole cache is not kept
+    cache.add("x" * (len(HISTORY) + 20))
+    assert list(cache._entries) == [HISTORY]
@@ -0,0 +1,28 @@
+import os
+
+from render_cache import RenderCache
+
+def _png(i, size=1000):
+    return bytes([i % 256]) * size
+
+def test_file_paths_share_the_spill_directory_bound(tmp_path):
+    cache = RenderCache(max_bytes=10**9, spill_dir=str(tmp_path), max_disk_bytes=3500)
+    paths = []
+    for i in range(10):
+        entry = cache.store(f"key{i}", "costs", _png(i))
+        path = cache.file_path(entry)
+        with open(path, "rb") as f:
+            assert f.read() == entry.data
+        paths.append(path)
+
+    pngs = [name for name in os.listdir(tmp_path) if name.endswith(".png")]
+    assert sum(os.path.getsize(tmp_path / name) for name in pngs) <= 3500
+    # The most recently requested files are the ones kept
+    assert all(os.path.exists(path) for path in paths[-3:])
+    assert not os.path.exists(paths[0])
+
+def test_file_path_is_stable_for_an_entry(tmp_path):
+    cache = RenderCache(spill_dir=str(tmp_path))
+    entry = cache.store("key", "workloads", _png(1))
+    assert cache.file_path(entry) == cache.file_path(entry)
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".png")]) == 1
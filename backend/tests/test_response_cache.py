@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from response_cache import ResponseCache, query_numbers
+
+def _same_vector(text):
+    # Every question looks identical to the embedder, so only the number check tells them apart
+    return np.ones(4, dtype=np.float32) / 2
+
+@pytest.fixture
+def cache():
+    return ResponseCache(embedder=_same_vector, similarity=0.92)
+
+def test_semantic_hit_requires_the_same_numbers(cache):
+    cache.put("Batch workloads over 3 days", [], "three day plan")
+    assert cache.get("batch workloads across 3 days", []) == "three day plan"
+    assert cache.get("Batch workloads over 5 days", []) is None
+    assert cache.get("Batch workloads over days", []) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_exact_hit_ignores_the_embedder(cache):
+    cache.put("What is the cost on 2024-03-05?", [], "answer")
+    assert cache.get("what is the cost on 2024-03-05", []) == "answer"
+    assert cache.stats()["hits"] == 1
+
+@pytest.mark.parametrize("query, numbers", [
+    ("batch 3 days", ("3",)),
+    ("top 10 blocks over 2.5 days", ("10", "2.5")),
+    ("what is qpu", ()),
+])
+def test_query_numbers(query, numbers):
+    assert query_numbers(query) == numbers
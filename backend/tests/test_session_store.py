@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from session_store import SessionStore, SQLiteBackend
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+@pytest.fixture
+def stores(db_path):
+    # Two workers sharing one database
+    return SessionStore(SQLiteBackend(db_path)), SessionStore(SQLiteBackend(db_path))
+
+def _users(memory):
+    return [turn["user"] for turn in memory.recent_history(100)]
+
+def test_append_from_a_stale_worker_keeps_every_turn(stores, db_path):
+    a, b = stores
+    session_id = a.create()
+    a.append(session_id, "q1", "a1")
+    assert _users(b.get(session_id)) == ["q1"]
+
+    # B still caches the one-turn memory when A appends
+    a.append(session_id, "q2", "a2")
+    b.append(session_id, "q3", "a3")
+
+    for store in (a, b, SessionStore(SQLiteBackend(db_path))):
+        memory = store.get(session_id)
+        assert _users(memory) == ["q1", "q2", "q3"]
+        assert memory.total_turns == 3
+
+def test_concurrent_appends_from_two_workers(stores, db_path):
+    a, b = stores
+    session_id = a.create()
+    b.get(session_id)
+
+    def append(store, prefix):
+        for i in range(10):
+            store.append(session_id, f"{prefix}{i}", "answer")
+
+    threads = [threading.Thread(target=append, args=(a, "a")), threading.Thread(target=append, args=(b, "b"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    memory = SessionStore(SQLiteBackend(db_path)).get(session_id)
+    assert memory.total_turns == 20
+    assert a.get(session_id).total_turns == b.get(session_id).total_turns == 20
+
+def test_deleted_session_is_not_served_from_another_workers_cache(stores):
+    a, b = stores
+    session_id = a.create()
+    b.get(session_id)
+    a.delete(session_id)
+    assert b.get(session_id) is None
@@ -0,0 +1,32 @@
+import pytest
+
+from tool_results import TOOLS, parse_ratio, run_tool, tool_kwargs
+
+@pytest.mark.parametrize("tool_input, ratio", [
+    ("0.8", 0.8),
+    ("80%", 0.8),
+    ("80 %", 0.8),
+    ("80", 0.8),
+    ("1.5", 1.5),
+    ("1.5%", 0.015),
+    ("1", 1.0),
+    (None, None),
+    ("more atom blocks", None),
+])
+def test_parse_ratio(tool_input, ratio):
+    assert parse_ratio(tool_input) == ratio
+
+def test_percentages_and_ratios_share_a_cache_key():
+    spec = TOOLS["Optimize_Block_Mix"]
+    assert tool_kwargs(spec, "80%") == tool_kwargs(spec, "0.8") == {"target_atom_ratio": 0.8}
+
+@pytest.mark.parametrize("tool_input", ["1.5", "150%", "0.05", "5%"])
+def test_block_mix_rejects_targets_outside_current_and_one(tool_input):
+    result = run_tool("Optimize_Block_Mix", tool_input)
+    assert "not valid" in result.summary
+    assert "cost_saving" not in result.values
+
+def test_block_mix_accepts_a_higher_target():
+    result = run_tool("Optimize_Block_Mix", "90%")
+    assert result.values["target_atom_ratio"] == pytest.approx(0.9)
+    assert result.values["cost_saving"] > 0
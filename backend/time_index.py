@@ -0,0 +1,136 @@
+"""
+Date-range selection, rollups and cursor pagination over the daily datasets
+"""
+import re
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import dataset_store, DEFAULT_DATASET
+
+RESOLUTIONS = ("day", "week", "month")
+
+# Period used to bucket each coarser resolution; weeks start on Monday
+_PERIODS = {"week": "W-SUN", "month": "M"}
+
+# Flow columns add up within a bucket
+SUM_COLUMNS = [
+    "new_blocks_total", "new_blocks_atom", "new_blocks_photon", "new_blocks_spin",
+    "daily_workloads", "workloads_new_blocks", "workloads_older_blocks",
+    "acquisition_cost", "lease_fee_cost", "workload_trigger_cost",
+    "workload_execution_cost", "total_daily_cost",
+]
+
+# Running totals take the value at the end of the bucket
+LAST_COLUMNS = [
+    "day_index", "cumulative_blocks", "cumulative_workloads",
+    "cumulative_workloads_new", "cumulative_workloads_old",
+]
+
+_RELATIVE_START = re.compile(r"^-(\d+)([dwm])$")
+
+def build_rollup(df: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """
+    Aggregate daily rows into week or month buckets labelled by their first day
+    """
+    buckets = df["date"].dt.to_period(_PERIODS[resolution]).dt.start_time
+    grouped = df.groupby(buckets.rename("date"), sort=True)
+
+    rollup = grouped[[c for c in SUM_COLUMNS if c in df.columns]].sum()
+    last = grouped[[c for c in LAST_COLUMNS if c in df.columns]].last()
+    rollup = rollup.join(last).reset_index()
+
+    # Ratios are recomputed from the summed components rather than averaged
+    workloads = rollup["daily_workloads"].to_numpy(dtype=float)
+    if "total_daily_cost" in rollup.columns:
+        rollup["cost_per_workload"] = np.divide(
+            rollup["total_daily_cost"].to_numpy(dtype=float), workloads,
+            out=np.zeros_like(workloads), where=workloads > 0,
+        )
+    if "workloads_new_blocks" in rollup.columns:
+        rollup["perc_new_workloads"] = np.divide(
+            rollup["workloads_new_blocks"].to_numpy(dtype=float), workloads,
+            out=np.zeros_like(workloads), where=workloads > 0,
+        )
+        rollup["perc_old_workloads"] = 1 - rollup["perc_new_workloads"]
+    return rollup
+
+def get_frame(resolution: str = "day", dataset: str = DEFAULT_DATASET) -> pd.DataFrame:
+    """
+    Return the date-sorted frame for a resolution; rollups are computed once per dataset version
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Invalid resolution {resolution}, expected one of {', '.join(RESOLUTIONS)}")
+    if resolution == "day":
+        return dataset_store.get(dataset)
+    return dataset_store.derive(dataset, f"rollup:{resolution}", lambda df: build_rollup(df, resolution))
+
+def _dates(resolution: str, dataset: str) -> np.ndarray:
+    return dataset_store.derive(
+        dataset,
+        f"dates:{resolution}",
+        lambda _: get_frame(resolution, dataset)["date"].to_numpy(),
+    )
+
+def parse_date(value: Optional[str], latest: Optional[pd.Timestamp] = None) -> Optional[pd.Timestamp]:
+    """
+    Parse an ISO date, or a relative start such as -7d, -4w or -3m counted back from `latest`
+    """
+    if not value:
+        return None
+    match = _RELATIVE_START.match(value.strip())
+    if match and latest is not None:
+        amount, unit = int(match.group(1)), match.group(2)
+        if unit == "m":
+            return latest - pd.DateOffset(months=amount) + pd.Timedelta(days=1)
+        days = amount * (7 if unit == "w" else 1)
+        return latest - pd.Timedelta(days=days - 1)
+    try:
+        return pd.Timestamp(value)
+    except ValueError:
+        raise ValueError(f"Invalid date {value}, expected YYYY-MM-DD or a relative value like -7d")
+
+def select(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    resolution: str = "day",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    dataset: str = DEFAULT_DATASET,
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Select rows between `start` and `end` (inclusive) at the given resolution.
+
+    Bounds are found by binary search over the sorted date column. `cursor` is the
+    value returned as next_cursor by the previous page, and is None on the last page.
+    """
+    frame = get_frame(resolution, dataset)
+    dates = _dates(resolution, dataset)
+    if len(dates) == 0:
+        return frame, None
+
+    latest = pd.Timestamp(dates[-1])
+    start_ts = parse_date(start, latest)
+    end_ts = parse_date(end, latest)
+
+    lo, hi = 0, len(dates)
+    if start_ts is not None:
+        # Keep the bucket that contains the start date
+        if resolution != "day":
+            start_ts = start_ts.to_period(_PERIODS[resolution]).start_time
+        lo = int(np.searchsorted(dates, start_ts.to_datetime64(), side="left"))
+    if end_ts is not None:
+        hi = int(np.searchsorted(dates, end_ts.to_datetime64(), side="right"))
+    if cursor:
+        lo = max(lo, int(np.searchsorted(dates, parse_date(cursor).to_datetime64(), side="left")))
+
+    next_cursor = None
+    if limit is not None:
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        if lo + limit < hi:
+            next_cursor = pd.Timestamp(dates[lo + limit]).strftime("%Y-%m-%d")
+            hi = lo + limit
+
+    return frame.iloc[lo:max(lo, hi)], next_cursor
@@ -0,0 +1,310 @@
+"""
+Structured results for the agent tools, shared by the agent prompt and the REST API
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from data_processor import (
+    get_top_active_days_frame,
+    get_cost_impact,
+    get_qpu_summary,
+    get_block_efficiency_frame,
+    get_daily_workloads_frame
+)
+from optimisation_strategies import block_mix_savings, batch_savings_curve, negotiation_savings
+from scenarios import run_cost_scenarios, format_cost_scenarios
+from dataset_store import dataset_store, DEFAULT_DATASET
+from render_cache import render_cache
+from render_jobs import render_jobs
+
+# Approximate number of prompt tokens a rendered tool result may use
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "200"))
+# Rough characters-per-token ratio used to estimate prompt size without a tokenizer
+CHARS_PER_TOKEN = 4
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_NUMBER_OR_PERCENT = re.compile(r"(-?\d+(?:\.\d+)?)\s*(%)?")
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _compact(value: Any) -> str:
+    if isinstance(value, float):
+        if abs(value) >= 1000:
+            return f"{value:,.0f}"
+        return f"{value:.4g}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    return str(value)
+
+@dataclass
+class ToolResult:
+    """
+    Outcome of a tool call: a one-line summary, the raw values and optional table rows.
+
+    The LLM sees render(), which keeps to a token budget; the REST API and caches
+    use the raw values through to_dict().
+    """
+    tool: str
+    summary: str
+    values: Dict[str, Any] = field(default_factory=dict)
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+
+    def render(self, max_tokens: int = TOOL_RESULT_TOKEN_BUDGET) -> str:
+        """
+        Render for the prompt. Tables are cut to their first and last rows to fit the budget.
+        """
+        budget = max_tokens * CHARS_PER_TOKEN
+        text = self.summary if len(self.summary) <= budget else self.summary[:budget - 3] + "..."
+        if not self.rows:
+            return text
+
+        columns = list(self.rows[0].keys())
+        lines = [" | ".join(columns)]
+        lines += [" | ".join(_compact(row.get(c)) for c in columns) for row in self.rows]
+        header, body = lines[0], lines[1:]
+
+        remaining = budget - len(text) - len(header) - 2
+        if sum(len(line) + 1 for line in body) <= remaining:
+            return "\n".join([text, header] + body)
+
+        # Keep alternating rows from the head and the tail until the budget runs out
+        marker = f"... ({len(body)} rows in total)"
+        remaining -= len(marker) + 1
+        head: List[str] = []
+        tail: List[str] = []
+        i, j = 0, len(body) - 1
+        while i <= j:
+            line = body[i] if len(head) <= len(tail) else body[j]
+            if len(line) + 1 > remaining:
+                break
+            remaining -= len(line) + 1
+            if len(head) <= len(tail):
+                head.append(line)
+                i += 1
+            else:
+                tail.insert(0, line)
+                j -= 1
+        return "\n".join([text, header] + head + [marker] + tail)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"tool": self.tool, "summary": self.summary, "values": self.values, "rows": self.rows}
+
+    def __str__(self) -> str:
+        return self.render()
+
+@dataclass
+class ToolSpec:
+    """An agent tool: its builder and the optional numeric parameter parsed from the action input"""
+    name: str
+    description: str
+    build: Callable[..., ToolResult]
+    param: Optional[Tuple[str, float]] = None
+    integer: bool = False
+    # The parameter is a fraction of 1, which the input may give as a percentage
+    ratio: bool = False
+    cacheable: bool = True
+
+def parse_number(tool_input: Optional[str]) -> Optional[float]:
+    """
+    First number in a free-text action input, e.g. "7", "window=7 days" or "80%"
+    """
+    if tool_input is None:
+        return None
+    match = _NUMBER.search(str(tool_input))
+    return float(match.group()) if match else None
+
+def parse_ratio(tool_input: Optional[str]) -> Optional[float]:
+    """
+    First number in an action input as a fraction of 1: "80%" and "80" are
+    percentages, "0.8" and "1.5" are ratios (values from 2 up, or followed by
+    "%", are read as percentages)
+    """
+    if tool_input is None:
+        return None
+    match = _NUMBER_OR_PERCENT.search(str(tool_input))
+    if match is None:
+        return None
+    value = float(match.group(1))
+    return value / 100 if match.group(2) or value >= 2 else value
+
+TOOLS: Dict[str, ToolSpec] = {}
+
+def _tool(name: str, description: str, param: Optional[Tuple[str, float]] = None,
+          integer: bool = False, ratio: bool = False, cacheable: bool = True):
+    def register(build):
+        TOOLS[name] = ToolSpec(name, description, build, param, integer, ratio, cacheable)
+        return build
+    return register
+
+def tool_kwargs(spec: ToolSpec, tool_input: Optional[str]) -> Dict[str, Any]:
+    if spec.param is None:
+        return {}
+    name, default = spec.param
+    value = parse_ratio(tool_input) if spec.ratio else parse_number(tool_input)
+    if value is None:
+        value = default
+    return {name: int(value) if spec.integer else float(value)}
+
+def run_tool(name: str, tool_input: Optional[str] = None) -> ToolResult:
+    """
+    Run a tool by name. Results of cacheable tools are kept for the current dataset version.
+    """
+    if name not in TOOLS:
+        raise ValueError(f"Tool {name} not found")
+    spec = TOOLS[name]
+    kwargs = tool_kwargs(spec, tool_input)
+    if not spec.cacheable:
+        return spec.build(**kwargs)
+    key = f"tool:{name}:{sorted(kwargs.items())}"
+    return dataset_store.derive(DEFAULT_DATASET, key, lambda _: spec.build(**kwargs))
+
+def render_tool(name: str, tool_input: Optional[str] = None) -> str:
+    """
+    Run a tool and render it for the agent prompt
+    """
+    return run_tool(name, tool_input).render()
+
+@_tool("QPU_Block_Activity", "Useful for finding the most active QPU blocks by number of workloads executed",
+       param=("n", 10), integer=True)
+def _block_activity(n: int) -> ToolResult:
+    top = get_top_active_days_frame(min(max(n, 1), 100))
+    return ToolResult(
+        "QPU_Block_Activity",
+        f"Top {len(top)} days by workloads executed:",
+        values={"max_workloads": int(top["workloads"].max()) if len(top) else 0},
+        rows=top.to_dict("records"),
+    )
+
+@_tool("Cost_Analysis", "Useful for analyzing cost impact of using only Atom blocks")
+def _cost_analysis() -> ToolResult:
+    impact = get_cost_impact()
+    difference, percentage = impact["cost_difference"], impact["percentage"]
+    if difference > 0:
+        summary = f"Using only Atom blocks would save approximately ${difference:,.2f} ({percentage:.1f}% of current costs)."
+    else:
+        summary = f"Using only Atom blocks would increase costs by approximately ${-difference:,.2f} ({-percentage:.1f}% more)."
+    return ToolResult("Cost_Analysis", summary, values=impact)
+
+def _graph(name: str, graph_type: str):
+    def build() -> ToolResult:
+        path = render_cache.file_path(render_jobs.submit(graph_type).result())
+        return ToolResult(name, f"Graph saved to {path}", values={"graph_type": graph_type, "path": path})
+    return build
+
+_tool("Cost_Trend_Graph", "Useful for generating a graph showing the trend of daily costs",
+      cacheable=False)(_graph("Cost_Trend_Graph", "costs"))
+
+@_tool("Optimize_Block_Mix", "Estimates cost savings by increasing the ratio of Atom blocks to a target value",
+       param=("target_atom_ratio", 0.8), ratio=True)
+def _block_mix(target_atom_ratio: float) -> ToolResult:
+    result = block_mix_savings(target_atom_ratio)
+    current = result["current_atom_ratio"]
+    if not current < target_atom_ratio <= 1:
+        return ToolResult(
+            "Optimize_Block_Mix",
+            f"A target Atom block ratio of {target_atom_ratio*100:.1f}% is not valid: it must be above "
+            f"the current {current*100:.1f}% and at most 100%.",
+            values={"target_atom_ratio": target_atom_ratio, "current_atom_ratio": current},
+        )
+    return ToolResult(
+        "Optimize_Block_Mix",
+        f"Raising the Atom block ratio from {result['current_atom_ratio']*100:.1f}% to {target_atom_ratio*100:.1f}% "
+        f"saves approximately ${result['cost_saving']:,.2f} ({result['improvement_factor']*100:.1f}% lower cost per workload).",
+        values=result,
+    )
+
+@_tool("Batch_Scheduling", "Simulates cost savings by batching daily workloads into multi-day windows",
+       param=("batch_window", 3), integer=True)
+def _batch_scheduling(batch_window: int) -> ToolResult:
+    row = batch_savings_curve(windows=[max(batch_window, 1)]).iloc[0]
+    values = {key: float(value) for key, value in row.items()}
+    values["batch_window"] = int(row["batch_window"])
+    return ToolResult(
+        "Batch_Scheduling",
+        f"Batch scheduling every {values['batch_window']} days saves approximately "
+        f"${values['cost_saving']:,.2f} ({values['percentage']:.1f}% of total costs).",
+        values=values,
+    )
+
+@_tool("Best_Batch_Window", "Finds the batch scheduling window (in days, up to the given maximum) with the largest cost savings",
+       param=("max_window", 30), integer=True)
+def _best_batch_window(max_window: int) -> ToolResult:
+    curve = batch_savings_curve(max_window=max(max_window, 1))
+    best = curve.loc[curve["cost_saving"].idxmax()]
+    return ToolResult(
+        "Best_Batch_Window",
+        f"Among windows of 1 to {len(curve)} days, batching every {int(best['batch_window'])} days saves the most: "
+        f"approximately ${best['cost_saving']:,.2f} ({best['percentage']:.1f}%).",
+        values={"batch_window": int(best["batch_window"]), "cost_saving": float(best["cost_saving"]),
+                "percentage": float(best["percentage"])},
+        rows=curve[["batch_window", "cost_saving", "percentage"]].to_dict("records"),
+    )
+
+@_tool("Cost_Scenarios", "Runs a Monte Carlo simulation of the cost-saving strategies and reports P10/P50/P90 savings",
+       param=("n_draws", 5000), integer=True)
+def _cost_scenarios(n_draws: int) -> ToolResult:
+    # A fixed seed keeps answers reproducible and the result cacheable
+    result = run_cost_scenarios(n_draws=min(max(n_draws, 1), 50000), seed=0)
+    return ToolResult("Cost_Scenarios", format_cost_scenarios(result), values=result)
+
+@_tool("Negotiate_Costs", "Estimates cost savings by negotiating a reduction in fixed cost components",
+       param=("reduction_percent", 10))
+def _negotiate_costs(reduction_percent: float) -> ToolResult:
+    result = negotiation_savings(reduction_percent)
+    return ToolResult(
+        "Negotiate_Costs",
+        f"Negotiating a {reduction_percent:g}% reduction in fixed costs saves approximately "
+        f"${result['cost_saving']:,.2f} ({result['percentage']:.1f}% of total costs).",
+        values=result,
+    )
+
+@_tool("QPU_Summary", "Returns summary statistics about QPU blocks and workloads (total blocks, avg workloads per block, etc.)")
+def _qpu_summary() -> ToolResult:
+    summary = get_qpu_summary()
+    return ToolResult("QPU_Summary", "; ".join(f"{k}: {_compact(v)}" for k, v in summary.items()), values=summary)
+
+@_tool("Block_Efficiency", "Returns efficiency metrics for different block types including cost per workload")
+def _block_efficiency() -> ToolResult:
+    frame = get_block_efficiency_frame()
+    values = {
+        "days": len(frame),
+        "mean_atom_block_ratio": float(frame["atom_block_ratio"].mean()),
+        "mean_cost_per_workload": float(frame["cost_per_workload"].mean()),
+        "min_cost_per_workload": float(frame["cost_per_workload"].min()),
+        "max_cost_per_workload": float(frame["cost_per_workload"].max()),
+    }
+    return ToolResult(
+        "Block_Efficiency",
+        f"Over {values['days']} days: mean Atom block ratio {values['mean_atom_block_ratio']:.2f}, "
+        f"cost per workload ${values['mean_cost_per_workload']:,.2f} on average "
+        f"(${values['min_cost_per_workload']:,.2f} to ${values['max_cost_per_workload']:,.2f}).",
+        values=values,
+        rows=frame[["date", "atom_block_ratio", "cost_per_workload"]].to_dict("records"),
+    )
+
+@_tool("Daily_Workloads", "Returns daily workload data for visualization purposes")
+def _daily_workloads() -> ToolResult:
+    frame = get_daily_workloads_frame()
+    busiest = frame.loc[frame["workloads"].idxmax()] if len(frame) else None
+    values = {
+        "days": len(frame),
+        "total_workloads": int(frame["workloads"].sum()),
+        "mean_daily_workloads": float(frame["workloads"].mean()) if len(frame) else 0.0,
+        "busiest_day": busiest["date"] if busiest is not None else None,
+        "busiest_day_workloads": int(busiest["workloads"]) if busiest is not None else 0,
+    }
+    return ToolResult(
+        "Daily_Workloads",
+        f"{values['total_workloads']:,} workloads over {values['days']} days "
+        f"({values['mean_daily_workloads']:,.0f} per day; busiest {values['busiest_day']} with {values['busiest_day_workloads']:,}).",
+        values=values,
+        rows=frame.to_dict("records"),
+    )
+
+_tool("Workloads_Graph", "Generates a graph showing daily workloads over time",
+      cacheable=False)(_graph("Workloads_Graph", "workloads"))
+_tool("Efficiency_Graph", "Generates a graph showing block efficiency metrics over time",
+      cacheable=False)(_graph("Efficiency_Graph", "efficiency"))
@@ -1,11 +1,23 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 import os
+import io
 from data_processor import get_daily_costs, get_daily_workloads, get_block_efficiency
 import tempfile
 import seaborn as sns
 
-def generate_trend_graph():
+GRAPH_DIR = os.path.join(tempfile.gettempdir(), "qpu_graphs")
+
+def _figure_bytes(dpi):
+    """
+    Render the current figure to PNG bytes and close it
+    """
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close()
+    return buffer.getvalue()
+
+def render_trend_graph(dpi=300):
     # Get the daily costs data
     daily_costs = get_daily_costs()  # should return columns: 'date', 'total_daily_cost'
     
@@ -37,17 +49,11 @@ def generate_trend_graph():
     # Tight layout
     plt.tight_layout()
     
-    # Save the graph to a temporary location
-    temp_dir = tempfile.gettempdir()
-    graph_path = os.path.join(temp_dir, 'daily_costs_trend.png')
-    plt.savefig(graph_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    return graph_path
+    return _figure_bytes(dpi)
 
-def generate_workloads_graph():
+def render_workloads_graph(dpi=300):
     """
-    Generate a graph showing daily workloads over time
+    Render a graph showing daily workloads over time as PNG bytes
     """
     # Get daily workloads data
     workloads_data = get_daily_workloads()
@@ -80,17 +86,11 @@ def generate_workloads_graph():
     # Tight layout
     plt.tight_layout()
     
-    # Save the graph to a temporary location
-    temp_dir = tempfile.gettempdir()
-    graph_path = os.path.join(temp_dir, 'daily_workloads.png')
-    plt.savefig(graph_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    return graph_path
+    return _figure_bytes(dpi)
 
-def generate_efficiency_graph():
+def render_efficiency_graph(dpi=300):
     """
-    Generate a graph showing block efficiency metrics over time
+    Render a graph showing block efficiency metrics over time as PNG bytes
     """
     # Get efficiency data
     efficiency_data = get_block_efficiency()
@@ -135,10 +135,17 @@ def generate_efficiency_graph():
     # Tight layout
     fig.tight_layout()
     
-    # Save the graph to a temporary location
-    temp_dir = tempfile.gettempdir()
-    graph_path = os.path.join(temp_dir, 'block_efficiency.png')
-    plt.savefig(graph_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    return graph_path
\ No newline at end of file
+    return _figure_bytes(dpi)
+
+# Renderers by graph type, as used by the /api/graphs endpoint
+RENDERERS = {
+    "costs": render_trend_graph,
+    "workloads": render_workloads_graph,
+    "efficiency": render_efficiency_graph,
+}
+
+def render_graph(graph_type, **params):
+    """
+    Render a graph by type; module-level so it can run on the process pool
+    """
+    return RENDERERS[graph_type](**params)